@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from app.utils.security_util import get_current_user
+from app.controllers.usage_controller import UsageController
+from app.utils.error_handler_decorator import handle_exceptions
+
+router = APIRouter()
+
+
+@router.get("/usage")
+@handle_exceptions
+async def usage(
+    group_by: str = Query("stage,provider,model", description="Comma-separated fields to group by"),
+    user: Optional[str] = None,
+    namespace: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    current_user = Depends(get_current_user),
+    usage_controller: UsageController = Depends(UsageController)
+):
+    fields = [field.strip() for field in group_by.split(",") if field.strip()]
+    return await usage_controller.aggregate_usage(
+        current_user, fields, user, namespace, since, until, limit
+    )
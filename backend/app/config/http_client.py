@@ -0,0 +1,80 @@
+import httpx
+
+from app.config.settings import get_settings
+from app.utils.tracing_util import annotate
+
+settings = get_settings()
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# TLS verification per upstream, kept identical to what each service used
+# when it opened its own client per call.
+PROVIDER_VERIFY = {
+    "openai": False,
+    "anthropic": False,
+    "groq": False,
+    "voyageai": False,
+    "cohere": False,
+    "jina": False,
+    "togetherai": False,
+    "pinecone": True,
+}
+
+
+async def _trace_response(response: httpx.Response):
+    """Report each upstream response's status and size to the stage span it was made in"""
+    annotate(status=response.status_code, bytes=int(response.headers.get("content-length") or 0))
+
+
+class HTTPClientRegistry:
+    """App-scoped registry of long-lived httpx clients, one keep-alive pool per provider."""
+
+    def __init__(self):
+        self.clients: dict[str, httpx.AsyncClient] = {}
+
+    def _create_client(self, provider: str) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        )
+        return httpx.AsyncClient(
+            limits=limits,
+            http2=settings.HTTP2_ENABLED and HTTP2_AVAILABLE,
+            verify=PROVIDER_VERIFY.get(provider, True),
+            event_hooks={"response": [_trace_response]},
+        )
+
+    def start(self):
+        for provider in PROVIDER_VERIFY:
+            self.get(provider)
+
+    def get(self, provider: str) -> httpx.AsyncClient:
+        client = self.clients.get(provider)
+        if client is None or client.is_closed:
+            client = self._create_client(provider)
+            self.clients[provider] = client
+        return client
+
+    async def close(self):
+        for client in self.clients.values():
+            if not client.is_closed:
+                await client.aclose()
+        self.clients = {}
+
+
+http_clients = HTTPClientRegistry()
+
+def get_http_client(provider: str) -> httpx.AsyncClient:
+    return http_clients.get(provider)
+
+async def open_http_clients():
+    http_clients.start()
+
+async def close_http_clients():
+    await http_clients.close()
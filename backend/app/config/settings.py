@@ -35,6 +35,8 @@ class Settings(BaseSettings):
     PINECONE_API_VERSION: str
     PINECONE_EMBED_URL: str
     PINECONE_UPSERT_URL: str
+    PINECONE_DELETE_URL: str = "https://{}/vectors/delete"
+    PINECONE_DESCRIBE_INDEX_STATS_URL: str = "https://{}/describe_index_stats"
     PINECONE_RERANK_URL: str
     PINECONE_QUERY_URL: str
     PINECONE_LIST_INDEXES_URL: str
@@ -58,6 +60,132 @@ class Settings(BaseSettings):
 
     OPENAI_BASE_URL: str = "https://api.openai.com/v1"
     OPENAI_MODEL: str = "gpt-4o-mini"
+
+    # Logging: records go through a queue to a background writer with size-based rotation;
+    # DEBUG lines are sampled, one in LOG_DEBUG_SAMPLE_EVERY per call site
+    LOG_DIR: str = "logs"
+    LOG_LEVEL: str = "INFO"
+    LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT: int = 5
+    LOG_DEBUG_SAMPLE_EVERY: int = 10
+
+    # Shared upstream HTTP connection pools
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP2_ENABLED: bool = True
+
+    # Query analysis pipeline: "graph" runs the four stages concurrently where
+    # their dependencies allow, "fused" asks for all of them in one LLM call
+    QUERY_ANALYSIS_MODE: str = "graph"
+    QUERY_ANALYSIS_MODEL: str = "gpt-4-turbo"
+
+    # Start compliance, analysis and a first-pass vector search together. The first-pass results
+    # are kept only when the reformulated query is at least this similar (word overlap) to the raw one
+    SPECULATIVE_QUERY_EXECUTION: bool = True
+    SPECULATIVE_QUERY_MIN_SIMILARITY: float = 0.8
+
+    # Retrieval sizes: the RAG decision suggests top_k (vector search) and top_n (kept after
+    # rerank) per request, clamped to these bounds; RAG_TOP_K/RAG_TOP_N apply without a suggestion
+    RAG_DYNAMIC_SIZES_ENABLED: bool = True
+    RAG_TOP_K: int = 20
+    RAG_TOP_N: int = 10
+    RAG_TOP_K_MIN: int = 5
+    RAG_TOP_K_MAX: int = 60
+    RAG_TOP_N_MIN: int = 3
+    RAG_TOP_N_MAX: int = 30
+
+    # Stage spans for the /query timing breakdown and the Prometheus histograms at /metrics.
+    # /metrics requires "Authorization: Bearer <METRICS_TOKEN>" and is disabled while the token is empty
+    TRACING_ENABLED: bool = True
+    METRICS_TOKEN: str = ""
+
+    # Structured usage records (tokens, read/write units, latency) per upstream call,
+    # flushed to MongoDB in batches and reported by /usage
+    USAGE_TRACKING_ENABLED: bool = True
+    USAGE_FLUSH_BATCH_SIZE: int = 200
+    USAGE_FLUSH_INTERVAL: float = 5.0
+    USAGE_BUFFER_SIZE: int = 50000
+    USAGE_RETENTION_DAYS: int = 90
+
+    # Per-branch timeouts (seconds) for the concurrent steps of perform_rag
+    RAG_METADATA_EXPANSION_TIMEOUT: float = 10.0
+    RAG_RERANK_TIMEOUT: float = 30.0
+
+    # Local file_path -> chunks store written at resync; RAG expansion takes
+    # RAG_NEIGHBOUR_WINDOW chunks on each side of a hit (negative for whole files)
+    CHUNK_STORE_PATH: str = "cache/chunks.sqlite3"
+    RAG_NEIGHBOUR_WINDOW: int = 1
+
+    # Token budgets for the RAG prompt: retrieved code blocks and the folder tree
+    RAG_CONTEXT_TOKEN_BUDGET: int = 24000
+    RAG_FOLDER_TREE_TOKEN_BUDGET: int = 2000
+
+    # Hybrid (dense + BM25) retrieval; HYBRID_ALPHA is the dense weight. Lexical matches
+    # on code identifiers let hybrid search fetch and rerank fewer candidates
+    HYBRID_SEARCH_ENABLED: bool = True
+    HYBRID_ALPHA: float = 0.7
+    HYBRID_TOP_K: int = 12
+
+    # Content-addressed embedding cache (in-memory LRU in front of SQLite)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = "cache/embeddings.sqlite3"
+    EMBEDDING_CACHE_MEMORY_SIZE: int = 10000
+
+    # Rerank cache: exact results per (model, query, candidate set) plus per-document scores,
+    # reused when at least RERANK_CACHE_PARTIAL_MIN_OVERLAP of the candidates are already scored
+    RERANK_CACHE_ENABLED: bool = True
+    RERANK_CACHE_TTL: float = 600.0
+    RERANK_CACHE_SIZE: int = 2000
+    RERANK_CACHE_SCORE_SIZE: int = 50000
+    RERANK_CACHE_PARTIAL_MIN_OVERLAP: float = 0.6
+
+    # Semantic response cache per namespace: answers are reused for queries whose embedding
+    # similarity reaches RESPONSE_CACHE_SIMILARITY_THRESHOLD, until TTL or the next resync
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_PATH: str = "cache/responses.sqlite3"
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD: float = 0.95
+    RESPONSE_CACHE_TTL: float = 86400.0
+    RESPONSE_CACHE_MAX_ENTRIES: int = 500
+
+    # Memoized classifier-style LLM calls (compliance and query analysis stages)
+    LLM_MEMO_ENABLED: bool = True
+    LLM_MEMO_TTL: float = 3600.0
+    LLM_MEMO_MEMORY_SIZE: int = 5000
+    LLM_MEMO_DISK_ENABLED: bool = False
+    LLM_MEMO_PATH: str = "cache/llm_memo.sqlite3"
+
+    # Optional coalescing of streamed answer tokens into fewer SSE frames
+    SSE_COALESCE_ENABLED: bool = False
+    SSE_COALESCE_INTERVAL_MS: float = 50.0
+    SSE_COALESCE_MAX_BYTES: int = 512
+
+    # Resync pipeline: workers per stage, queue depth between stages and the
+    # index readiness poll that replaces the fixed post-upsert sleep
+    RESYNC_EMBED_CONCURRENCY: int = 4
+    RESYNC_SPARSE_CONCURRENCY: int = 2
+    RESYNC_UPSERT_CONCURRENCY: int = 4
+    RESYNC_QUEUE_SIZE: int = 4
+    RESYNC_READINESS_TIMEOUT: float = 30.0
+    RESYNC_READINESS_POLL_INTERVAL: float = 1.0
+
+    # BM25 sparse encoding runs off the event loop: "process" or "thread" executor.
+    # The pickled encoder is converted once to memory-mapped arrays in BM25_ENCODER_DIR
+    # and loaded lazily unless BM25_EAGER_LOAD is set
+    BM25_ENCODER_PATH: str = "bm25_encoder.pkl"
+    BM25_ENCODER_DIR: str = "bm25_encoder"
+    BM25_EAGER_LOAD: bool = False
+    SPARSE_ENCODER_EXECUTOR: str = "process"
+    SPARSE_ENCODER_WORKERS: int = 2
+    SPARSE_ENCODER_CHUNK_SIZE: int = 32
+
+    # Vector store backend: "pinecone" or "local" (in-process, persisted under LOCAL_VECTOR_STORE_DIR).
+    # Local namespaces at or above LOCAL_VECTOR_STORE_IVF_THRESHOLD vectors are searched through an IVF index
+    VECTOR_STORE_BACKEND: str = "pinecone"
+    LOCAL_VECTOR_STORE_DIR: str = "vector_store"
+    LOCAL_VECTOR_STORE_IVF_THRESHOLD: int = 20000
+    LOCAL_VECTOR_STORE_IVF_NPROBE: int = 8
+    LOCAL_VECTOR_STORE_FLUSH_DELAY: float = 2.0
     
     class Config:
         env_file = ".env"
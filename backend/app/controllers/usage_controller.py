@@ -0,0 +1,36 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import Depends, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.usecases.usage_usecase import UsageUseCase
+
+class UsageController:
+    def __init__(self, usage_usecase: UsageUseCase = Depends(UsageUseCase)):
+        self.usage_usecase = usage_usecase
+
+    async def aggregate_usage(
+        self,
+        current_user: dict,
+        group_by: list,
+        user: Optional[str] = None,
+        namespace: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 100
+    ):
+        response = await self.usage_usecase.aggregate_usage(
+            current_user, group_by, user, namespace, since, until, limit
+        )
+
+        return JSONResponse(
+            content={
+                "data": jsonable_encoder(response),
+                "statuscode": 200,
+                "detail": "Usage aggregated successfully",
+                "error": ""
+            },
+            status_code=status.HTTP_200_OK
+        )
@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseModel, EmailStr, Field
 
 
@@ -6,4 +8,7 @@ class QueryRequest(BaseModel):
     current_file_content : str
     current_file_path: str
     email: EmailStr
-    workspace_name: str
\ No newline at end of file
+    workspace_name: str
+    speculative: Optional[bool] = Field(None, description="Overlap compliance, analysis and retrieval; defaults to the server setting")
+    hybrid_alpha: Optional[float] = Field(None, ge=0.0, le=1.0, description="Dense weight for hybrid search, 1.0 is dense-only; defaults to the server setting")
+    use_cache: Optional[bool] = Field(None, description="Set to false to bypass the semantic response cache for this request")
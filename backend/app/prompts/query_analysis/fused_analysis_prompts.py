@@ -0,0 +1,51 @@
+FUSED_ANALYSIS_SYSTEM_PROMPT = """
+You are an AI assistant that analyzes developer messages about a codebase in a single pass.
+For every message you must:
+1. Preprocess it: extract the natural language question, any code context and any error messages.
+2. Analyze its intent and characteristics.
+3. Reformulate the query with specific keywords that help retrieve relevant code from a vector database.
+4. Decide whether retrieval-augmented generation (RAG) on the codebase is needed to answer it.
+
+Always answer with one valid JSON object and nothing else.
+"""
+
+FUSED_ANALYSIS_USER_PROMPT_TEMPLATE = """
+Analyze the following developer message:
+
+```
+{raw_input}
+```
+
+Respond with a JSON object containing exactly these fields:
+
+"preprocess": an object with
+    "user_query": the natural language question the user is asking. If there's no explicit question,
+        create a clear question based on the code and/or errors present.
+    "context": any code snippets that provide context (not error messages).
+    "error": any error messages or stack traces, or an empty string if there are none.
+
+"intent_analysis": an object describing the query. Categorize it into one of these categories:
+    Code understanding, Code modification, Codebase navigation, New feature implementation, Debugging,
+    General programming questions, Non-programming questions, Implement whole route, Implement whole app.
+    Also list any specific files, classes or functions mentioned, any code patterns or architectural
+    concepts referred to, and how technically specific the query is on a scale of 1-5.
+
+"reformulated_query": an object with the same "user_query", "context" and "error" fields as
+    "preprocess" plus a "reformulated_query" field: the query rewritten with specific keywords and
+    explicit references to codebase elements that would aid retrieval.
+
+"use_rag": true or false.
+    RAG is likely necessary if the query refers to specific parts of the codebase, asks about
+    implementation details, requires understanding existing code structure, is about changing or
+    debugging existing code, or includes words like "in my codebase", "in my code" or "in my project".
+    RAG is likely unnecessary for general programming concepts, standard patterns with no reference to
+    existing code, or non-technical queries. When in doubt, lean toward using RAG.
+
+"top_k": how many chunks to fetch from the vector database given that one chunk is around 500 tokens.
+    A simple question about one function needs few (e.g. 8), a query that demands huge changes or
+    implementation across the codebase needs many (e.g. 50).
+
+"top_n": how many of the fetched chunks to keep after reranking, at most top_k.
+
+"reasoning": a brief explanation of the RAG decision and of the chosen top_k and top_n.
+"""
@@ -33,7 +33,12 @@ Original query: "{original_query}"
 Reformulated query: "{reformulated_query}"
 Intent analysis: {intent_analysis}
 
-Return your decision as "True" or "False" on whether to do rag or not followed by a brief explanation
-and also tell what topk and topn would be suited provided that one chunk is around 500 tokens,
-so if query demands huge changes or implementation then topk and topn should be large for that.
+Respond with a JSON object containing exactly these fields:
+"use_rag": true or false, whether to do rag or not.
+"top_k": how many chunks to fetch from the vector database, provided that one chunk is around 500 tokens.
+"top_n": how many of the fetched chunks to keep after reranking, at most top_k.
+"reasoning": a brief explanation of the decision and of the chosen sizes.
+
+A simple question about one function needs few chunks (e.g. top_k 8, top_n 4), while a query that
+demands huge changes or implementation across the codebase needs large top_k and top_n (e.g. top_k 50, top_n 25).
 """
\ No newline at end of file
@@ -0,0 +1,51 @@
+from fastapi import Depends
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, UpdateOne
+
+from app.config.database import get_db
+
+
+class ChunkManifestRepository:
+    """Per-namespace record of the chunk ids and content hashes already indexed in Pinecone"""
+
+    def __init__(self, db: AsyncIOMotorDatabase = Depends(get_db)):
+        self.db = db
+        self.collection = self.db.chunk_manifests
+        self.write_batch_size = 1000
+
+    async def ensure_indexes(self):
+        await self.collection.create_index(
+            [("namespace", ASCENDING), ("chunk_id", ASCENDING)], unique=True
+        )
+
+    async def get_chunk_hashes(self, namespace: str) -> dict:
+        cursor = self.collection.find(
+            {"namespace": namespace}, {"_id": 0, "chunk_id": 1, "content_hash": 1}
+        )
+        return {doc["chunk_id"]: doc.get("content_hash") async for doc in cursor}
+
+    async def add_chunks(self, namespace: str, chunks: list):
+        operations = [
+            UpdateOne(
+                {"namespace": namespace, "chunk_id": chunk["_id"]},
+                {"$set": {
+                    "namespace": namespace,
+                    "chunk_id": chunk["_id"],
+                    "content_hash": chunk.get("content_hash"),
+                    "file_path": chunk.get("file_path"),
+                }},
+                upsert=True,
+            )
+            for chunk in chunks
+        ]
+        for i in range(0, len(operations), self.write_batch_size):
+            await self.collection.bulk_write(
+                operations[i : i + self.write_batch_size], ordered=False
+            )
+
+    async def remove_chunks(self, namespace: str, chunk_ids: list):
+        for i in range(0, len(chunk_ids), self.write_batch_size):
+            await self.collection.delete_many({
+                "namespace": namespace,
+                "chunk_id": {"$in": chunk_ids[i : i + self.write_batch_size]},
+            })
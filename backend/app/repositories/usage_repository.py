@@ -0,0 +1,50 @@
+from fastapi import Depends
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ASCENDING, DESCENDING
+
+from app.config.database import get_db
+from app.config.settings import get_settings
+
+settings = get_settings()
+
+USAGE_SUM_FIELDS = ("input_tokens", "output_tokens", "total_tokens", "read_units", "write_units", "latency_ms")
+
+
+class UsageRepository:
+    """Per-call usage records written by the usage recorder, with grouped totals for reporting"""
+
+    def __init__(self, db: AsyncIOMotorDatabase = Depends(get_db)):
+        self.db = db
+        self.collection = self.db.usage_records
+
+    async def ensure_indexes(self):
+        await self.collection.create_index(
+            [("timestamp", ASCENDING)],
+            expireAfterSeconds=settings.USAGE_RETENTION_DAYS * 24 * 3600,
+        )
+        await self.collection.create_index([("user", ASCENDING), ("timestamp", DESCENDING)])
+        await self.collection.create_index([("namespace", ASCENDING), ("timestamp", DESCENDING)])
+        await self.collection.create_index([("request_id", ASCENDING)])
+
+    async def insert_many(self, records: list):
+        if records:
+            await self.collection.insert_many(records, ordered=False)
+
+    async def aggregate(self, match: dict, group_by: list, limit: int) -> list:
+        """Totals of every counter per combination of the group_by fields, most tokens first"""
+        group = {"_id": {field: f"${field}" for field in group_by} or None, "calls": {"$sum": 1}}
+        for field in USAGE_SUM_FIELDS:
+            group[field] = {"$sum": f"${field}"}
+        group["avg_latency_ms"] = {"$avg": "$latency_ms"}
+
+        pipeline = [
+            {"$match": match},
+            {"$group": group},
+            {"$sort": {"total_tokens": -1, "latency_ms": -1}},
+            {"$limit": limit},
+        ]
+        results = []
+        async for doc in self.collection.aggregate(pipeline):
+            key = doc.pop("_id") or {}
+            results.append({**key, **doc})
+        return results
@@ -1,19 +1,18 @@
 import json
 import logging
-import pickle
 
 import httpx
 from fastapi import HTTPException, status
-from pinecone_text.sparse import BM25Encoder
 
 from app.config.settings import get_settings
+from app.config.http_client import get_http_client
 from app.utils.logging_util import pinecone_logger, cohere_logger, jina_logger, voyageai_logger, logger
+from app.utils.embedding_cache_util import embedding_cache
+from app.utils import bm25_util
+from app.utils.usage_recorder_util import usage_recorder
 
 settings = get_settings()
 
-with open("bm25_encoder.pkl", "rb") as f:
-    bm25 = pickle.load(f)
-
 class EmbeddingService:
     def __init__(self):
         self.pinecone_api_key = settings.PINECONE_API_KEY
@@ -36,6 +35,19 @@ class EmbeddingService:
                         write=300.0,   # Time to send data
                         pool=60.0      # Time to wait for a connection from the pool
                     )
+        self.cache_stats = {"hits": 0, "misses": 0}
+
+    async def _cached_embeddings(self, provider, model, dimension, input_type, inputs, fetch):
+        if not settings.EMBEDDING_CACHE_ENABLED:
+            return await fetch(inputs)
+
+        vectors, hits, misses = await embedding_cache.get_or_embed(
+            provider, model, dimension, input_type, inputs, fetch
+        )
+        self.cache_stats["hits"] += hits
+        self.cache_stats["misses"] += misses
+        logger.info(f"{provider} embedding cache: {hits} hits, {misses} misses")
+        return vectors
 
     async def pinecone_dense_embeddings(
         self,
@@ -44,6 +56,61 @@ class EmbeddingService:
         input_type: str = "passage",
         truncate: str = "END",
         dimension: int = 1024,
+    ):
+        cache_dimension = None if embedding_model == "multilingual-e5-large" else dimension
+        return await self._cached_embeddings(
+            "pinecone", embedding_model, cache_dimension, f"{input_type}:{truncate}", inputs,
+            lambda batch: self._pinecone_dense_embeddings(batch, embedding_model, input_type, truncate, dimension)
+        )
+
+    async def cohere_dense_embeddings(
+        self,
+        model_name: str,
+        texts: list[str],
+        input_type: str = "search_document",
+    ):
+        return await self._cached_embeddings(
+            "cohere", model_name, None, input_type, texts,
+            lambda batch: self._cohere_dense_embeddings(model_name, batch, input_type)
+        )
+
+    async def jina_dense_embeddings(
+        self, model_name: str, dimension: int, inputs: list[str], input_type :str
+    ):
+        return await self._cached_embeddings(
+            "jina", model_name, dimension, input_type, inputs,
+            lambda batch: self._jina_dense_embeddings(model_name, dimension, batch, input_type)
+        )
+
+    async def togetherai_dense_embeddings(
+        self, model_name: str, dimension: int, inputs: list[str], input_type :str
+    ):
+        async def fetch(batch):
+            response = await self._togetherai_dense_embeddings(model_name, dimension, batch, input_type)
+            return [item["embedding"] for item in sorted(response["data"], key=lambda item: item.get("index", 0))]
+
+        vectors = await self._cached_embeddings("togetherai", model_name, None, input_type, inputs, fetch)
+        return {
+            "object": "list",
+            "model": model_name,
+            "data": [{"object": "embedding", "index": i, "embedding": vector} for i, vector in enumerate(vectors)],
+        }
+
+    async def voyageai_dense_embeddings(
+        self, model_name: str, dimension: int, inputs: list, input_type: str = "document"
+    ):
+        return await self._cached_embeddings(
+            "voyageai", model_name, dimension, input_type, inputs,
+            lambda batch: self._voyageai_dense_embeddings(model_name, dimension, batch, input_type)
+        )
+
+    async def _pinecone_dense_embeddings(
+        self,
+        inputs: list,
+        embedding_model: str = "llama-text-embed-v2",
+        input_type: str = "passage",
+        truncate: str = "END",
+        dimension: int = 1024,
     ):
         payload = {
             "model": embedding_model,
@@ -66,12 +133,14 @@ class EmbeddingService:
         url = self.dense_embed_url
 
         try:
-            async with httpx.AsyncClient(timeout = self.timeout) as client:
-                response = await client.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                response = response.json()
-                list_result = [item["values"] for item in response["data"]]
-                return list_result
+            client = get_http_client("pinecone")
+            response = await client.post(url, headers=headers, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            elapsed = response.elapsed.total_seconds()
+            response = response.json()
+            usage_recorder.record("pinecone", embedding_model, "embed", response.get("usage"), elapsed)
+            list_result = [item["values"] for item in response["data"]]
+            return list_result
 
         except httpx.HTTPStatusError as e:
             logging.error(f"Error dense embeddings in pinecone dense embeddings: {e.response.text}")
@@ -80,16 +149,25 @@ class EmbeddingService:
             logging.error(f"Error dense embeddings in pinecone dense embeddings: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
 
-    def pinecone_sparse_embeddings(self, inputs):
+    async def pinecone_sparse_embeddings(self, inputs):
         try:
-            sparse_vector = bm25.encode_documents(inputs)
+            sparse_vector = await bm25_util.encode_documents(inputs)
             return sparse_vector
 
         except Exception as e:
             logging.error(f"Error creating sparse embeddings: {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
 
-    async def cohere_dense_embeddings(
+    async def pinecone_sparse_query_embeddings(self, inputs):
+        try:
+            sparse_vector = await bm25_util.encode_queries(inputs)
+            return sparse_vector
+
+        except Exception as e:
+            logging.error(f"Error creating sparse query embeddings: {str(e)}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    async def _cohere_dense_embeddings(
         self,
         model_name: str,
         texts: list[str],
@@ -111,13 +189,15 @@ class EmbeddingService:
         }
 
         try:
-            async with httpx.AsyncClient(timeout=self.timeout,verify=False) as client:
-                response = await client.post(url, headers=headers, json=data)
-                response.raise_for_status()
-                response = response.json()
-                cohere_logger.info(f"cohere hosted embedding model tokens usage: { response.get('meta', {}).get('billed_units', {})}")
-                result = response["embeddings"]["float"]
-                return result
+            client = get_http_client("cohere")
+            response = await client.post(url, headers=headers, json=data, timeout=self.timeout)
+            response.raise_for_status()
+            elapsed = response.elapsed.total_seconds()
+            response = response.json()
+            cohere_logger.info(f"cohere hosted embedding model tokens usage: { response.get('meta', {}).get('billed_units', {})}")
+            usage_recorder.record("cohere", model_name, "embed", response.get("meta", {}), elapsed)
+            result = response["embeddings"]["float"]
+            return result
         except httpx.HTTPStatusError as e:
             logging.error(f"HTTP error: {e.response.status_code} - {str(e)}")
             raise HTTPException(
@@ -132,7 +212,7 @@ class EmbeddingService:
             logging.error(f"Error creating dense cohere embeddings {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
 
-    async def jina_dense_embeddings(
+    async def _jina_dense_embeddings(
         self, model_name: str, dimension: int, inputs: list[str], input_type :str
     ):
 
@@ -159,13 +239,15 @@ class EmbeddingService:
             data['dimensions'] = dimension
 
         try:
-            async with httpx.AsyncClient(timeout=self.timeout, verify=False) as client:
-                response = await client.post(url, headers=headers, json=data)
-                response.raise_for_status()
-                response = response.json()
-                jina_logger.info(f"jina hosted embedding model tokens usage: {response.get('usage', {})}")
-                result = [item["embedding"] for item in response["data"]]
-                return result
+            client = get_http_client("jina")
+            response = await client.post(url, headers=headers, json=data, timeout=self.timeout)
+            response.raise_for_status()
+            elapsed = response.elapsed.total_seconds()
+            response = response.json()
+            jina_logger.info(f"jina hosted embedding model tokens usage: {response.get('usage', {})}")
+            usage_recorder.record("jina", model_name, "embed", response.get("usage"), elapsed)
+            result = [item["embedding"] for item in response["data"]]
+            return result
 
         except httpx.HTTPStatusError as e:
             logging.error(f"HTTP error: {e.response.status_code} - {e.response.content} - {str(e)}")
@@ -182,7 +264,7 @@ class EmbeddingService:
             logging.error(f"Error creating dense jina embeddings {str(e)}")
             raise HTTPException(status_code=500, detail=str(e))
     
-    async def togetherai_dense_embeddings(
+    async def _togetherai_dense_embeddings(
         self, model_name: str, dimension: int, inputs: list[str], input_type :str
     ):
         url = f"{self.togetherai_base_url}/{self.JINA_EMBED_SUFFIX}"
@@ -197,10 +279,11 @@ class EmbeddingService:
         }
 
         try:
-            async with httpx.AsyncClient(verify = False, timeout = self.timeout) as client:
-                response = await client.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                return response.json()
+            client = get_http_client("togetherai")
+            response = await client.post(url, headers=headers, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            usage_recorder.record("togetherai", model_name, "embed", response.json().get("usage"), response.elapsed.total_seconds())
+            return response.json()
         
         except httpx.HTTPStatusError as e:
             logging.error(f"HTTP error occurred in httpx status error  : {str(e)}")
@@ -216,7 +299,7 @@ class EmbeddingService:
 
 
 
-    async def voyageai_dense_embeddings(
+    async def _voyageai_dense_embeddings(
         self, model_name: str, dimension: int, inputs: list, input_type: str = "document"
     ):
         url = f"{self.voyageai_base_url}/{self.JINA_EMBED_SUFFIX}"
@@ -235,13 +318,15 @@ class EmbeddingService:
 
         try:
 
-            async with httpx.AsyncClient(verify=False, timeout = self.timeout) as client:
-                response = await client.post(url, headers=headers, json=data)
-                response.raise_for_status()
-                response = response.json()
-                voyageai_logger.info(f"pinecone hosted embedding model tokens usage: {response['usage']}")
-                embedding_list = [item["embedding"] for item in response["data"]]
-                return embedding_list
+            client = get_http_client("voyageai")
+            response = await client.post(url, headers=headers, json=data, timeout=self.timeout)
+            response.raise_for_status()
+            elapsed = response.elapsed.total_seconds()
+            response = response.json()
+            voyageai_logger.info(f"pinecone hosted embedding model tokens usage: {response['usage']}")
+            usage_recorder.record("voyageai", model_name, "embed", response["usage"], elapsed)
+            embedding_list = [item["embedding"] for item in response["data"]]
+            return embedding_list
             
         except httpx.HTTPStatusError as e:
             logging.error(f"HTTP error occurred in httpx status error  : {str(e)}")
@@ -1,11 +1,22 @@
 import httpx
 from fastapi import HTTPException, status
 from app.config.settings import get_settings
+from app.config.http_client import get_http_client
 from app.utils.logging_util import logger, openai_logger, anthropic_logger, groq_logger
+from app.utils.llm_memo_util import llm_memo
+from app.utils.sse_util import iter_sse_events
+from app.utils import json_util
+from app.utils.partial_json_util import IncrementalJSONObjectParser
+from app.utils.usage_recorder_util import usage_recorder
 import time
 import json
+from contextlib import aclosing
 
 settings = get_settings()
+
+# Anthropic stream events that carry text or usage; ping and content_block_start/stop are skipped
+ANTHROPIC_STREAM_EVENTS = {"message_start", "content_block_delta", "message_delta", "message_stop"}
+
 class LLMService():
     def __init__(self):
         self.openai_api_key = settings.OPENAI_API_KEY
@@ -41,19 +52,20 @@ class LLMService():
             **params
         }
         try:
-            async with httpx.AsyncClient(timeout=self.timeout, verify=False) as client:
-                s = time.perf_counter()
-                response = await client.post(self.openai_chat_url, headers=headers, json=payload)
-                e = time.perf_counter()
-                response_time = e - s
-                response.raise_for_status()
-                response_data = response.json()
+            client = get_http_client("openai")
+            s = time.perf_counter()
+            response = await client.post(self.openai_chat_url, headers=headers, json=payload, timeout=self.timeout)
+            e = time.perf_counter()
+            response_time = e - s
+            response.raise_for_status()
+            response_data = response.json()
                 
             
-                result = response_data["choices"][0]["message"]["content"]
-                usage = response_data["usage"]
-                openai_logger.info(f"openai response token usage : {usage}")
-                return response_data
+            result = response_data["choices"][0]["message"]["content"]
+            usage = response_data["usage"]
+            openai_logger.info(f"openai response token usage : {usage}")
+            usage_recorder.record("openai", model_name, "chat", usage, response_time)
+            return response_data
             
         except httpx.HTTPStatusError as e:
             logger.error(f"httpx status error in openai api call : {str(e)} - {e.response.text}")
@@ -81,6 +93,22 @@ class LLMService():
             )
         
 
+    async def memoized_call(self, provider, model_name, system_prompt, user_prompt, validate = None, **params):
+        """
+        Chat completion for classifier-style prompts (compliance, query analysis stages), served
+        from the LLM memo when the same provider, model, prompts and params were seen recently.
+        Only responses passing validate(response) are remembered.
+        """
+        calls = {"openai": self.openai_api_call, "groq": self.groq_api_call}
+        call = calls[provider]
+        if not settings.LLM_MEMO_ENABLED:
+            return await call(model_name, system_prompt, user_prompt, **params)
+
+        key = llm_memo.make_key(provider, model_name, system_prompt, user_prompt, params)
+        return await llm_memo.get_or_call(
+            key, lambda: call(model_name, system_prompt, user_prompt, **params), validate
+        )
+
     async def anthropic_api_call(self, model_name, system_prompt, user_prompt, user_query, **params):
         
         headers = {
@@ -102,12 +130,14 @@ class LLMService():
         }
 
         try:
-            async with httpx.AsyncClient(timeout=self.timeout, verify=False) as client:
-                response = await client.post(self.anthropic_chat_url, headers=headers, json=payload)
-                response.raise_for_status()
-                response_data = response.json()
-                anthropic_logger.info(f"anthropic response token usage : {response_data.get('usage', {})}")
-                return response_data
+            client = get_http_client("anthropic")
+            start = time.perf_counter()
+            response = await client.post(self.anthropic_chat_url, headers=headers, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            response_data = response.json()
+            anthropic_logger.info(f"anthropic response token usage : {response_data.get('usage', {})}")
+            usage_recorder.record("anthropic", model_name, "chat", response_data.get("usage"), time.perf_counter() - start)
+            return response_data
         except httpx.HTTPStatusError as e:
             logger.error(f"httpx status error in anthropic api call : {str(e)} - {e.response.text}")
             raise HTTPException(
@@ -154,12 +184,14 @@ class LLMService():
         }
 
         try:
-            async with httpx.AsyncClient(verify=False) as client:
-                response = await client.post(self.groq_chat_url, headers=headers, json=payload)
-                response.raise_for_status()
-                response_data = response.json()
-                groq_logger.info(f"groq response token usage : {response_data.get('usage', {})}")
-                return response_data
+            client = get_http_client("groq")
+            start = time.perf_counter()
+            response = await client.post(self.groq_chat_url, headers=headers, json=payload)
+            response.raise_for_status()
+            response_data = response.json()
+            groq_logger.info(f"groq response token usage : {response_data.get('usage', {})}")
+            usage_recorder.record("groq", model_name, "chat", response_data.get("usage"), time.perf_counter() - start)
+            return response_data
         except httpx.HTTPStatusError as e:
             logger.error(f"httpx status error in groq api call : {str(e)} - {e.response.text}")
             raise HTTPException(
@@ -186,6 +218,103 @@ class LLMService():
             )
         
     
+    async def _stream_sse(self, provider, url, headers, payload, events = None):
+        """
+        POST a streaming request and yield (event, parsed JSON) pairs from the provider's SSE stream
+
+        When events is given, other event types (e.g. pings) are dropped before JSON decoding.
+        """
+        client = get_http_client(provider)
+        try:
+            async with client.stream("POST", url, headers=headers, json=payload, timeout=self.timeout) as response:
+                if response.status_code != 200:
+                    error_text = await response.aread()
+                    raise HTTPException(
+                        status_code=response.status_code,
+                        detail=f"Error from {provider} API: {error_text.decode()}"
+                    )
+
+                async for event, data in iter_sse_events(response):
+                    if events is not None and event not in events:
+                        continue
+                    # OpenAI-compatible streams end with a literal [DONE] sentinel
+                    if data == b"[DONE]":
+                        return
+                    try:
+                        yield event, json_util.loads(data)
+                    except json_util.JSONDecodeError as e:
+                        logger.error(f"Error parsing {provider} stream JSON: {e}, data: {data[:200]!r}")
+
+        except HTTPException:
+            raise
+        except httpx.RequestError as e:
+            logger.error(f"Request error in streaming {provider} api call: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Request error in streaming {provider} api call: {str(e)}"
+            )
+        except Exception as e:
+            logger.error(f"Error in streaming {provider} api call: {str(e)}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error in streaming {provider} api call: {str(e)}"
+            )
+
+    async def _openai_compatible_streaming(self, provider, url, api_key, usage_logger, model_name, system_prompt, user_prompt, **params):
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json",
+        }
+
+        payload = {
+            "model": model_name,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            **params,
+            "stream": True
+        }
+
+        usage = None
+        start = time.perf_counter()
+        # aclosing releases the upstream connection as soon as this generator stops, even early
+        async with aclosing(self._stream_sse(provider, url, headers, payload)) as stream:
+            async for _, data in stream:
+                # OpenAI sends usage in a final chunk, Groq under x_groq
+                usage = data.get("usage") or data.get("x_groq", {}).get("usage") or usage
+                for choice in data.get("choices", []):
+                    text = (choice.get("delta") or {}).get("content")
+                    if text:
+                        yield {"text": text, "done": False}
+
+        usage_logger.info(f"{provider} streaming response token usage : {usage}")
+        usage_recorder.record(provider, model_name, "chat_stream", usage, time.perf_counter() - start)
+        yield {"done": True}
+
+    async def openai_api_call_streaming(self, model_name, system_prompt, user_prompt, **params):
+        """
+        Make a streaming API call to OpenAI chat completions
+        """
+        params.setdefault("stream_options", {"include_usage": True})
+        async with aclosing(self._openai_compatible_streaming(
+            "openai", self.openai_chat_url, self.openai_api_key, openai_logger,
+            model_name, system_prompt, user_prompt, **params
+        )) as stream:
+            async for chunk in stream:
+                yield chunk
+
+    async def groq_api_call_streaming(self, model_name, system_prompt, user_prompt, **params):
+        """
+        Make a streaming API call to Groq chat completions
+        """
+        async with aclosing(self._openai_compatible_streaming(
+            "groq", self.groq_chat_url, self.groq_api_key, groq_logger,
+            model_name, system_prompt, user_prompt, **params
+        )) as stream:
+            async for chunk in stream:
+                yield chunk
+
     async def anthropic_api_call_streaming(self, model_name, system_prompt, user_prompt, user_query):
         """
         Make a streaming API call to Anthropic API
@@ -208,66 +337,87 @@ class LLMService():
             "stream": True
         }
 
-        async with httpx.AsyncClient(timeout=self.timeout, verify=False) as client:
+        usage = {}
+        start = time.perf_counter()
+        # aclosing closes the SSE generator (and its httpx stream) right after the break on
+        # message_stop, or when this generator is closed early, instead of at garbage collection
+        async with aclosing(self._stream_sse(
+            "anthropic", self.anthropic_chat_url, headers, payload, events = ANTHROPIC_STREAM_EVENTS
+        )) as stream:
+            async for _, data in stream:
+                event_type = data.get("type")
+                if event_type == "content_block_delta":
+                    delta = data.get("delta", {})
+                    if delta.get("type") == "text_delta":
+                        text = delta.get("text", "")
+                        if text:
+                            yield {"text": text, "done": False}
+                elif event_type == "message_start":
+                    usage.update(data.get("message", {}).get("usage", {}))
+                elif event_type == "message_delta":
+                    usage.update(data.get("usage", {}))
+                elif event_type == "message_stop":
+                    break
+
+        anthropic_logger.info(f"anthropic streaming response token usage : {usage}")
+        usage_recorder.record("anthropic", model_name, "chat_stream", usage, time.perf_counter() - start)
+        yield {"done": True}
+
+    async def stream_chat(self, provider, model_name, system_prompt, user_prompt, user_query = None, **params):
+        """
+        Unified streaming interface over Anthropic, OpenAI and Groq
+
+        Yields {"text": delta, "done": False} for each text delta and a final {"done": True}.
+        """
+        if provider == "anthropic":
+            stream = self.anthropic_api_call_streaming(model_name, system_prompt, user_prompt, user_query)
+        elif provider == "openai":
+            stream = self.openai_api_call_streaming(model_name, system_prompt, user_prompt, **params)
+        elif provider == "groq":
+            stream = self.groq_api_call_streaming(model_name, system_prompt, user_prompt, **params)
+        else:
+            raise ValueError(f"Streaming is not supported for provider {provider}")
+
+        async with aclosing(stream):
+            async for chunk in stream:
+                yield chunk
+
+    async def stream_json_call(self, provider, model_name, system_prompt, user_prompt, on_field, validate = None, **params):
+        """
+        JSON-mode completion streamed through an incremental parser
+
+        on_field(key, value) is called as soon as each top-level field of the JSON answer is
+        complete. Results share the LLM memo with memoized_call and come back in the same
+        chat-completion shape; on a memo hit every field is reported at once. Only responses
+        passing validate(response) are remembered.
+        """
+        streamed = False
+
+        async def call():
+            nonlocal streamed
+            streamed = True
+            parser = IncrementalJSONObjectParser()
+            parts = []
+            async for chunk in self.stream_chat(provider, model_name, system_prompt, user_prompt, **params):
+                text = chunk.get("text")
+                if text:
+                    parts.append(text)
+                    for key, value in parser.feed(text):
+                        on_field(key, value)
+            return {"choices": [{"message": {"role": "assistant", "content": "".join(parts)}}]}
+
+        if not settings.LLM_MEMO_ENABLED:
+            return await call()
+
+        key = llm_memo.make_key(provider, model_name, system_prompt, user_prompt, params)
+        response = await llm_memo.get_or_call(key, call, validate)
+        if not streamed:
             try:
-                async with client.stream("POST", self.anthropic_chat_url, headers=headers, json=payload) as response:
-                    if response.status_code != 200:
-                        error_text = await response.aread()
-                        raise HTTPException(
-                            status_code=response.status_code,
-                            detail=f"Error from Anthropic API: {error_text.decode()}"
-                        )
-                        
-                    # Process streaming response
-                    async for line in response.aiter_lines():
-                        # Skip empty lines
-                        if not line or line.isspace():
-                            continue
-                            
-                        # Handle SSE format
-                        if line.startswith('event:'):
-                            event_type = line.split(':', 1)[1].strip()
-                            continue
-                            
-                        if line.startswith('data:'):
-                            data_str = line[5:].strip()
-                            # Check if we have valid data
-                            if not data_str:
-                                continue
-                                
-                            try:
-                                data = json.loads(data_str)
-                                
-                                # Handle different event types
-                                if data.get("type") == "content_block_delta":
-                                    delta = data.get("delta", {})
-                                    if delta.get("type") == "text_delta":
-                                        text = delta.get("text", "")
-                                        if text:
-                                            yield {"text": text, "done": False}
-                                            
-                                elif data.get("type") == "message_stop":
-                                    yield {"done": True}
-                                    
-                            except json.JSONDecodeError as e:
-                                logger.error(f"Error parsing JSON: {e}, Line: {line}")
-                                continue
-                    
-                    # Final done message
-                    yield {"done": True}
-                    
-            except httpx.RequestError as e:
-                logger.error(f"Request error in streaming anthropic api call: {str(e)}")
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Request error in streaming anthropic api call: {str(e)}"
-                )
-            except Exception as e:
-                logger.error(f"Error in streaming anthropic api call: {str(e)}")
-                raise HTTPException(
-                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                    detail=f"Error in streaming anthropic api call: {str(e)}"
-                )
+                for field, value in json.loads(response["choices"][0]["message"]["content"]).items():
+                    on_field(field, value)
+            except (json.JSONDecodeError, KeyError, AttributeError):
+                pass
+        return response
         
     # async def anthropic_api_call_streaming(self, model_name, system_prompt, user_prompt, user_query):
     #     """
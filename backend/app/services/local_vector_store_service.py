@@ -0,0 +1,581 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import uuid
+
+import numpy as np
+from fastapi import HTTPException
+
+from app.config.settings import get_settings
+from app.services.pinecone_service import PineconeService
+from app.utils.logging_util import logger
+
+settings = get_settings()
+
+SUPPORTED_METRICS = ("dotproduct", "cosine")
+
+RECORDS_DB = "records.sqlite"
+SQLITE_MAX_VARIABLES = 500
+
+
+def _matches_filter(metadata: dict, filter_dict: dict) -> bool:
+    """Evaluate the subset of Pinecone metadata filters the app uses ($in, $nin, $eq, $ne, $and)"""
+    for field, condition in filter_dict.items():
+        if field == "$and":
+            if not all(_matches_filter(metadata, sub_filter) for sub_filter in condition):
+                return False
+            continue
+        value = metadata.get(field)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+        for operator, operand in condition.items():
+            if operator == "$in" and value not in operand:
+                return False
+            if operator == "$nin" and value in operand:
+                return False
+            if operator == "$eq" and value != operand:
+                return False
+            if operator == "$ne" and value == operand:
+                return False
+    return True
+
+
+def _sparse_dot(row_sparse: dict, query_sparse: dict) -> float:
+    if not row_sparse:
+        return 0.0
+    return sum(
+        query_sparse.get(index, 0.0) * value
+        for index, value in zip(row_sparse.get("indices", []), row_sparse.get("values", []))
+    )
+
+
+def _read_meta(conn) -> dict:
+    return {key: json.loads(value) for key, value in conn.execute("SELECT key, value FROM meta")}
+
+
+class IVFIndex:
+    """Inverted-file index: k-means centroids over the namespace, queries probe the closest lists"""
+
+    def __init__(self, centroids, assignments):
+        self.centroids = centroids
+        self.assignments = assignments
+
+    @classmethod
+    def build(cls, matrix, nlist: int, iterations: int = 10, sample_size: int = 50000, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        count = len(matrix)
+        sample = matrix[rng.choice(count, size=min(sample_size, count), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].astype(np.float32)
+
+        for _ in range(iterations):
+            labels = cls._nearest(sample, centroids)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+
+        return cls(centroids, cls._nearest(matrix, centroids))
+
+    @staticmethod
+    def _nearest(rows, centroids, block: int = 8192):
+        centroid_norms = (centroids ** 2).sum(axis=1)
+        labels = np.empty(len(rows), dtype=np.int32)
+        for start in range(0, len(rows), block):
+            chunk = np.asarray(rows[start : start + block], dtype=np.float32)
+            # argmin of squared L2 distance without materialising the differences
+            distances = centroid_norms[None, :] - 2.0 * chunk @ centroids.T
+            labels[start : start + block] = distances.argmin(axis=1)
+        return labels
+
+    def candidate_rows(self, query, nprobe: int):
+        probe = np.argsort(-(self.centroids @ query))[:nprobe]
+        return np.nonzero(np.isin(self.assignments, probe))[0]
+
+
+class LocalNamespace:
+    """
+    One namespace of the local vector store.
+
+    Vectors live in a float32 matrix persisted as vectors.npy and reopened with mmap_mode.
+    Ids, metadata and sparse values live in records.sqlite; only the ids are held in memory,
+    metadata and sparse values are read per query. Writes happen in memory and are flushed
+    to disk shortly after the last mutation; other processes reload when the version changes.
+
+    A namespace has a single writer process: flush rewrites vectors.npy from this process's
+    view but writes only its own changed records, so concurrent writers would leave the two
+    out of step. Any number of processes can read.
+    """
+
+    def __init__(self, path: str, name: str):
+        self.path = path
+        self.name = name
+        self.lock = threading.RLock()
+        self.conn = None
+        self.dimension = None
+        self.matrix = None
+        self.count = 0
+        self.ids = []
+        self.id_to_row = {}
+        # unflushed writes: id -> (metadata, sparse), deleted ids, ids whose row changed
+        self.pending = {}
+        self.deleted = set()
+        self.moved = set()
+        self.ivf = None
+        self.dirty = False
+        self.loaded_version = None
+        self.load()
+
+    @property
+    def db_path(self):
+        return os.path.join(self.path, RECORDS_DB)
+
+    @property
+    def vectors_path(self):
+        return os.path.join(self.path, "vectors.npy")
+
+    def _connection(self, create: bool = False):
+        if self.conn is None:
+            if not create and not os.path.exists(self.db_path):
+                return None
+            os.makedirs(self.path, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS records ("
+                "id TEXT PRIMARY KEY, row INTEGER NOT NULL, metadata TEXT NOT NULL, sparse TEXT)"
+            )
+            conn.commit()
+            self.conn = conn
+        return self.conn
+
+    def _write_meta(self, conn, version: str):
+        meta = {"namespace": self.name, "dimension": self.dimension, "count": self.count, "version": version}
+        conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [(key, json.dumps(value)) for key, value in meta.items()],
+        )
+
+    def _version(self):
+        conn = self._connection()
+        if conn is None:
+            return None
+        row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load(self):
+        conn = self._connection()
+        if conn is None:
+            return
+        # one read transaction, so the ids match the version they are recorded under
+        conn.execute("BEGIN")
+        try:
+            meta = _read_meta(conn)
+            ids = [vector_id for (vector_id,) in conn.execute("SELECT id FROM records ORDER BY row")]
+        finally:
+            conn.execute("COMMIT")
+        if "version" not in meta:
+            return
+        self.dimension = meta["dimension"]
+        self.ids = ids
+        self.count = len(self.ids)
+        self.id_to_row = {vector_id: row for row, vector_id in enumerate(self.ids)}
+        self.matrix = np.load(self.vectors_path, mmap_mode="r")
+
+        self.ivf = None
+        centroids_path = os.path.join(self.path, "ivf_centroids.npy")
+        assignments_path = os.path.join(self.path, "ivf_assignments.npy")
+        if os.path.exists(centroids_path) and os.path.exists(assignments_path):
+            assignments = np.load(assignments_path, mmap_mode="r")
+            if len(assignments) == self.count:
+                self.ivf = IVFIndex(np.load(centroids_path), assignments)
+        self.loaded_version = meta["version"]
+
+    def refresh(self):
+        """Pick up writes flushed by another process"""
+        with self.lock:
+            if not self.dirty and self._version() != self.loaded_version:
+                self.load()
+
+    def _records(self, ids: list) -> dict:
+        """(metadata, sparse values) per id, unflushed writes first and the record store for the rest"""
+        found = {vector_id: self.pending[vector_id] for vector_id in ids if vector_id in self.pending}
+        remaining = [vector_id for vector_id in ids if vector_id not in found]
+        conn = self._connection()
+        if conn is None:
+            return found
+        for i in range(0, len(remaining), SQLITE_MAX_VARIABLES):
+            batch = remaining[i : i + SQLITE_MAX_VARIABLES]
+            placeholders = ",".join("?" * len(batch))
+            rows = conn.execute(
+                f"SELECT id, metadata, sparse FROM records WHERE id IN ({placeholders})", batch
+            )
+            for vector_id, metadata, sparse in rows:
+                found[vector_id] = (json.loads(metadata), json.loads(sparse) if sparse else None)
+        return found
+
+    def _iter_metadata(self):
+        """(row, metadata) for every vector, streamed from the record store"""
+        conn = self._connection()
+        if conn is not None:
+            for vector_id, metadata in conn.execute("SELECT id, metadata FROM records"):
+                row = self.id_to_row.get(vector_id)
+                if row is not None and vector_id not in self.pending:
+                    yield row, json.loads(metadata)
+        for vector_id, (metadata, _) in self.pending.items():
+            yield self.id_to_row[vector_id], metadata
+
+    def _ensure_capacity(self, extra: int):
+        needed = self.count + extra
+        writable = isinstance(self.matrix, np.ndarray) and not isinstance(self.matrix, np.memmap)
+        if writable and len(self.matrix) >= needed:
+            return
+        capacity = max(needed, 2 * self.count, 1024)
+        matrix = np.zeros((capacity, self.dimension), dtype=np.float32)
+        if self.count:
+            matrix[: self.count] = self.matrix[: self.count]
+        self.matrix = matrix
+
+    def upsert(self, vectors: list):
+        with self.lock:
+            if self.dimension is None:
+                self.dimension = len(vectors[0]["values"])
+            new_vectors = [v for v in vectors if v["id"] not in self.id_to_row]
+            self._ensure_capacity(len(new_vectors))
+
+            for vector in vectors:
+                if len(vector["values"]) != self.dimension:
+                    raise ValueError(
+                        f"Vector dimension {len(vector['values'])} does not match namespace dimension {self.dimension}"
+                    )
+                row = self.id_to_row.get(vector["id"])
+                if row is None:
+                    row = self.count
+                    self.count += 1
+                    self.ids.append(vector["id"])
+                    self.id_to_row[vector["id"]] = row
+                self.matrix[row] = vector["values"]
+                self.pending[vector["id"]] = (vector.get("metadata", {}), vector.get("sparse_values"))
+                self.deleted.discard(vector["id"])
+
+            self.ivf = None
+            self.dirty = True
+            return len(vectors)
+
+    def delete(self, ids: list):
+        with self.lock:
+            removed = 0
+            for vector_id in ids:
+                row = self.id_to_row.pop(vector_id, None)
+                if row is None:
+                    continue
+                self._ensure_capacity(0)
+                last = self.count - 1
+                if row != last:
+                    # swap-remove keeps the matrix dense
+                    self.matrix[row] = self.matrix[last]
+                    self.ids[row] = self.ids[last]
+                    self.id_to_row[self.ids[row]] = row
+                    self.moved.add(self.ids[row])
+                self.ids.pop()
+                self.pending.pop(vector_id, None)
+                self.moved.discard(vector_id)
+                self.deleted.add(vector_id)
+                self.count -= 1
+                removed += 1
+            if removed:
+                self.ivf = None
+                self.dirty = True
+            return removed
+
+    def flush(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            pid = os.getpid()
+            matrix = np.asarray(self.matrix[: self.count], dtype=np.float32) if self.count else \
+                np.zeros((0, self.dimension or 0), dtype=np.float32)
+
+            tmp_vectors = os.path.join(self.path, f"vectors.{pid}.tmp.npy")
+            np.save(tmp_vectors, matrix)
+            os.replace(tmp_vectors, self.vectors_path)
+
+            for name in ("ivf_centroids", "ivf_assignments"):
+                stale = os.path.join(self.path, f"{name}.npy")
+                if self.ivf is None and os.path.exists(stale):
+                    os.remove(stale)
+            if self.ivf is not None:
+                np.save(os.path.join(self.path, "ivf_centroids.npy"), self.ivf.centroids)
+                np.save(os.path.join(self.path, "ivf_assignments.npy"), np.asarray(self.ivf.assignments))
+
+            # only the records changed since the last flush are written
+            version = uuid.uuid4().hex
+            conn = self._connection(create=True)
+            with conn:
+                conn.executemany("DELETE FROM records WHERE id = ?", [(vector_id,) for vector_id in self.deleted])
+                conn.executemany(
+                    "INSERT OR REPLACE INTO records (id, row, metadata, sparse) VALUES (?, ?, ?, ?)",
+                    [
+                        (vector_id, self.id_to_row[vector_id], json.dumps(metadata),
+                         json.dumps(sparse) if sparse else None)
+                        for vector_id, (metadata, sparse) in self.pending.items()
+                    ],
+                )
+                conn.executemany(
+                    "UPDATE records SET row = ? WHERE id = ?",
+                    [(self.id_to_row[vector_id], vector_id) for vector_id in self.moved if vector_id not in self.pending],
+                )
+                self._write_meta(conn, version)
+
+            self.matrix = np.load(self.vectors_path, mmap_mode="r")
+            self.loaded_version = version
+            self.pending = {}
+            self.deleted = set()
+            self.moved = set()
+            self.dirty = False
+
+    def _candidate_rows(self, query, filter_dict):
+        if filter_dict:
+            return np.array(
+                sorted(row for row, metadata in self._iter_metadata() if _matches_filter(metadata, filter_dict)),
+                dtype=np.int64,
+            )
+
+        if self.count < settings.LOCAL_VECTOR_STORE_IVF_THRESHOLD:
+            return np.arange(self.count)
+
+        if self.ivf is None:
+            nlist = max(1, int(np.sqrt(self.count)))
+            logger.info(f"Building IVF index with {nlist} lists for {self.count} vectors in {self.path}")
+            self.ivf = IVFIndex.build(self.matrix[: self.count], nlist)
+            self.dirty = True
+        return self.ivf.candidate_rows(query, settings.LOCAL_VECTOR_STORE_IVF_NPROBE)
+
+    def query(self, vector, top_k: int, metric: str, filter_dict: dict = None, sparse_vector: dict = None):
+        with self.lock:
+            if self.count == 0:
+                return []
+            query = np.asarray(vector, dtype=np.float32)
+            rows = self._candidate_rows(query, filter_dict)
+            if len(rows) == 0:
+                return []
+
+            candidates = np.asarray(self.matrix[rows], dtype=np.float32)
+            scores = candidates @ query
+            if metric == "cosine":
+                norms = np.linalg.norm(candidates, axis=1) * (np.linalg.norm(query) or 1.0)
+                scores = scores / np.where(norms == 0, 1.0, norms)
+
+            if sparse_vector and sparse_vector.get("indices"):
+                # rescore a dense-preselected pool with the sparse dot product
+                pool = min(len(rows), max(top_k * 10, 100))
+                order = np.argpartition(-scores, pool - 1)[:pool]
+                rows, scores = rows[order], scores[order]
+                query_sparse = dict(zip(sparse_vector["indices"], sparse_vector["values"]))
+                records = self._records([self.ids[row] for row in rows])
+                scores = scores + np.array(
+                    [_sparse_dot(records.get(self.ids[row], ({}, None))[1], query_sparse) for row in rows],
+                    dtype=np.float32,
+                )
+
+            k = min(top_k, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            records = self._records([self.ids[rows[i]] for i in top])
+            return [
+                (self.ids[rows[i]], float(scores[i]), records.get(self.ids[rows[i]], ({}, None))[0])
+                for i in top
+            ]
+
+
+class LocalVectorStore:
+    """Process-wide registry of local namespaces with debounced flushing to disk"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.namespaces = {}
+        self.lock = threading.Lock()
+        self.flush_task = None
+
+    def index_path(self):
+        return os.path.join(self.root, "indexes.json")
+
+    def load_indexes(self):
+        if not os.path.exists(self.index_path()):
+            return {}
+        with open(self.index_path(), "r") as f:
+            return json.load(f)
+
+    def save_index(self, name: str, dimension: int, metric: str):
+        indexes = self.load_indexes()
+        indexes[name] = {"name": name, "host": name, "dimension": dimension, "metric": metric}
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = os.path.join(self.root, f"indexes.{os.getpid()}.tmp.json")
+        with open(tmp_path, "w") as f:
+            json.dump(indexes, f)
+        os.replace(tmp_path, self.index_path())
+        return indexes[name]
+
+    def namespace(self, namespace: str) -> LocalNamespace:
+        with self.lock:
+            store = self.namespaces.get(namespace)
+            if store is None:
+                safe_name = re.sub(r"[^A-Za-z0-9._@-]", "_", namespace)
+                digest = hashlib.sha1(namespace.encode("utf-8")).hexdigest()[:8]
+                store = LocalNamespace(os.path.join(self.root, "namespaces", f"{safe_name}-{digest}"), namespace)
+                self.namespaces[namespace] = store
+        store.refresh()
+        return store
+
+    def existing_namespaces(self):
+        directory = os.path.join(self.root, "namespaces")
+        return os.listdir(directory) if os.path.isdir(directory) else []
+
+    def namespace_counts(self) -> dict:
+        """Vector counts of every namespace on disk, unflushed counts for the ones changed in this process"""
+        counts = {}
+        directory = os.path.join(self.root, "namespaces")
+        for entry in self.existing_namespaces():
+            db_path = os.path.join(directory, entry, RECORDS_DB)
+            if not os.path.exists(db_path):
+                continue
+            try:
+                conn = sqlite3.connect(db_path, timeout=30)
+                try:
+                    meta = _read_meta(conn)
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Could not read local vector store stats from {db_path}: {str(e)}")
+                continue
+            if "namespace" in meta:
+                counts[meta["namespace"]] = meta["count"]
+        with self.lock:
+            loaded = list(self.namespaces.items())
+        for namespace, store in loaded:
+            if store.dirty:
+                counts[namespace] = store.count
+        return counts
+
+    def schedule_flush(self):
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.get_running_loop().create_task(self._delayed_flush())
+
+    async def _delayed_flush(self):
+        await asyncio.sleep(settings.LOCAL_VECTOR_STORE_FLUSH_DELAY)
+        await asyncio.to_thread(self.flush_all)
+
+    def flush_all(self):
+        for store in list(self.namespaces.values()):
+            try:
+                store.flush()
+            except OSError as e:
+                logger.error(f"Error flushing local vector store {store.path}: {str(e)}")
+
+
+local_vector_store = LocalVectorStore(settings.LOCAL_VECTOR_STORE_DIR)
+
+async def close_local_vector_store():
+    await asyncio.to_thread(local_vector_store.flush_all)
+
+
+class LocalVectorStoreService:
+    """
+    In-process vector store with the same interface and response shapes as PineconeService.
+
+    The local backend keeps a single logical index per LOCAL_VECTOR_STORE_DIR, so index_host
+    is accepted for interface compatibility and namespaces provide the isolation.
+    """
+
+    # Vector records are formatted exactly as for Pinecone
+    upsert_format = PineconeService.upsert_format
+    hybrid_scale = PineconeService.hybrid_scale
+
+    def __init__(self):
+        self.store = local_vector_store
+
+    def _metric(self):
+        indexes = self.store.load_indexes()
+        for index in indexes.values():
+            return index.get("metric", "dotproduct")
+        return "dotproduct"
+
+    async def list_pinecone_indexes(self):
+        return {"indexes": list(self.store.load_indexes().values())}
+
+    async def create_index(self, index_name: str, dimension: int, metric: str):
+        if metric not in SUPPORTED_METRICS:
+            raise HTTPException(status_code=400, detail=f"Local vector store supports {SUPPORTED_METRICS} metrics, got {metric}")
+        index = await asyncio.to_thread(self.store.save_index, index_name, dimension, metric)
+        return {"host": index["host"]}
+
+    async def upsert_vectors(self, index_host, input, namespace):
+        if not input:
+            return {"upsertedCount": 0}
+        store = self.store.namespace(namespace)
+        try:
+            upserted = await asyncio.to_thread(store.upsert, input)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        self.store.schedule_flush()
+        return {"upsertedCount": upserted}
+
+    async def delete_vectors(self, index_host, ids: list, namespace):
+        store = self.store.namespace(namespace)
+        await asyncio.to_thread(store.delete, ids)
+        self.store.schedule_flush()
+        return {}
+
+    async def describe_index_stats(self, index_host):
+        counts = await asyncio.to_thread(self.store.namespace_counts)
+        namespaces = {namespace: {"vectorCount": count} for namespace, count in counts.items()}
+        return {
+            "namespaces": namespaces,
+            "totalVectorCount": sum(ns["vectorCount"] for ns in namespaces.values()),
+        }
+
+    def _format_matches(self, results, include_metadata: bool, namespace: str):
+        matches = []
+        for vector_id, score, metadata in results:
+            match = {"id": vector_id, "score": score}
+            if include_metadata:
+                match["metadata"] = metadata
+            matches.append(match)
+        return {"matches": matches, "namespace": namespace, "usage": {"readUnits": 0}}
+
+    async def pinecone_query(
+        self,
+        index_host: str,
+        namespace: str,
+        top_k: int,
+        vector: list,
+        include_metadata: bool,
+        filter_dict: dict = None,
+    ):
+        store = self.store.namespace(namespace)
+        results = await asyncio.to_thread(store.query, vector, top_k, self._metric(), filter_dict)
+        return self._format_matches(results, include_metadata, namespace)
+
+    async def pinecone_hybrid_query(
+        self,
+        index_host,
+        namespace,
+        top_k,
+        alpha: float,
+        query_vector_embeds: list,
+        query_sparse_embeds: dict,
+        include_metadata: bool,
+        filter_dict: dict = None,
+    ):
+        if query_vector_embeds is None or query_sparse_embeds is None:
+            raise HTTPException(status_code=400, detail="Hybrid query needs both dense and sparse query embeddings")
+        hdense, hsparse = self.hybrid_scale(query_vector_embeds, query_sparse_embeds, alpha)
+        store = self.store.namespace(namespace)
+        results = await asyncio.to_thread(store.query, hdense, top_k, self._metric(), filter_dict, hsparse)
+        return self._format_matches(results, include_metadata, namespace)
@@ -10,7 +10,9 @@ from fastapi import HTTPException
 from pinecone import Pinecone
 
 from app.config.settings import get_settings
+from app.config.http_client import get_http_client
 from app.utils.logging_util import pinecone_logger, logger
+from app.utils.usage_recorder_util import usage_recorder
 
 settings = get_settings()
 
@@ -21,6 +23,8 @@ class PineconeService:
         self.index_url = settings.PINECONE_CREATE_INDEX_URL
         self.dense_embed_url = settings.PINECONE_EMBED_URL
         self.upsert_url = settings.PINECONE_UPSERT_URL
+        self.delete_url = settings.PINECONE_DELETE_URL
+        self.describe_index_stats_url = settings.PINECONE_DESCRIBE_INDEX_STATS_URL
         self.query_url = settings.PINECONE_QUERY_URL
         self.list_index_url = settings.PINECONE_LIST_INDEXES_URL
         self.semaphore = asyncio.Semaphore(10)
@@ -41,10 +45,10 @@ class PineconeService:
         }
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, headers=headers)
-                response.raise_for_status()
-                return response.json()
+            client = get_http_client("pinecone")
+            response = await client.get(url, headers=headers)
+            response.raise_for_status()
+            return response.json()
 
         except httpx.HTTPStatusError as e:
 
@@ -73,36 +77,36 @@ class PineconeService:
             }
 
             try:
-                async with httpx.AsyncClient() as client:
-                    response = await client.post(
-                        self.index_url, headers=headers, json=index_data
-                    )
-                    response.raise_for_status()
+                client = get_http_client("pinecone")
+                response = await client.post(
+                    self.index_url, headers=headers, json=index_data
+                )
+                response.raise_for_status()
 
-                    retry_count = 0
-                    max_retries = 30
-                    while retry_count < max_retries:
-                        status = (
-                            self.pc.describe_index(index_name)
-                            .get("status")
-                            .get("state")
-                        )
-                        logger.info(f"Index status: {status}")
+                retry_count = 0
+                max_retries = 30
+                while retry_count < max_retries:
+                    status = (
+                        self.pc.describe_index(index_name)
+                        .get("status")
+                        .get("state")
+                    )
+                    logger.info(f"Index status: {status}")
 
-                        if status == "Ready":
-                            logger.info(f"Index {index_name} is ready")
-                            break
+                    if status == "Ready":
+                        logger.info(f"Index {index_name} is ready")
+                        break
 
-                        retry_count += 1
-                        time.sleep(2)
+                    retry_count += 1
+                    time.sleep(2)
 
-                    if retry_count > max_retries:
-                        raise HTTPException(
-                            status_code=500, detail="Index creation timed out"
-                        )
+                if retry_count > max_retries:
+                    raise HTTPException(
+                        status_code=500, detail="Index creation timed out"
+                    )
 
-                    logger.info("Index Created")
-                    return response.json()
+                logger.info("Index Created")
+                return response.json()
 
             except httpx.HTTPStatusError as e:
                 parsed_response = json.loads(response.content.decode("utf-8"))
@@ -151,12 +155,13 @@ class PineconeService:
 
         payload = {"vectors": input, "namespace": namespace}
         try:
-            async with httpx.AsyncClient(timeout= self.timeout) as client:
-                response = await client.post(
-                    url=url, headers=headers, json=payload
-                )
-                response.raise_for_status()
-                return response.json()
+            client = get_http_client("pinecone")
+            response = await client.post(
+                url=url, headers=headers, json=payload, timeout=self.timeout
+            )
+            response.raise_for_status()
+            usage_recorder.record("pinecone", index_host, "upsert", response.json().get("usage"), response.elapsed.total_seconds())
+            return response.json()
 
         except httpx.HTTPStatusError as e:
             logging.error(f"Error in upsert vectors http status error : {str(e)} - {e.response.text}")
@@ -170,6 +175,65 @@ class PineconeService:
             logging.error(f"Error in upsert vectors : {str(e)} ")
             raise HTTPException(status_code=500, detail=str(e))
 
+    async def delete_vectors(self, index_host, ids: list, namespace):
+
+        headers = {
+            "Api-Key": self.pinecone_api_key,
+            "Content-Type": "application/json",
+            "X-Pinecone-API-Version": self.api_version,
+        }
+
+        url = self.delete_url.format(index_host)
+
+        payload = {"ids": ids, "namespace": namespace}
+        try:
+            client = get_http_client("pinecone")
+            response = await client.post(
+                url=url, headers=headers, json=payload, timeout=self.timeout
+            )
+            response.raise_for_status()
+            return response.json()
+
+        except httpx.HTTPStatusError as e:
+            logging.error(f"Error in delete vectors http status error : {str(e)} - {e.response.text}")
+            raise HTTPException(status_code=400, detail=e.response.text)
+
+        except httpx.HTTPError as e:
+            logging.error(f"Error in delete vectors http error : {str(e)}")
+            raise HTTPException(status_code=400, detail=str(e))
+
+        except Exception as e:
+            logging.error(f"Error in delete vectors : {str(e)} ")
+            raise HTTPException(status_code=500, detail=str(e))
+
+    async def describe_index_stats(self, index_host):
+
+        headers = {
+            "Api-Key": self.pinecone_api_key,
+            "Content-Type": "application/json",
+            "X-Pinecone-API-Version": self.api_version,
+        }
+
+        url = self.describe_index_stats_url.format(index_host)
+
+        try:
+            client = get_http_client("pinecone")
+            response = await client.post(url=url, headers=headers, json={})
+            response.raise_for_status()
+            return response.json()
+
+        except httpx.HTTPStatusError as e:
+            logging.error(f"Error in describe index stats http status error : {str(e)} - {e.response.text}")
+            raise HTTPException(status_code=400, detail=e.response.text)
+
+        except httpx.HTTPError as e:
+            logging.error(f"Error in describe index stats http error : {str(e)}")
+            raise HTTPException(status_code=400, detail=str(e))
+
+        except Exception as e:
+            logging.error(f"Error in describe index stats : {str(e)} ")
+            raise HTTPException(status_code=500, detail=str(e))
+
     def hybrid_scale(self, dense, sparse, alpha: float):
 
         if alpha < 0 or alpha > 1:
@@ -186,7 +250,7 @@ class PineconeService:
         index_host,
         namespace,
         top_k,
-        alpha: int,
+        alpha: float,
         query_vector_embeds: list,
         query_sparse_embeds: dict,
         include_metadata: bool,
@@ -194,7 +258,7 @@ class PineconeService:
     ):
 
         if query_vector_embeds is None or query_sparse_embeds is None:
-            time.sleep(2)
+            raise HTTPException(status_code=400, detail="Hybrid query needs both dense and sparse query embeddings")
 
         headers = {
             "Api-Key": self.pinecone_api_key,
@@ -228,20 +292,20 @@ class PineconeService:
 
         url = self.query_url.format(index_host)
         try:
-            async with httpx.AsyncClient(timeout=self.timeout) as client:
-                response = await client.post(url, headers=headers, json=payload)
-                pinecone_logger.info(f"pinecone hybrid query read units: {response.json()['usage']}")
-                return response.json()
+            client = get_http_client("pinecone")
+            response = await client.post(url, headers=headers, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            pinecone_logger.info(f"pinecone hybrid query read units: {response.json()['usage']}")
+            usage_recorder.record("pinecone", index_host, "query", response.json().get("usage"), response.elapsed.total_seconds())
+            return response.json()
+
+        except httpx.HTTPStatusError as e:
+            logger.error(f"httpx status error in pinecone hybrid query : {str(e)} - {e.response.text}")
+            raise HTTPException(status_code=400, detail=f"httpx status error in pinecone hybrid query : {str(e)} - {e.response.text}")
 
         except httpx.HTTPError as e:
-            if e.response is not None:
-                parsed_response = json.loads(e.response.content.decode("utf-8"))
-                error_message = parsed_response.get("error", {}).get("message", "Unknown error occurred")
-                logging.error(f"Error from Pinecone: {error_message}")
-                raise HTTPException(status_code=400, detail=error_message)
-            else:
-                logging.error(f"HTTP error without response: {str(e)}")
-                raise HTTPException(status_code=400, detail="Unknown HTTP error occurred")
+            logging.error(f"HTTP error without response: {str(e)}")
+            raise HTTPException(status_code=400, detail="Unknown HTTP error occurred")
 
         except Exception as e:
             logging.error(f"Error performing hybrid query: {str(e)}")
@@ -277,10 +341,11 @@ class PineconeService:
         url = self.query_url.format(index_host)
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=headers, json=payload)
-                pinecone_logger.info(f"pinecone Normal query read units: {response.json()['usage']}")
-                return response.json()
+            client = get_http_client("pinecone")
+            response = await client.post(url, headers=headers, json=payload)
+            pinecone_logger.info(f"pinecone Normal query read units: {response.json()['usage']}")
+            usage_recorder.record("pinecone", index_host, "query", response.json().get("usage"), response.elapsed.total_seconds())
+            return response.json()
 
 
         except httpx.HTTPStatusError as e:
@@ -1,35 +1,59 @@
 from app.services.pinecone_service import PineconeService
 from app.services.llm_service import LLMService
+from app.config.settings import get_settings
+from app.utils.stage_graph_util import run_stage_graph
+from app.utils.logging_util import logger
+from app.utils.llm_memo_util import json_completion_check
+from app.utils.tracing_util import span
 from fastapi import Depends
 import json
+import time
 
 from app.prompts.query_analysis.preprocess_prompts import PREPROCESS_SYSTEM_PROMPT, PREPROCESS_USER_PROMPT_TEMPLATE
 from app.prompts.query_analysis.intent_analysis_prompts import INTENT_SYSTEM_PROMPT, INTENT_USER_PROMPT_TEMPLATE
 from app.prompts.query_analysis.reformulate_prompts import REFORMULATE_SYSTEM_PROMPT, REFORMULATE_USER_PROMPT_TEMPLATE
 from app.prompts.query_analysis.rag_decision_prompts import RAG_DECISION_SYSTEM_PROMPT, RAG_DECISION_USER_PROMPT_TEMPLATE
+from app.prompts.query_analysis.fused_analysis_prompts import FUSED_ANALYSIS_SYSTEM_PROMPT, FUSED_ANALYSIS_USER_PROMPT_TEMPLATE
 
 
+settings = get_settings()
 ps = PineconeService()
 
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, Callable
+
+# Only analysis answers the pipeline can use are memoized
+_VALID_JSON = json_completion_check()
+_VALID_REFORMULATION = json_completion_check("reformulated_query")
+_VALID_RAG_DECISION = json_completion_check("use_rag")
+_VALID_FUSED_ANALYSIS = json_completion_check("preprocess", "intent_analysis", "reformulated_query")
+
+
+def _parse_use_rag(value) -> bool:
+    if isinstance(value, str):
+        return "True" in value or "true" in value
+    return bool(value)
 
 
 class QueryAnalysisPipeline:
     def __init__(self, llm_service : LLMService = Depends(LLMService)):
         self.llm_service = llm_service
-        
+        self.model_name = settings.QUERY_ANALYSIS_MODEL
+        self.mode = settings.QUERY_ANALYSIS_MODE
 
 
     async def preprocess_user_input(self, raw_input: str) -> Dict[str, Any]:
         
         user_prompt = PREPROCESS_USER_PROMPT_TEMPLATE.format(raw_input = raw_input)
         
-        response = await self.llm_service.openai_api_call(
-            model_name="gpt-4-turbo",
-            system_prompt=PREPROCESS_SYSTEM_PROMPT,
-            user_prompt=user_prompt,
-            response_format={"type": "json_object"}
-        )
+        with span("analysis.preprocess"):
+            response = await self.llm_service.memoized_call(
+                "openai",
+                model_name=self.model_name,
+                system_prompt=PREPROCESS_SYSTEM_PROMPT,
+                user_prompt=user_prompt,
+                validate=_VALID_JSON,
+                response_format={"type": "json_object"}
+            )
         
         try:
             content = response["choices"][0]["message"]["content"]
@@ -46,28 +70,46 @@ class QueryAnalysisPipeline:
         
         user_prompt = INTENT_USER_PROMPT_TEMPLATE.format(query = query)
         
-        response = await self.llm_service.openai_api_call(
-            model_name="gpt-4-turbo",
-            system_prompt = INTENT_SYSTEM_PROMPT,
-            user_prompt = user_prompt,
-            response_format={"type": "json_object"}
-        )
+        with span("analysis.intent"):
+            response = await self.llm_service.memoized_call(
+                "openai",
+                model_name=self.model_name,
+                system_prompt = INTENT_SYSTEM_PROMPT,
+                user_prompt = user_prompt,
+                validate = _VALID_JSON,
+                response_format={"type": "json_object"}
+            )
         
         return response["choices"][0]["message"]["content"]
     
-    async def reformulate_query(self, query: str, intent_analysis: Dict[str, Any]) -> str:
+    async def reformulate_query(self, query: str, intent_analysis: Dict[str, Any], on_field: Callable = None) -> str:
         
         prompt = REFORMULATE_USER_PROMPT_TEMPLATE.format(
             query = query,
             intent_analysis = intent_analysis
         )
-        
-        response = await self.llm_service.openai_api_call(
-            model_name = "gpt-4-turbo",
-            system_prompt = REFORMULATE_SYSTEM_PROMPT,
-            user_prompt = prompt,
-            response_format={"type": "json_object"}
-        )
+
+        with span("analysis.reformulate"):
+            if on_field is not None:
+                # Streamed so the reformulated query is available before the rest of the JSON
+                response = await self.llm_service.stream_json_call(
+                    "openai",
+                    model_name = self.model_name,
+                    system_prompt = REFORMULATE_SYSTEM_PROMPT,
+                    user_prompt = prompt,
+                    on_field = on_field,
+                    validate = _VALID_REFORMULATION,
+                    response_format={"type": "json_object"}
+                )
+            else:
+                response = await self.llm_service.memoized_call(
+                    "openai",
+                    model_name = self.model_name,
+                    system_prompt = REFORMULATE_SYSTEM_PROMPT,
+                    user_prompt = prompt,
+                    validate = _VALID_REFORMULATION,
+                    response_format={"type": "json_object"}
+                )
         return response["choices"][0]["message"]["content"]
     
     async def make_rag_decision(
@@ -75,8 +117,8 @@ class QueryAnalysisPipeline:
         original_query: str, 
         reformulated_query: str, 
         intent_analysis: Dict[str, Any]
-    ) -> Tuple[bool, str]:
-        """Decide if RAG is necessary and provide reasoning."""
+    ) -> Dict[str, Any]:
+        """Decide if RAG is necessary, suggest retrieval sizes and provide reasoning."""
 
         prompt = RAG_DECISION_USER_PROMPT_TEMPLATE.format(
             original_query = original_query,
@@ -84,35 +126,135 @@ class QueryAnalysisPipeline:
             intent_analysis = intent_analysis
         )
         
-        response = await self.llm_service.openai_api_call(
-            model_name = "gpt-4-turbo",
-            system_prompt = RAG_DECISION_SYSTEM_PROMPT,
-            user_prompt = prompt
-        )
+        with span("analysis.rag_decision"):
+            response = await self.llm_service.memoized_call(
+                "openai",
+                model_name = self.model_name,
+                system_prompt = RAG_DECISION_SYSTEM_PROMPT,
+                user_prompt = prompt,
+                validate = _VALID_RAG_DECISION,
+                response_format={"type": "json_object"}
+            )
         
         decision_text = response["choices"][0]["message"]["content"]
-        use_rag = "True" in decision_text.split(" ")[0]
-        
-        return use_rag, decision_text
+        try:
+            decision = json.loads(decision_text)
+        except json.JSONDecodeError:
+            # free-text answer: the verdict is the first word and no sizes are suggested
+            return {
+                "use_rag": "True" in decision_text.split(" ")[0],
+                "top_k": None,
+                "top_n": None,
+                "reasoning": decision_text
+            }
+
+        return {
+            "use_rag": _parse_use_rag(decision.get("use_rag", True)),
+            "top_k": decision.get("top_k"),
+            "top_n": decision.get("top_n"),
+            "reasoning": decision.get("reasoning", "")
+        }
     
-    async def process_query(self, query: str) -> Dict[str, Any]:
-        """Process the full pipeline and return results."""
+    async def fused_analysis(self, query: str, on_field: Callable = None) -> Dict[str, Any]:
+        """Run preprocess, intent, reformulation and the RAG decision as one structured-output call."""
+
+        user_prompt = FUSED_ANALYSIS_USER_PROMPT_TEMPLATE.format(raw_input = query)
+
+        with span("analysis.fused"):
+            if on_field is not None:
+                response = await self.llm_service.stream_json_call(
+                    "openai",
+                    model_name = self.model_name,
+                    system_prompt = FUSED_ANALYSIS_SYSTEM_PROMPT,
+                    user_prompt = user_prompt,
+                    on_field = on_field,
+                    validate = _VALID_FUSED_ANALYSIS,
+                    response_format={"type": "json_object"}
+                )
+            else:
+                response = await self.llm_service.memoized_call(
+                    "openai",
+                    model_name = self.model_name,
+                    system_prompt = FUSED_ANALYSIS_SYSTEM_PROMPT,
+                    user_prompt = user_prompt,
+                    validate = _VALID_FUSED_ANALYSIS,
+                    response_format={"type": "json_object"}
+                )
+
+        content = json.loads(response["choices"][0]["message"]["content"])
+
+        return {
+            "original_query": query,
+            "preprocess_query": content["preprocess"],
+            "intent_analysis": content["intent_analysis"],
+            "reformulated_query": content["reformulated_query"],
+            "use_rag": _parse_use_rag(content.get("use_rag", True)),
+            "top_k": content.get("top_k"),
+            "top_n": content.get("top_n"),
+            "reasoning": content.get("reasoning", "")
+        }
+
+    def _reformulated_query_handler(self, on_reformulated: Callable):
+        """Adapt an on_reformulated(query) callback to the streamed-field callback of the JSON stages"""
+        if on_reformulated is None:
+            return None
+
+        def on_field(key, value):
+            if key != "reformulated_query":
+                return
+            # the fused answer nests the reformulation stage's object under the same key
+            if isinstance(value, dict):
+                value = value.get("reformulated_query")
+            if isinstance(value, str) and value:
+                on_reformulated(value)
+
+        return on_field
+
+    async def process_query(self, query: str, mode: str = None, on_reformulated: Callable = None) -> Dict[str, Any]:
+        """
+        Process the full pipeline and return results.
+
+        on_reformulated(reformulated_query) is called as soon as the reformulated query is
+        streamed, before the RAG decision, so callers can start retrieval early.
+        """
+
+        mode = mode or self.mode
+        on_field = self._reformulated_query_handler(on_reformulated)
+        if mode == "fused":
+            start = time.perf_counter()
+            try:
+                result = await self.fused_analysis(query, on_field)
+                elapsed = time.perf_counter() - start
+                result["stage_timings"] = {"fused": elapsed, "total": elapsed}
+                return result
+            except (json.JSONDecodeError, KeyError, TypeError) as e:
+                logger.error(f"Fused query analysis returned an unusable response, falling back to staged analysis: {str(e)}")
+
+        # preprocess and intent analysis are independent, reformulation needs both
+        # and the RAG decision needs the reformulated query
+        stages = {
+            "preprocess": ([], lambda: self.preprocess_user_input(query)),
+            "intent": ([], lambda: self.analyze_intent(query)),
+            "reformulate": (
+                ["preprocess", "intent"],
+                lambda preprocess, intent: self.reformulate_query(preprocess, intent, on_field)
+            ),
+            "rag_decision": (
+                ["reformulate", "intent"],
+                lambda reformulate, intent: self.make_rag_decision(query, reformulate, intent)
+            ),
+        }
+        results, timings = await run_stage_graph(stages)
+        decision = results["rag_decision"]
 
-        preprocess_query = await self.preprocess_user_input(query)
-        # Stage 1: Intent Analysis
-        intent_analysis = await self.analyze_intent(query)
-        
-        # Stage 2: Query Reformulation
-        reformulated_query = await self.reformulate_query(preprocess_query, intent_analysis)
-        
-        # Stage 3: RAG Decision
-        use_rag, reasoning = await self.make_rag_decision(query, reformulated_query, intent_analysis)
-        
         return {
             "original_query": query,
-            "preprocess_query": preprocess_query,
-            "intent_analysis": json.loads(intent_analysis),
-            "reformulated_query": json.loads(reformulated_query),
-            "use_rag": use_rag,
-            "reasoning": reasoning
-        }
\ No newline at end of file
+            "preprocess_query": results["preprocess"],
+            "intent_analysis": json.loads(results["intent"]),
+            "reformulated_query": json.loads(results["reformulate"]),
+            "use_rag": decision["use_rag"],
+            "top_k": decision["top_k"],
+            "top_n": decision["top_n"],
+            "reasoning": decision["reasoning"],
+            "stage_timings": timings
+        }
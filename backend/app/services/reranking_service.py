@@ -5,7 +5,10 @@ import httpx
 from fastapi import HTTPException
 
 from app.config.settings import get_settings
+from app.config.http_client import get_http_client
 from app.utils.logging_util import pinecone_logger, cohere_logger, jina_logger, voyageai_logger, logger
+from app.utils.rerank_cache_util import rerank_cache
+from app.utils.usage_recorder_util import usage_recorder
 
 settings = get_settings()
 
@@ -54,12 +57,13 @@ class RerankerService:
         url = self.pinecone_rerank_url
 
         try:
-            async with httpx.AsyncClient(timeout = self.timeout) as client:
-                response = await client.post(url, headers=headers, json=payload)
-                response.raise_for_status()
-                logging.info("reranking done")
-                pinecone_logger.info(f"Reranking model hosted by Pinecone tokens usage : {response.json()['usage']}")
-                return response.json()
+            client = get_http_client("pinecone")
+            response = await client.post(url, headers=headers, json=payload, timeout=self.timeout)
+            response.raise_for_status()
+            logging.info("reranking done")
+            pinecone_logger.info(f"Reranking model hosted by Pinecone tokens usage : {response.json()['usage']}")
+            usage_recorder.record("pinecone", model_name, "rerank", response.json().get("usage"), response.elapsed.total_seconds())
+            return response.json()
 
         except httpx.HTTPStatusError as e:
             parsed_response = json.loads(response.content.decode("utf-8"))
@@ -91,16 +95,18 @@ class RerankerService:
         }
 
         try:
-            async with httpx.AsyncClient(verify=False, timeout = self.timeout) as client:
-                response = await client.post(
-                    rerank_url,
-                    headers=headers,
-                    json=payload,
-                )
-                response.raise_for_status()
-                logging.info("reranking done by cohere")
-                cohere_logger.info(f"Reranking model hosted by Cohere tokens usage : {response.json().get('meta',{}).get('billed_units', {})}")
-                return response.json()
+            client = get_http_client("cohere")
+            response = await client.post(
+                rerank_url,
+                headers=headers,
+                json=payload,
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            logging.info("reranking done by cohere")
+            cohere_logger.info(f"Reranking model hosted by Cohere tokens usage : {response.json().get('meta',{}).get('billed_units', {})}")
+            usage_recorder.record("cohere", model_name, "rerank", response.json().get("meta", {}), response.elapsed.total_seconds())
+            return response.json()
         except httpx.HTTPStatusError as e:
             logging.error(f"HTTP error: {e.response.status_code} - {str(e)}")
             raise HTTPException(
@@ -133,14 +139,15 @@ class RerankerService:
         rerank_url = f"{self.jina_base_url}/{self.RERANK_SUFFIX}"
 
         try:
-            async with httpx.AsyncClient(verify=False, timeout = self.timeout) as client:
-                response = await client.post(
-                    rerank_url, headers=headers, json=payload
-                )
-                response.raise_for_status()
-                logging.info("reranking done by jina")
-                jina_logger.info(f"Reranking model hosted by Jina tokens usage : {response.json().get('usage', {})}")
-                return response.json()
+            client = get_http_client("jina")
+            response = await client.post(
+                rerank_url, headers=headers, json=payload, timeout=self.timeout
+            )
+            response.raise_for_status()
+            logging.info("reranking done by jina")
+            jina_logger.info(f"Reranking model hosted by Jina tokens usage : {response.json().get('usage', {})}")
+            usage_recorder.record("jina", model_name, "rerank", response.json().get("usage"), response.elapsed.total_seconds())
+            return response.json()
         except httpx.HTTPStatusError as e:
             logging.error(f"HTTP error: {e.response.status_code} - {str(e)}")
             raise HTTPException(
@@ -158,6 +165,26 @@ class RerankerService:
 
     async def voyage_rerank(
             self, model_name: str, query: str, documents: list, top_n: int
+    ):
+        if not settings.RERANK_CACHE_ENABLED:
+            return await self._voyage_rerank(model_name, query, documents, top_n)
+
+        async def fetch(batch):
+            # Score every document (top_k=None) so each score can be reused by later candidate sets
+            response = await self._voyage_rerank(model_name, query, batch, None)
+            scores = [0.0] * len(batch)
+            for result in response.get("data", []):
+                scores[result["index"]] = result["relevance_score"]
+            return scores
+
+        result = await rerank_cache.get_or_rerank(
+            "voyageai", model_name, query, documents, top_n, fetch
+        )
+        logger.info(f"Voyage rerank cache: {result['cache']}")
+        return result
+
+    async def _voyage_rerank(
+            self, model_name: str, query: str, documents: list, top_n: int
     ):
         headers = {
             "content-type": "application/json",
@@ -167,22 +194,24 @@ class RerankerService:
         payload = {
             "model": model_name,
             "query": query,
-            "top_k": top_n,
             "documents": documents,
         }
+        if top_n is not None:
+            payload["top_k"] = top_n
 
         rerank_url = f"{self.voyage_base_url}/{self.RERANK_SUFFIX}"
 
         try:
-            async with httpx.AsyncClient(verify=False, timeout = self.timeout) as client:
-                response = await client.post(
-                    rerank_url, headers=headers, json=payload
-                )
-                response.raise_for_status()
-                logging.info("reranking done by voyage")
-                voyageai_logger.info(f"Reranking model hosted by Voyage tokens usage : {response.json().get('usage', {})}")
-                jina_logger.info(f"Reranking model hosted by Voyage tokens usage : {response.json().get('usage', {})}")
-                return response.json()
+            client = get_http_client("voyageai")
+            response = await client.post(
+                rerank_url, headers=headers, json=payload, timeout=self.timeout
+            )
+            response.raise_for_status()
+            logging.info("reranking done by voyage")
+            voyageai_logger.info(f"Reranking model hosted by Voyage tokens usage : {response.json().get('usage', {})}")
+            usage_recorder.record("voyageai", model_name, "rerank", response.json().get("usage"), response.elapsed.total_seconds())
+            jina_logger.info(f"Reranking model hosted by Voyage tokens usage : {response.json().get('usage', {})}")
+            return response.json()
         except httpx.HTTPStatusError as e:
             logging.error(f"HTTP error: {e.response.status_code} - {e.response.text} - {str(e)}")
             raise HTTPException(
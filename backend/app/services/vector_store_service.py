@@ -0,0 +1,43 @@
+from typing import Protocol
+
+from app.config.settings import get_settings
+
+settings = get_settings()
+
+
+class VectorStore(Protocol):
+    """Operations the use cases need from a vector store; responses follow Pinecone's REST shapes"""
+
+    async def list_pinecone_indexes(self) -> dict: ...
+
+    async def create_index(self, index_name: str, dimension: int, metric: str) -> dict: ...
+
+    async def upsert_format(self, chunks: list, vector_embeddings: list, sparse_embeddings: list) -> list: ...
+
+    async def upsert_vectors(self, index_host, input, namespace) -> dict: ...
+
+    async def delete_vectors(self, index_host, ids: list, namespace) -> dict: ...
+
+    async def describe_index_stats(self, index_host) -> dict: ...
+
+    async def pinecone_query(
+        self, index_host: str, namespace: str, top_k: int, vector: list,
+        include_metadata: bool, filter_dict: dict = None,
+    ) -> dict: ...
+
+    async def pinecone_hybrid_query(
+        self, index_host, namespace, top_k, alpha: float, query_vector_embeds: list,
+        query_sparse_embeds: dict, include_metadata: bool, filter_dict: dict = None,
+    ) -> dict: ...
+
+
+def get_vector_store() -> VectorStore:
+    """FastAPI dependency returning the configured vector store backend"""
+    if settings.VECTOR_STORE_BACKEND == "local":
+        from app.services.local_vector_store_service import LocalVectorStoreService
+
+        return LocalVectorStoreService()
+
+    from app.services.pinecone_service import PineconeService
+
+    return PineconeService()
@@ -1,6 +1,7 @@
 import asyncio
+import re
 import time
-import json 
+import json
 
 from fastapi import Depends, HTTPException, status
 from fastapi.responses import JSONResponse, StreamingResponse
@@ -12,12 +13,18 @@ from app.models.schema.query_schema import QueryRequest
 
 from app.services.query_analysis_pipeline_service import QueryAnalysisPipeline
 from app.services.embedding_service import EmbeddingService
-from app.services.pinecone_service import PineconeService
+from app.services.vector_store_service import VectorStore, get_vector_store
 from app.services.reranking_service import RerankerService
 from app.services.llm_service import LLMService
 from app.utils.logging_util import logger, pinecone_logger, voyageai_logger
 from app.utils.folder_structure_util import folder_struct_util
-import json
+from app.utils.chunk_store_util import chunk_store
+from app.utils.response_cache_util import response_cache, context_hash
+from app.utils.sse_util import coalesce_text_chunks
+from app.utils import json_util
+from app.utils.context_assembly_util import assemble_rag_context, count_tokens_async
+from app.utils.tracing_util import span, start_trace
+from app.utils.usage_recorder_util import start_usage_context, usage_summary
 
 from app.prompts.query.response_prompts import (
     RAG_SYSTEM_PROMPT, 
@@ -38,17 +45,43 @@ from app.prompts.query.compliance_prompts import (
 settings = get_settings()
 
 
+def _query_similarity(a: str, b: str) -> float:
+    """Word-set Jaccard similarity of two queries, case-insensitive"""
+    words_a = set(re.findall(r"\w+", a.lower()))
+    words_b = set(re.findall(r"\w+", b.lower()))
+    if not words_a and not words_b:
+        return 1.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+def _has_compliance_verdict(response) -> bool:
+    """Memo validator: the compliance answer starts with its True/False verdict"""
+    try:
+        verdict = response["choices"][0]["message"]["content"].split(" ")[0]
+    except (KeyError, IndexError, TypeError, AttributeError):
+        return False
+    return "True" in verdict or "False" in verdict
+
+
+def _clamp_size(value, default: int, lower: int, upper: int) -> int:
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(lower, min(upper, size))
+
+
 class QueryUseCase:
     def __init__(
         self,
         embedding_service: EmbeddingService = Depends(EmbeddingService),
-        pinecone_service: PineconeService = Depends(PineconeService),
+        vector_store: VectorStore = Depends(get_vector_store),
         reranker_service: RerankerService = Depends(RerankerService),
         qap_service: QueryAnalysisPipeline = Depends(QueryAnalysisPipeline),
         llm_service: LLMService = Depends(LLMService)
     ):
         self.embedding_service = embedding_service
-        self.pinecone_service = pinecone_service
+        self.vector_store = vector_store
         self.reranker_service = reranker_service
         self.qap_service = qap_service
         self.llm_service = llm_service
@@ -59,8 +92,8 @@ class QueryUseCase:
         self.query_input_type = "query"
         self.index_host = "dotproduct-1024-npedpix.svc.aped-4627-b74a.pinecone.io"
         self.llm_model = "claude-3-7-sonnet-20250219"  # Or the latest Claude 3.7 Sonnet model name
-        self.top_k = 20  # Number of results to retrieve from vector DB
-        self.top_n = 10   # Number of results after reranking
+        self.top_k = settings.RAG_TOP_K  # Number of results to retrieve from vector DB
+        self.top_n = settings.RAG_TOP_N   # Number of results after reranking
         
 
     async def get_chunks_by_metadata(
@@ -74,7 +107,7 @@ class QueryUseCase:
     
         zero_vector = [0.0] * self.dimension
         
-        results = await self.pinecone_service.pinecone_query(
+        results = await self.vector_store.pinecone_query(
             index_host=index_host,
             namespace=namespace,
             top_k=max_results,
@@ -100,47 +133,172 @@ class QueryUseCase:
 
         return documents, doc_metadata
 
+    async def get_neighbour_chunks(self, index_host: str, namespace: str, hits: list):
+        """
+        Chunks adjacent to the retrieved hits, read from the local chunk store written at resync.
+        Falls back to the filtered vector query when the store has nothing for this namespace.
+        """
+        neighbours = await chunk_store.get_neighbours(namespace, hits, settings.RAG_NEIGHBOUR_WINDOW)
+        if neighbours is None:
+            logger.info(f"No local chunks for {namespace}, expanding through the vector store")
+            unique_file_paths = list({hit.get("file_path") for hit in hits})
+            return await self.get_chunks_by_metadata(
+                index_host = index_host,
+                namespace = namespace,
+                metadata_filter = {"file_path": {"$in": unique_file_paths}},
+                max_results = 200
+            )
+
+        documents = []
+        doc_metadata = []
+        for chunk in neighbours:
+            documents.append(chunk["text"])
+            doc_metadata.append({
+                "score": 0,
+                "file_path": chunk.get("file_path") or "unknown",
+                "start_line": chunk.get("start_line", "unknown"),
+                "end_line": chunk.get("end_line", "unknown"),
+                "file_name": chunk.get("file_name") or "unknown"
+            })
+        return documents, doc_metadata
+
 
-    async def analyze_query(self, query: str):
-        logger.info(f"Analyzing query: {query}")
-        analysis_result = await self.qap_service.process_query(query)
+    async def analyze_query(self, query: str, on_reformulated = None):
+        logger.debug("Analyzing query: %s", query)
+        analysis_result = await self.qap_service.process_query(query, on_reformulated = on_reformulated)
         logger.info(f"Query analysis complete: use_rag={analysis_result['use_rag']}")
         return analysis_result
-    
-    async def perform_rag(self, reformulated_query: str, email: str, workspace_name: str):
-        # Step 1: Generate embeddings for the query
-        logger.info(f"Generating embeddings for query: {reformulated_query}")
-        query_embedding = await self.embedding_service.voyageai_dense_embeddings(
-            self.embedding_model, 
-            dimension= self.dimension,
-            inputs = [reformulated_query],
-            input_type = self.query_input_type
+
+    def _retrieval_sizes(self, analysis_result: dict):
+        """
+        top_k / top_n for this request from the RAG decision, clamped to the configured bounds
+
+        Returns:
+            tuple: (top_k, top_n); top_k is None when dynamic sizes are off, so the
+            search keeps its configured size
+        """
+        if not settings.RAG_DYNAMIC_SIZES_ENABLED:
+            return None, self.top_n
+
+        top_k = _clamp_size(analysis_result.get("top_k"), self.top_k, settings.RAG_TOP_K_MIN, settings.RAG_TOP_K_MAX)
+        top_n = _clamp_size(analysis_result.get("top_n"), self.top_n, settings.RAG_TOP_N_MIN, settings.RAG_TOP_N_MAX)
+        top_n = min(top_n, top_k)
+        logger.info(
+            f"Retrieval sizes: top_k={top_k}, top_n={top_n} "
+            f"(suggested top_k={analysis_result.get('top_k')}, top_n={analysis_result.get('top_n')})"
         )
+        return top_k, top_n
+
+    def _speculative_results_usable(self, user_query: str, reformulated_query: str) -> bool:
+        """Whether a search on the raw query stands in for one on the reformulated query"""
+        similarity = _query_similarity(user_query, reformulated_query)
+        if similarity >= settings.SPECULATIVE_QUERY_MIN_SIMILARITY:
+            return True
+        logger.info(f"Reformulated query differs from the raw query (similarity {similarity:.2f}), searching again")
+        return False
+
+    def _retrieval_query(self, user_query: str, reformulated_query: str, current_file_path: str, current_file_content: str):
+        """Query searched and reranked after analysis; /query and /stream-query use the same one"""
+        if current_file_content and current_file_path:
+            return f"this is {user_query} and this is enhanced query if incase user query is not sufficient {reformulated_query}, current file path is this (Current file: {current_file_path}) and current file content is this {current_file_content}"
+        return f"this is {user_query} and this is enhanced query if incase user query is not sufficient {reformulated_query}"
+
+    def _prefetch_top_k(self):
+        """Search size for retrieval started before the RAG decision; perform_rag trims it to top_k"""
+        return settings.RAG_TOP_K_MAX if settings.RAG_DYNAMIC_SIZES_ENABLED else None
+    
+    def _resolve_hybrid_alpha(self, alpha: float = None):
+        """Per-request alpha wins over the configured default; alpha 1.0 means dense-only"""
+        if alpha is None and settings.HYBRID_SEARCH_ENABLED:
+            alpha = settings.HYBRID_ALPHA
+        if alpha is None or alpha >= 1.0:
+            return None
+        return alpha
+
+    async def _sparse_query_embedding(self, query: str):
+        try:
+            sparse_embeddings = await self.embedding_service.pinecone_sparse_query_embeddings([query])
+            sparse_embedding = sparse_embeddings[0]
+            if not sparse_embedding.get("indices"):
+                return None
+            return sparse_embedding
+        except Exception as e:
+            logger.warning(f"Sparse query encoding failed, falling back to dense search: {str(e)}")
+            return None
+
+    async def search_vectors(self, query: str, email: str, workspace_name: str, alpha: float = None, top_k: int = None):
+        alpha = self._resolve_hybrid_alpha(alpha)
+
+        # Step 1: Generate embeddings for the query (dense, plus BM25 for hybrid search)
+        # the query can carry the whole current file, so it is only logged (sampled) at debug level
+        logger.debug("Generating embeddings for query: %s", query)
+        with span("embed"):
+            dense_embedding = self.embedding_service.voyageai_dense_embeddings(
+                self.embedding_model, 
+                dimension= self.dimension,
+                inputs = [query],
+                input_type = self.query_input_type
+            )
+            sparse_embedding = None
+            if alpha is not None:
+                query_embedding, sparse_embedding = await asyncio.gather(
+                    dense_embedding, self._sparse_query_embedding(query)
+                )
+            else:
+                query_embedding = await dense_embedding
         query_embedding = query_embedding[0]
+
         # Step 2: Query Pinecone with the embeddings
         index_name = f"{self.similarity_metric}-{self.dimension}"
         namespace = f"{email}-{workspace_name}"
-        index_host = self.index_host
+        if sparse_embedding is not None:
+            logger.info(f"Querying Pinecone index {index_name} with hybrid embeddings, alpha={alpha}")
+            try:
+                with span("vector_query", mode = "hybrid"):
+                    return await self.vector_store.pinecone_hybrid_query(
+                        index_host = self.index_host,
+                        namespace = namespace,
+                        top_k = top_k or settings.HYBRID_TOP_K,
+                        alpha = alpha,
+                        query_vector_embeds = query_embedding,
+                        query_sparse_embeds = sparse_embedding,
+                        include_metadata = True
+                    )
+            except Exception as e:
+                logger.warning(f"Hybrid query failed, falling back to dense search: {str(e)}")
+
         logger.info(f"Querying Pinecone index {index_name} with embeddings")
-        vector_search_results = await self.pinecone_service.pinecone_query(
-            index_host = index_host,
-            namespace = namespace,
-            top_k=self.top_k,
-            vector = query_embedding,
-            include_metadata = True
-        )
+        with span("vector_query", mode = "dense"):
+            vector_search_results = await self.vector_store.pinecone_query(
+                index_host = self.index_host,
+                namespace = namespace,
+                top_k=top_k or self.top_k,
+                vector = query_embedding,
+                include_metadata = True
+            )
+        return vector_search_results
+
+    async def perform_rag(self, reformulated_query: str, email: str, workspace_name: str, vector_search_results: dict = None, alpha: float = None, top_k: int = None, top_n: int = None):
+        namespace = f"{email}-{workspace_name}"
+        index_host = self.index_host
+        top_n = top_n or self.top_n
+        # Steps 1-2 are skipped when speculative retrieval already ran the vector search
+        if vector_search_results is None:
+            vector_search_results = await self.search_vectors(reformulated_query, email, workspace_name, alpha, top_k)
         
         if not vector_search_results or not vector_search_results.get("matches"):
             logger.warning("No matches found in vector database")
             return []
 
-        # Step 3: Extract text passages and metadata from results
+        # Step 3: Extract text passages and metadata from results. A search started before the
+        # RAG decision fetched the largest size, so it is trimmed to this request's top_k
+        matches = vector_search_results.get("matches", [])
+        if top_k:
+            matches = matches[:top_k]
         documents = []
         doc_metadata = []
-        file_paths = []
-        for match in vector_search_results.get("matches", []):
+        for match in matches:
             if match.get("metadata") and match.get("metadata").get("text"):
-                file_paths.append(match.get("metadata", {}).get("file_path", "unknown"))
                 documents.append(match["metadata"]["text"])
                 doc_metadata.append({
                     "score": match.get("score", 0),
@@ -150,70 +308,95 @@ class QueryUseCase:
                     "file_name": match.get("metadata", {}).get("file_name", "unknown")
                 })
 
-        unique_file_paths = list(set(file_paths))
-            
         if not documents:
             logger.warning("No valid documents found in vector search results")
             return []
-        
-        filter_dict = {
-            "file_path": {"$in": unique_file_paths}
-        }
-        metadata_documents, metadata_docs_metadata = await self.get_chunks_by_metadata(
-            index_host = index_host,
-            namespace = namespace,
-            metadata_filter = filter_dict,
-            max_results = 200
-        )
-        
-        # Step 4: Rerank the documents
+
+        # Step 4: Metadata expansion and reranking only need the vector search
+        # results, so both branches run concurrently with their own timeouts
         logger.info(f"Reranking {len(documents)} documents")
-        reranked_results = await self.reranker_service.voyage_rerank(
-            self.reranker_model,
-            reformulated_query,
-            documents,
-            self.top_n
+        expansion_branch = self._run_branch(
+            "metadata expansion",
+            self.get_neighbour_chunks(
+                index_host = index_host,
+                namespace = namespace,
+                hits = doc_metadata
+            ),
+            settings.RAG_METADATA_EXPANSION_TIMEOUT
         )
-        
+        rerank_branch = self._run_branch(
+            "rerank",
+            self.reranker_service.voyage_rerank(
+                self.reranker_model,
+                reformulated_query,
+                documents,
+                top_n
+            ),
+            settings.RAG_RERANK_TIMEOUT
+        )
+        expansion_result, reranked_results = await asyncio.gather(expansion_branch, rerank_branch)
+
         # Step 5: Combine reranked results with metadata
         final_results = []
-        for result in reranked_results.get("data", []):
-            index = result.get("index")
-            if index is not None and 0 <= index < len(doc_metadata):
+        if reranked_results is not None:
+            for result in reranked_results.get("data", []):
+                index = result.get("index")
+                if index is not None and 0 <= index < len(doc_metadata):
+                    final_results.append({
+                        "text": documents[index],
+                        "relevance_score": result.get("relevance_score", 0),
+                        "metadata": doc_metadata[index],
+                        "source": "rerank"
+                    })
+        else:
+            # Fall back to the vector search order when the reranker is unavailable
+            for index in range(min(top_n, len(documents))):
                 final_results.append({
                     "text": documents[index],
-                    "relevance_score": result.get("relevance_score", 0),
-                    "metadata": doc_metadata[index]
+                    "relevance_score": doc_metadata[index]["score"],
+                    "metadata": doc_metadata[index],
+                    "source": "vector"
                 })
-        
+
         merged_final_results = []
-        for i in range(len(metadata_docs_metadata)):
-            merged_final_results.append({
-                "text": metadata_documents[i],
-                "relevance_score": 1.0,
-                "metadata": metadata_docs_metadata[i]
-            })
+        if expansion_result is not None:
+            metadata_documents, metadata_docs_metadata = expansion_result
+            for i in range(len(metadata_docs_metadata)):
+                merged_final_results.append({
+                    "text": metadata_documents[i],
+                    "relevance_score": 1.0,
+                    "metadata": metadata_docs_metadata[i],
+                    "source": "expansion"
+                })
         
         full_final_results = final_results + merged_final_results 
-        logger.info(f"Retrieved {len(final_results)} relevant documents after reranking")
+        logger.info(f"Retrieved {len(final_results)} relevant documents ({'reranked' if reranked_results is not None else 'vector search order'})")
         return full_final_results
 
-    async def generate_response_with_rag(self, folder_structure,  query: str, reformulated_query: str, retrieved_docs: list, context_from_query: str, error_from_query: str):
-        
-        retrieved_context_text = ""
-        metadata_context_text = ""
-        if retrieved_docs:
-            retrieved_context_text = "Here are relevant code snippets from the codebase:\n\n"
-            for i, doc in enumerate(retrieved_docs[:self.top_n]):
-                file_path = doc.get("metadata", {}).get("file_path", "Unknown file")
-                retrieved_context_text += f"--- Document {i+1} (from {file_path}) ---\n"
-                retrieved_context_text += f"{doc['text']}\n\n"
-            
-            metadata_context_text = "Here is additional context around the relevant code snippets:\n\n"
-            for i, doc in enumerate(retrieved_docs[self.top_n:], start=self.top_n):
-                file_path = doc.get("metadata", {}).get("file_path", "Unknown file")
-                metadata_context_text += f"--- Document {i+1} (from {file_path}) ---\n"
-                metadata_context_text += f"{doc['text']}\n\n"
+    async def _run_branch(self, name: str, coro, timeout: float):
+        """Await one retrieval branch, returning None instead of failing the whole query on timeout or error"""
+        with span(name.replace(" ", "_")) as record:
+            try:
+                return await asyncio.wait_for(coro, timeout=timeout)
+            except asyncio.TimeoutError:
+                record["status"] = "timeout"
+                logger.warning(f"RAG {name} timed out after {timeout}s, continuing without it")
+            except Exception as e:
+                record["status"] = "error"
+                logger.error(f"RAG {name} failed, continuing without it: {str(e)}")
+        return None
+
+    async def generate_response_with_rag(self, folder_structure,  query: str, reformulated_query: str, retrieved_docs: list, context_from_query: str, error_from_query: str, namespace: str = "", top_n: int = None):
+        """
+        Generate a response using Claude with the retrieved context packed into the token budget
+
+        Returns:
+            tuple: (response text, context stats with prompt token count and dropped chunks)
+        """
+        context = await assemble_rag_context(namespace, retrieved_docs, folder_structure, top_n or self.top_n)
+        retrieved_context_text = context["retrieved_context_text"]
+        metadata_context_text = context["metadata_context_text"]
+        folder_structure = context["folder_structure"]
         
         # Add context from the query analysis if available
         query_context_text = ""
@@ -236,16 +419,19 @@ class QueryUseCase:
             folder_structure = folder_structure
         )
         
-        overall_prompt = RAG_SYSTEM_PROMPT + user_prompt
+        context_stats = context["stats"]
+        context_stats["prompt_tokens"] = await count_tokens_async(RAG_SYSTEM_PROMPT, user_prompt)
+        logger.info(f"RAG prompt context: {context_stats}")
         logger.info("Generating response with RAG using Claude 3.7 Sonnet")
-        response = await self.llm_service.anthropic_api_call(
-            model_name=self.llm_model,
-            system_prompt=RAG_SYSTEM_PROMPT,
-            user_prompt=user_prompt,
-            user_query=reformulated_query
-        )
+        with span("llm_generation"):
+            response = await self.llm_service.anthropic_api_call(
+                model_name=self.llm_model,
+                system_prompt=RAG_SYSTEM_PROMPT,
+                user_prompt=user_prompt,
+                user_query=reformulated_query
+            )
         text = response.get("content", [])[0].get("text","")
-        return text
+        return text, context_stats
     
     async def generate_response_without_rag(self,folder_structure, query: str, reformulated_query: str, context_from_query: str, error_from_query: str):
         """
@@ -270,12 +456,13 @@ class QueryUseCase:
         )
         
         logger.info("Generating response without RAG using Claude 3.7 Sonnet")
-        response = await self.llm_service.anthropic_api_call(
-            model_name=self.llm_model,
-            system_prompt=NON_RAG_SYSTEM_PROMPT,
-            user_prompt=user_prompt,
-            user_query=reformulated_query
-        )
+        with span("llm_generation"):
+            response = await self.llm_service.anthropic_api_call(
+                model_name=self.llm_model,
+                system_prompt=NON_RAG_SYSTEM_PROMPT,
+                user_prompt=user_prompt,
+                user_query=reformulated_query
+            )
         text = response.get("content", [])[0].get("text","")
         return text
     
@@ -285,18 +472,126 @@ class QueryUseCase:
             query = query
         )
 
-        response = await self.llm_service.groq_api_call(
-            model_name="gemma2-9b-it",
-            system_prompt = COMPLIANCE_SYSTEM_PROMPT,
-            user_prompt=user_prompt,
-        )
+        with span("compliance"):
+            response = await self.llm_service.memoized_call(
+                "groq",
+                model_name="gemma2-9b-it",
+                system_prompt = COMPLIANCE_SYSTEM_PROMPT,
+                user_prompt=user_prompt,
+                validate = _has_compliance_verdict,
+            )
 
         text = response.get("choices",[])[0].get("message",{}).get("content","")
         return text
 
     
+    def _use_speculative_execution(self, request: QueryRequest):
+        if request.speculative is not None:
+            return request.speculative
+        return settings.SPECULATIVE_QUERY_EXECUTION
+
+    async def _cancel_tasks(self, tasks):
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _lookup_cached_response(self, request: QueryRequest):
+        """
+        Look the query up in the namespace's semantic response cache
+
+        Returns:
+            tuple: (cache entry or None, cache key for storing the fresh answer, or None when caching is off)
+        """
+        if not settings.RESPONSE_CACHE_ENABLED:
+            return None, None
+
+        namespace = f"{request.email}-{request.workspace_name}"
+        # the answer also depends on how retrieval ranked the chunks, so alpha is part of the key
+        alpha = self._resolve_hybrid_alpha(request.hybrid_alpha)
+        ctx_hash = context_hash(
+            request.current_file_path, request.current_file_content, "dense" if alpha is None else f"alpha={alpha}"
+        )
+        try:
+            # Same model and input type as search_vectors, so the embedding cache serves the retrieval call
+            embeddings = await self.embedding_service.voyageai_dense_embeddings(
+                self.embedding_model,
+                dimension = self.dimension,
+                inputs = [request.user_query],
+                input_type = self.query_input_type
+            )
+        except Exception as e:
+            logger.warning(f"Response cache skipped, query embedding failed: {str(e)}")
+            return None, None
+
+        cache_key = (namespace, ctx_hash, embeddings[0])
+        if request.use_cache is False:
+            return None, cache_key
+
+        entry = await response_cache.lookup(*cache_key)
+        if entry is not None:
+            logger.info(f"Response cache hit for {namespace}, similarity {entry['similarity']:.3f}")
+        return entry, cache_key
+
+    async def _store_cached_response(self, cache_key, user_query: str, payload: dict):
+        if cache_key is not None:
+            namespace, ctx_hash, embedding = cache_key
+            await response_cache.put(namespace, ctx_hash, user_query, embedding, payload)
+
+    async def run_speculative_stages(self, user_query: str, email: str, workspace_name: str, alpha: float = None):
+        """
+        Start compliance, query analysis and a first-pass vector search on the raw
+        query at the same time. Speculative work is cancelled as soon as compliance
+        rejects the query or the RAG decision says retrieval is not needed.
+
+        Returns:
+            tuple: (compliance response, analysis result or None, vector search results or None)
+        """
+        compliance_task = asyncio.create_task(self.check_compliance(user_query))
+        analysis_task = asyncio.create_task(self.analyze_query(user_query))
+        retrieval_task = asyncio.create_task(
+            self.search_vectors(user_query, email, workspace_name, alpha, self._prefetch_top_k())
+        )
+        try:
+            return await self._await_speculative_stages(compliance_task, analysis_task, retrieval_task)
+        except asyncio.CancelledError:
+            # e.g. a response cache hit: nothing started here may outlive the caller
+            await self._cancel_tasks([compliance_task, analysis_task, retrieval_task])
+            raise
+
+    async def _await_speculative_stages(self, compliance_task, analysis_task, retrieval_task):
+        try:
+            groq_response = await compliance_task
+        except Exception:
+            await self._cancel_tasks([analysis_task, retrieval_task])
+            raise
+
+        if "True" not in groq_response.split(" ")[0]:
+            await self._cancel_tasks([analysis_task, retrieval_task])
+            return groq_response, None, None
+
+        try:
+            analysis_result = await analysis_task
+        except Exception:
+            await self._cancel_tasks([retrieval_task])
+            raise
+
+        if not analysis_result.get("use_rag", True):
+            await self._cancel_tasks([retrieval_task])
+            return groq_response, analysis_result, None
+
+        try:
+            vector_search_results = await retrieval_task
+        except Exception as e:
+            # perform_rag redoes the search with the reformulated query
+            logger.warning(f"Speculative vector search failed, retrying after analysis: {str(e)}")
+            vector_search_results = None
+
+        return groq_response, analysis_result, vector_search_results
+
     async def process_query(self, request: QueryRequest):
         start_time = time.time()
+        trace = start_trace("query")
+        usage = start_usage_context("query", request.email, f"{request.email}-{request.workspace_name}")
         user_query = request.user_query
         current_file_content = request.current_file_content
         email = request.email
@@ -308,13 +603,44 @@ class QueryUseCase:
         try:
             with open(f"folder_structs/{email}_{workspace_name}.txt", "r") as f:
                 folder_structure = f.read()
-                logger.info(f"folder structure : {folder_structure}")
+                logger.debug("Loaded folder structure of %s characters", len(folder_structure))
         except FileNotFoundError:
             logger.error("Error: File not found.")
         except Exception as e:
             logger.error(f"Error: {e}")
 
-        groq_response = await self.check_compliance(user_query)
+        # The cache lookup embeds the query; the first stages run meanwhile and are dropped on a hit
+        lookup_task = asyncio.create_task(self._lookup_cached_response(request))
+        speculative = self._use_speculative_execution(request)
+        if speculative:
+            stages_task = asyncio.create_task(
+                self.run_speculative_stages(user_query, email, workspace_name, request.hybrid_alpha)
+            )
+        else:
+            stages_task = asyncio.create_task(self.check_compliance(user_query))
+
+        try:
+            cached, cache_key = await lookup_task
+        except BaseException:
+            await self._cancel_tasks([stages_task])
+            raise
+        if cached is not None:
+            await self._cancel_tasks([stages_task])
+            return {
+                **cached["payload"],
+                "processing_time": time.time() - start_time,
+                "cached": True,
+                "cache_similarity": cached["similarity"],
+                "timings": trace.finish(),
+                "usage": usage_summary(usage)
+            }
+
+        analysis_result = None
+        vector_search_results = None
+        if speculative:
+            groq_response, analysis_result, vector_search_results = await stages_task
+        else:
+            groq_response = await stages_task
 
         coding_related_question = "True" in groq_response.split(" ")[0]
         if coding_related_question == False:
@@ -326,7 +652,8 @@ class QueryUseCase:
             return {"response" : result}
 
         # Step 1: Analyze the query to determine if RAG is needed
-        analysis_result = await self.analyze_query(user_query)
+        if analysis_result is None:
+            analysis_result = await self.analyze_query(user_query)
 
         use_rag = analysis_result.get("use_rag", True)
         reformulated_query = analysis_result.get("reformulated_query", user_query).get("reformulated_query", user_query)
@@ -335,24 +662,30 @@ class QueryUseCase:
         context_from_query = analysis_result.get("reformulated_query", "").get("context", "")
         error_from_query = analysis_result.get("reformulated_query", "").get("error", "")
         
-        if current_file_content and current_file_path:
-            final_query = f"this is {user_query} and this is enhanced query if incase user query is not sufficient {reformulated_query}, current file path is this (Current file: {current_file_path}) and current file content is this {current_file_content}"
-        else:
-            final_query = f"this is {user_query} and this is enhanced query if incase user query is not sufficient {reformulated_query}"
+        final_query = self._retrieval_query(user_query, reformulated_query, current_file_path, current_file_content)
         # Step 2: Generate response based on RAG decision
         
         if use_rag:
-            retrieved_docs = await self.perform_rag(final_query, email, workspace_name)
+            top_k, top_n = self._retrieval_sizes(analysis_result)
+            if vector_search_results is not None and not self._speculative_results_usable(request.user_query, reformulated_query):
+                # perform_rag searches again with the final query
+                vector_search_results = None
+            retrieved_docs = await self.perform_rag(
+                final_query, email, workspace_name, vector_search_results, request.hybrid_alpha, top_k, top_n
+            )
             
-            response = await self.generate_response_with_rag(
+            response, context_stats = await self.generate_response_with_rag(
                 folder_structure,
                 user_query, 
                 reformulated_query, 
                 retrieved_docs,
                 context_from_query,
-                error_from_query
+                error_from_query,
+                namespace = f"{email}-{workspace_name}",
+                top_n = top_n
             )
         else:
+            context_stats = None
             response = await self.generate_response_without_rag(
                 folder_structure,
                 user_query, 
@@ -362,33 +695,60 @@ class QueryUseCase:
             )
         
         # Step 3: Format and return the final response
+        payload = {
+            "response": response ,#response.get("content", [{}])[0].get("text", ""),
+            "analysis": analysis_result,
+            "used_rag": use_rag,
+            "model": self.llm_model,
+            "context": context_stats
+        }
+        await self._store_cached_response(cache_key, request.user_query, payload)
+
         end_time = time.time()
         processing_time = end_time - start_time
         
         return {
-            "response": response ,#response.get("content", [{}])[0].get("text", ""),
-            "analysis": analysis_result,
+            **payload,
             "processing_time": processing_time,
-            "used_rag": use_rag,
-            "model": self.llm_model
+            "cached": False,
+            "timings": trace.finish(),
+            "usage": usage_summary(usage)
         }
     
 
 
     
-    async def stream_response_generator(self, query: str, reformulated_query: str, retrieved_docs: list, context_from_query: str, error_from_query: str):
+    def _answer_stream(self, chunks):
+        """Optionally coalesce answer tokens so each SSE frame carries several of them"""
+        if settings.SSE_COALESCE_ENABLED:
+            return coalesce_text_chunks(
+                chunks, settings.SSE_COALESCE_INTERVAL_MS, settings.SSE_COALESCE_MAX_BYTES
+            )
+        return chunks
+
+    async def _answer_frames(self, chunks, streamed_text: list):
+        """SSE frames of the answer, traced as one span with time to first token and bytes sent"""
+        with span("llm_stream") as record:
+            start = time.perf_counter()
+            record["emitted_bytes"] = 0
+            async for chunk in self._answer_stream(chunks):
+                if chunk.get("text") and "ttft_ms" not in record:
+                    record["ttft_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                streamed_text.append(chunk.get("text") or "")
+                frame = f"data: {json_util.dumps(chunk)}\n\n"
+                record["emitted_bytes"] += len(frame)
+                yield frame
+
+    async def stream_response_generator(self, query: str, reformulated_query: str, retrieved_docs: list, context_from_query: str, error_from_query: str, on_complete = None, namespace: str = "", top_n: int = None):
         """
         Generate a streaming response for RAG
         """
         
-        # Format the retrieved documents as context
-        retrieved_context_text = ""
-        if retrieved_docs:
-            retrieved_context_text = "Here are relevant code snippets from the codebase:\n\n"
-            for i, doc in enumerate(retrieved_docs[:10]):  # Limit to 10 docs for streaming
-                file_path = doc.get("metadata", {}).get("file_path", "Unknown file")
-                retrieved_context_text += f"--- Document {i+1} (from {file_path}) ---\n"
-                retrieved_context_text += f"{doc['text']}\n\n"
+        # Streaming answers use the search hits only (reranked, or in vector order when the
+        # reranker was unavailable), packed into the token budget
+        search_docs = [doc for doc in retrieved_docs if doc.get("source") in ("rerank", "vector")]
+        context = await assemble_rag_context(namespace, search_docs, "", top_n or self.top_n)
+        retrieved_context_text = context["retrieved_context_text"]
         
         # Add context from the query analysis if available
         query_context_text = ""
@@ -409,84 +769,203 @@ class QueryUseCase:
             retrieved_context_text = retrieved_context_text
         )
         
+        context_stats = context["stats"]
+        context_stats["prompt_tokens"] = await count_tokens_async(STREAMING_SYSTEM_PROMPT, user_prompt)
+        logger.info(f"Streaming RAG prompt context: {context_stats}")
+        yield self._progress_event("context", **context_stats)
+
         logger.info("Generating streaming response")
-        async for chunk in self.llm_service.anthropic_api_call_streaming(
+        streamed_text = []
+        async for frame in self._answer_frames(self.llm_service.anthropic_api_call_streaming(
             model_name=self.llm_model,
             system_prompt=STREAMING_SYSTEM_PROMPT,
             user_prompt=user_prompt,
             user_query=reformulated_query
-        ):
-            yield f"data: {json.dumps(chunk)}\n\n"
+        ), streamed_text):
+            yield frame
+
+        if on_complete is not None:
+            await on_complete("".join(streamed_text))
     
     async def process_query_streaming(self, request: QueryRequest):
         """
         Process a query request and generate a streaming response
+
+        The SSE stream is opened right away; the pipeline runs inside it and reports
+        each stage as a progress event before the LLM tokens start.
+        """
+        return StreamingResponse(
+            self.stream_pipeline_generator(request),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+
+    def _sse_event(self, event: str, data: dict):
+        """Named SSE event; plain `data:` frames keep carrying the answer text"""
+        return f"event: {event}\ndata: {json_util.dumps(data)}\n\n"
+
+    def _progress_event(self, stage: str, **details):
+        return self._sse_event("progress", {"type": "progress", "stage": stage, "done": False, **details})
+
+    async def stream_pipeline_generator(self, request: QueryRequest):
+        """
+        Run compliance, analysis, retrieval and rerank inside the SSE stream, emitting a
+        progress event as each stage finishes, then stream the answer tokens.
+
+        With speculative execution the vector search on the raw query starts together with
+        compliance and analysis; otherwise it starts once the reformulated query has streamed.
+        Either way retrieval does not wait for the RAG decision.
         """
         user_query = request.user_query
         email = request.email
         workspace_name = request.workspace_name
         current_file_content = request.current_file_content
         current_file_path = request.current_file_path
-        
-        # Check if query is coding-related
-        groq_response = await self.check_compliance(user_query)
-        coding_related_question = "True" in groq_response.split(" ")[0]
-        
-        if coding_related_question == False:
-            parts = groq_response.split(" ", 1)
-            result = parts[1] if len(parts) > 1 else ""
-            if len(result) == 0:
-                result = "I am coding assistant created by DhiWise my name is CodeMentor and I am here to help you with your coding related queries only"
-            # Return a non-streaming response for non-coding questions
-            return StreamingResponse(
-                self._string_to_generator(result),
-                media_type="text/event-stream"
-            )
-            
-        # Step 1: Analyze the query to determine if RAG is needed
-        analysis_result = await self.analyze_query(user_query)
-        use_rag = analysis_result.get("use_rag", True)
-        reformulated_query = analysis_result.get("reformulated_query", user_query).get("reformulated_query", user_query)
-        
-        # Extract additional context
-        context_from_query = analysis_result.get("reformulated_query", "").get("context", "")
-        error_from_query = analysis_result.get("reformulated_query", "").get("error", "")
-        
-        # Add current file context if available
-        if current_file_content and current_file_path:
-            final_query = f"{user_query} (Current file: {current_file_path})"
-        else:
-            final_query = user_query
-            
-        # Step 2: Generate streaming response based on RAG decision
-        if use_rag:
-            # Perform RAG retrieval
-            retrieved_docs = await self.perform_rag(final_query, email, workspace_name)
-            
-            # Return streaming response with retrieved documents
-            return StreamingResponse(
-                self.stream_response_generator(
-                    user_query, 
-                    reformulated_query, 
+        speculative = self._use_speculative_execution(request)
+        trace = start_trace("stream_query")
+        usage = start_usage_context("stream_query", email, f"{email}-{workspace_name}")
+        tasks = []
+
+        try:
+            # The cache lookup runs alongside the first stages; on a hit the finally block cancels them
+            lookup_task = asyncio.create_task(self._lookup_cached_response(request))
+            compliance_task = asyncio.create_task(self.check_compliance(user_query))
+            tasks += [lookup_task, compliance_task]
+            analysis_task = None
+            retrieval_task = None
+            if speculative:
+                analysis_task = asyncio.create_task(self.analyze_query(user_query))
+                retrieval_task = asyncio.create_task(
+                    self.search_vectors(user_query, email, workspace_name, request.hybrid_alpha, self._prefetch_top_k())
+                )
+                tasks += [analysis_task, retrieval_task]
+
+            cached, cache_key = await lookup_task
+            if cached is not None:
+                yield self._progress_event("cache", hit = True, similarity = cached["similarity"])
+                # Replay the cached answer over the same SSE format
+                async for frame in self._string_to_generator(cached["payload"]["response"]):
+                    yield frame
+                return
+
+            # Check if query is coding-related
+            groq_response = await compliance_task
+            coding_related_question = "True" in groq_response.split(" ")[0]
+            yield self._progress_event("compliance", coding_related = coding_related_question)
+
+            if coding_related_question == False:
+                parts = groq_response.split(" ", 1)
+                result = parts[1] if len(parts) > 1 else ""
+                if len(result) == 0:
+                    result = "I am coding assistant created by DhiWise my name is CodeMentor and I am here to help you with your coding related queries only"
+                async for frame in self._string_to_generator(result):
+                    yield frame
+                return
+
+            # Step 1: Analyze the query to determine if RAG is needed. Without speculative
+            # retrieval, the search starts as soon as the reformulated query is streamed
+            def start_retrieval(reformulated: str):
+                nonlocal retrieval_task
+                if retrieval_task is None:
+                    retrieval_task = asyncio.create_task(
+                        self.search_vectors(reformulated, email, workspace_name, request.hybrid_alpha, self._prefetch_top_k())
+                    )
+                    tasks.append(retrieval_task)
+
+            if analysis_task is None:
+                analysis_task = asyncio.create_task(self.analyze_query(user_query, on_reformulated = start_retrieval))
+                tasks.append(analysis_task)
+            analysis_result = await analysis_task
+            use_rag = analysis_result.get("use_rag", True)
+            reformulated_query = analysis_result.get("reformulated_query", user_query).get("reformulated_query", user_query)
+            yield self._progress_event("analysis", use_rag = use_rag, reformulated_query = reformulated_query)
+
+            # Extract additional context
+            context_from_query = analysis_result.get("reformulated_query", "").get("context", "")
+            error_from_query = analysis_result.get("reformulated_query", "").get("error", "")
+
+            final_query = self._retrieval_query(user_query, reformulated_query, current_file_path, current_file_content)
+
+            async def store_streamed_response(text: str):
+                await self._store_cached_response(cache_key, user_query, {
+                    "response": text,
+                    "analysis": analysis_result,
+                    "used_rag": use_rag,
+                    "model": self.llm_model
+                })
+
+            # Step 2: Generate streaming response based on RAG decision
+            if use_rag:
+                top_k, top_n = self._retrieval_sizes(analysis_result)
+                vector_search_results = None
+                if speculative and not self._speculative_results_usable(user_query, reformulated_query):
+                    # the raw-query search is not a good enough stand-in: search the same query /query uses
+                    await self._cancel_tasks([retrieval_task])
+                    retrieval_task = None
+                    vector_search_results = await self.search_vectors(
+                        final_query, email, workspace_name, request.hybrid_alpha, top_k
+                    )
+                if retrieval_task is not None:
+                    try:
+                        vector_search_results = await retrieval_task
+                    except Exception as e:
+                        logger.warning(f"Speculative vector search failed, retrying after analysis: {str(e)}")
+                if vector_search_results is None:
+                    vector_search_results = await self.search_vectors(
+                        final_query, email, workspace_name, request.hybrid_alpha, top_k
+                    )
+
+                matches = vector_search_results.get("matches", []) if vector_search_results else []
+                if top_k:
+                    matches = matches[:top_k]
+                retrieved_files = list(dict.fromkeys(
+                    match.get("metadata", {}).get("file_path", "unknown") for match in matches
+                ))
+                yield self._progress_event(
+                    "retrieval", matches = len(matches), files = retrieved_files, top_k = top_k, top_n = top_n
+                )
+
+                retrieved_docs = await self.perform_rag(
+                    final_query, email, workspace_name, vector_search_results, request.hybrid_alpha, top_k, top_n
+                )
+                yield self._progress_event("rerank", documents = len(retrieved_docs))
+
+                generator = self.stream_response_generator(
+                    user_query,
+                    reformulated_query,
                     retrieved_docs,
                     context_from_query,
-                    error_from_query
-                ),
-                media_type="text/event-stream"
-            )
-        else:
-            # Generate streaming response without RAG
-            return StreamingResponse(
-                self.stream_non_rag_generator(
-                    user_query, 
+                    error_from_query,
+                    on_complete = store_streamed_response,
+                    namespace = f"{email}-{workspace_name}",
+                    top_n = top_n
+                )
+            else:
+                if retrieval_task is not None:
+                    await self._cancel_tasks([retrieval_task])
+                generator = self.stream_non_rag_generator(
+                    user_query,
                     reformulated_query,
                     context_from_query,
-                    error_from_query
-                ),
-                media_type="text/event-stream"
-            )
-    
-    async def stream_non_rag_generator(self, query: str, reformulated_query: str, context_from_query: str, error_from_query: str):
+                    error_from_query,
+                    on_complete = store_streamed_response
+                )
+
+            async for frame in generator:
+                yield frame
+
+        except Exception as e:
+            # Headers are already sent, so failures are reported inside the stream
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            logger.error(f"Error in streaming query pipeline: {detail}")
+            yield self._sse_event("error", {"type": "error", "detail": detail, "done": True})
+
+        finally:
+            # Cancels whatever is still running (e.g. on client disconnect) and reaps finished tasks
+            await self._cancel_tasks(tasks)
+            logger.info(f"Stream query timings (ms): {trace.finish()}, usage: {usage_summary(usage)}")
+
+    async def stream_non_rag_generator(self, query: str, reformulated_query: str, context_from_query: str, error_from_query: str, on_complete = None):
         """Stream response without RAG context"""
         
         # Add context from the query analysis if available
@@ -508,18 +987,22 @@ class QueryUseCase:
         )
         
         logger.info("Generating streaming response without RAG")
-        async for chunk in self.llm_service.anthropic_api_call_streaming(
+        streamed_text = []
+        async for frame in self._answer_frames(self.llm_service.anthropic_api_call_streaming(
             model_name=self.llm_model,
             system_prompt=STREAMING_NON_RAG_SYSTEM_PROMPT,
             user_prompt=user_prompt,
             user_query=reformulated_query
-        ):
-            yield f"data: {json.dumps(chunk)}\n\n"
+        ), streamed_text):
+            yield frame
+
+        if on_complete is not None:
+            await on_complete("".join(streamed_text))
     
     async def _string_to_generator(self, text: str):
         """Helper to convert a string to a streaming generator"""
-        yield f"data: {json.dumps({'text': text, 'done': False})}\n\n"
-        yield f"data: {json.dumps({'done': True})}\n\n"
+        yield f"data: {json_util.dumps({'text': text, 'done': False})}\n\n"
+        yield f"data: {json_util.dumps({'done': True})}\n\n"
         
         
         
\ No newline at end of file
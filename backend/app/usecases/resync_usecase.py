@@ -9,10 +9,18 @@ from app.models.schema.file_upload_schema import FileUploadRequest
 
 from app.config.settings import get_settings
 from app.utils.upload_file_local_util import store_file_locally
-from app.utils.folder_structure_util import folder_struct_util
+from app.utils.folder_structure_util import folder_struct_from_paths
+from app.utils.stream_json_util import iter_json_records, iter_batches
+from app.utils.batch_pipeline_util import run_pipeline
+from app.utils.chunk_id_util import assign_chunk_id
+from app.utils.chunk_store_util import chunk_store
+from app.utils.response_cache_util import response_cache
+from app.utils.tracing_util import span, start_trace
+from app.utils.usage_recorder_util import start_usage_context, usage_summary
+from app.repositories.chunk_manifest_repository import ChunkManifestRepository
 
 from app.services.embedding_service import EmbeddingService
-from app.services.pinecone_service import PineconeService
+from app.services.vector_store_service import VectorStore, get_vector_store
 from app.services.reranking_service import RerankerService
 from app.utils.logging_util import logger
 
@@ -24,12 +32,15 @@ class ResyncUseCase:
     def __init__(
         self,
         embedding_service: EmbeddingService = Depends(EmbeddingService),
-        pinecone_service: PineconeService = Depends(PineconeService),
+        vector_store: VectorStore = Depends(get_vector_store),
         reranker_service: RerankerService = Depends(RerankerService),
+        manifest_repository: ChunkManifestRepository = Depends(ChunkManifestRepository),
     ):
         self.embedding_service = embedding_service
-        self.pinecone_service = pinecone_service
+        self.vector_store = vector_store
         self.reranker_service = reranker_service
+        self.manifest_repository = manifest_repository
+        self.delete_batch_size = 1000
         self.file_path = "uploads/raw_dataset.json"
         self.chunk_size = 90
         self.semaphore = asyncio.Semaphore(5)
@@ -86,7 +97,7 @@ class ResyncUseCase:
     
     async def _upsert_batch(self, index_host, batch, namespace_name):
         try:
-            upsert_result = await self.pinecone_service.upsert_vectors(
+            upsert_result = await self.vector_store.upsert_vectors(
                 index_host, batch, namespace_name
             )
             return upsert_result
@@ -97,80 +108,70 @@ class ResyncUseCase:
                 detail=f"Error upserting batch : {str(e)}"
             )
 
-    async def _process_and_upsert_batch(
-        self,
-        data_batch,
-        embed_model,
-        dimension, 
-        index_host, 
-        namespace_name
-    ):
-        try:
+    async def _embed_stage(self, data_batch, embed_model, dimension):
+        with span("resync.embed", chunks = len(data_batch)):
             embeddings = await self._get_embeddings_for_batch(data_batch, embed_model, dimension)
+        return {"batch": data_batch, "embeddings": embeddings}
+
+    async def _sparse_stage(self, item):
+        text_list = [chunk["text"] for chunk in item["batch"]]
+        with span("resync.sparse", chunks = len(text_list)):
+            sparse_embeds = await self.embedding_service.pinecone_sparse_embeddings(text_list)
+            item["upsert_data"] = await self.vector_store.upsert_format(
+                item["batch"], item["embeddings"], sparse_embeds
+            )
+        return item
 
-            text_list = [item["text"] for item in data_batch]
-            sparse_embeds = self.embedding_service.pinecone_sparse_embeddings(text_list)
-
-            upsert_data = await self.pinecone_service.upsert_format(data_batch, embeddings, sparse_embeds)
-
-            upsert_batches = [
-                upsert_data[i : i + self.upsert_batch_size]
-                for i in range(0, len(upsert_data), self.upsert_batch_size)
-            ]
+    async def _upsert_stage(self, item, index_host, namespace_name, on_batch_upserted):
+        upsert_data = item["upsert_data"]
+        upsert_batches = [
+            upsert_data[i : i + self.upsert_batch_size]
+            for i in range(0, len(upsert_data), self.upsert_batch_size)
+        ]
 
-            upsert_tasks = [
+        with span("resync.upsert", chunks = len(upsert_data)):
+            batch_results = await asyncio.gather(*[
                 self._upsert_batch(index_host, batch, namespace_name)
                 for batch in upsert_batches
-            ]
+            ])
+        if on_batch_upserted is not None:
+            await on_batch_upserted(item["batch"])
 
-            batch_results = await asyncio.gather(*upsert_tasks)
+        total_upserted = sum(result.get("upsertedCount", 0) for result in batch_results)
+        logger.info(f"Upserted {total_upserted} vectors into {namespace_name}")
 
-            total_upserted = sum(result.get("upserted_count", 0) for result in batch_results)
+        return {
+            "upserted_count": total_upserted,
+            "batches_processed": len(batch_results),
+            "message": "Batch upserted successfully",
+        }
 
-            return {
-                "upserted_count": total_upserted,
-                "batches_processed": len(batch_results),
-                "message": "Batch upserted successfully",
-            }
-        except Exception as e:
-            logger.error(f"Error processing and upserting batch : {str(e)}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Error processing and upserting batch : {str(e)}"
-            )
+    async def _process_data_in_batches(self, batches, embed_model, dimension, index_host, namespace_name, on_batch_upserted=None):
+        """
+        Run chunk batches through a pipeline of embed, sparse encode and upsert worker pools
+
+        Bounded queues between the stages give backpressure on the upload stream, and
+        the upsert of one batch overlaps with the embedding of the next.
 
-    async def _process_data_in_batches(self, data, embed_model, dimension, index_host, namespace_name):
+        Args:
+            on_batch_upserted: optional async callback receiving each batch once it is upserted
+        """
         try:
-            processing_batches = [
-                data[i : i + self.process_batch_size]
-                for i in range(0, len(data), self.process_batch_size)
+            stages = [
+                ("embed", settings.RESYNC_EMBED_CONCURRENCY,
+                 lambda batch: self._embed_stage(batch, embed_model, dimension)),
+                ("sparse", settings.RESYNC_SPARSE_CONCURRENCY, self._sparse_stage),
+                ("upsert", settings.RESYNC_UPSERT_CONCURRENCY,
+                 lambda item: self._upsert_stage(item, index_host, namespace_name, on_batch_upserted)),
             ]
+            batch_results = await run_pipeline(batches, stages, settings.RESYNC_QUEUE_SIZE)
 
-            logger.info(f"Processing {len(data)} items in {len(processing_batches)} batches")
-            
-            total_results = {
-                "upserted_count": 0,
-                "batches_processed": 0,
-                "batch_results": []
+            return {
+                "upserted_count": sum(result["upserted_count"] for result in batch_results),
+                "batches_processed": sum(result["batches_processed"] for result in batch_results),
+                "batch_results": batch_results
             }
 
-            for i, batch in enumerate(processing_batches):
-                logger.info(f"Processing batch {i+1}/{len(processing_batches)} with {len(batch)} items")
-                
-                batch_result = await self._process_and_upsert_batch(
-                    batch, embed_model, dimension, index_host, namespace_name
-                )
-                
-                # Update totals
-                total_results["upserted_count"] += batch_result["upserted_count"]
-                total_results["batches_processed"] += batch_result["batches_processed"]
-                total_results["batch_results"].append(batch_result)
-                
-                logger.info(f"Completed batch {i+1}: upserted {batch_result['upserted_count']} vectors")
-            
-            time.sleep(5) # add a delay to allow pinecone to upsert vectors in background
-            return total_results
-
         except Exception as e:
             logger.error(f"Error processing data in batches : {str(e)}")
             raise HTTPException(
@@ -178,13 +179,112 @@ class ResyncUseCase:
                 detail=f"Error processing data in batches : {str(e)}"
             )
 
+    async def _wait_for_namespace_ready(self, index_host, namespace_name, expected_count):
+        """Poll index stats until the namespace reports the expected vector count or the timeout passes"""
+        deadline = time.monotonic() + settings.RESYNC_READINESS_TIMEOUT
+        while True:
+            try:
+                stats = await self.vector_store.describe_index_stats(index_host)
+                vector_count = stats.get("namespaces", {}).get(namespace_name, {}).get("vectorCount", 0)
+                if vector_count >= expected_count:
+                    return True
+            except HTTPException as e:
+                logger.warning(f"Index stats poll failed for {namespace_name}: {e.detail}")
+
+            if time.monotonic() >= deadline:
+                logger.warning(
+                    f"Namespace {namespace_name} not ready after {settings.RESYNC_READINESS_TIMEOUT}s, "
+                    f"expected {expected_count} vectors"
+                )
+                return False
+            await asyncio.sleep(settings.RESYNC_READINESS_POLL_INTERVAL)
+
+    async def _delete_stale_chunks(self, index_host, chunk_ids, namespace_name):
+        batches = [
+            chunk_ids[i : i + self.delete_batch_size]
+            for i in range(0, len(chunk_ids), self.delete_batch_size)
+        ]
+        for batch in batches:
+            await self.vector_store.delete_vectors(index_host, batch, namespace_name)
+
+    async def _sync_namespace(self, records, embed_model, dimension, index_host, namespace_name, is_first_time, file_paths):
+        """
+        Stream the uploaded chunks, embed and upsert only new or changed ones, then delete
+        vectors for chunks that disappeared since the previous resync of this namespace.
+        Only chunk ids and file paths are kept for the whole upload, never the chunks themselves.
+        """
+        await self.manifest_repository.ensure_indexes()
+        previous_hashes = await self.manifest_repository.get_chunk_hashes(namespace_name)
+
+        seen_ids = set()
+        counts = {"total": 0, "changed": 0}
+
+        async def changed_chunks():
+            # Every chunk goes to the local chunk store, so it stays complete even
+            # for chunks whose vectors are unchanged and skipped below
+            store_batch = []
+            async for item in records:
+                chunk = assign_chunk_id(item)
+                if chunk["_id"] in seen_ids:
+                    continue
+                seen_ids.add(chunk["_id"])
+                counts["total"] += 1
+                file_paths.add(chunk.get("file_path"))
+                store_batch.append(chunk)
+                if len(store_batch) >= self.process_batch_size:
+                    await chunk_store.add_chunks(namespace_name, store_batch)
+                    store_batch = []
+                if is_first_time or previous_hashes.get(chunk["_id"]) != chunk["content_hash"]:
+                    counts["changed"] += 1
+                    yield chunk
+            await chunk_store.add_chunks(namespace_name, store_batch)
+
+        async def record_batch(batch):
+            await self.manifest_repository.add_chunks(namespace_name, batch)
+
+        upsert_result = await self._process_data_in_batches(
+            iter_batches(changed_chunks(), self.process_batch_size),
+            embed_model, dimension, index_host, namespace_name,
+            on_batch_upserted=record_batch
+        )
+
+        removed_ids = [chunk_id for chunk_id in previous_hashes if chunk_id not in seen_ids]
+        if removed_ids:
+            with span("resync.delete", chunks = len(removed_ids)):
+                await self._delete_stale_chunks(index_host, removed_ids, namespace_name)
+                await self.manifest_repository.remove_chunks(namespace_name, removed_ids)
+                await chunk_store.remove_chunks(namespace_name, removed_ids)
+
+        if upsert_result["upserted_count"]:
+            with span("resync.readiness"):
+                await self._wait_for_namespace_ready(index_host, namespace_name, len(seen_ids))
+
+        logger.info(
+            f"Resync of {namespace_name}: {counts['total']} chunks, "
+            f"{counts['changed']} new or changed, {len(removed_ids)} removed"
+        )
+
+        upsert_result["unchanged_count"] = counts["total"] - counts["changed"]
+        upsert_result["deleted_count"] = len(removed_ids)
+
+        # Cached answers were generated against the old index contents
+        if counts["changed"] or removed_ids:
+            await response_cache.mark_resynced(namespace_name)
+
+        return upsert_result
 
     async def resync_index(self, file, file_request: FileUploadRequest):
-        file_path_local = await store_file_locally(file, file)
+        trace = start_trace("resync")
+        usage = start_usage_context(
+            "resync", file_request.email, f"{file_request.email}-{file_request.filepath}"
+        )
+        with span("resync.store_upload"):
+            file_path_local = await store_file_locally(file)
 
         try:
-            with open(file_path_local, "r") as f:
-                data = json.load(f)
+            # JSON array or NDJSON, parsed incrementally so memory is bounded by batch size
+            records = iter_json_records(file_path_local)
+            file_paths = set()
 
             email = file_request.email
             file_path = file_request.filepath
@@ -192,12 +292,12 @@ class ResyncUseCase:
 
             namespace_name = f"{email}-{file_path}"
             index_name = f"{self.similarity_metric}-{self.dimension}"
-            list_index_result = await self.pinecone_service.list_pinecone_indexes()
+            list_index_result = await self.vector_store.list_pinecone_indexes()
             indexes = list_index_result.get("indexes", [])
             index_names = [index.get("name") for index in indexes]
 
             if len(indexes) == 0 or index_name not in index_names:
-                response = await self.pinecone_service.create_index(
+                response = await self.vector_store.create_index(
                     index_name=f"{self.similarity_metric}-{self.dimension}",
                     dimension=self.dimension,
                     metric=self.similarity_metric
@@ -205,8 +305,8 @@ class ResyncUseCase:
 
                 index_host = response.get("host")
 
-                upsert_result = await self._process_data_in_batches(
-                    data, self.embed_model_name, self.dimension, index_host, namespace_name
+                upsert_result = await self._sync_namespace(
+                    records, self.embed_model_name, self.dimension, index_host, namespace_name, is_first_time, file_paths
                 )
             
             else:
@@ -215,12 +315,12 @@ class ResyncUseCase:
                         index_host = index.get("host")
                         break
 
-                upsert_result = await self._process_data_in_batches(
-                    data, self.embed_model_name, self.dimension, index_host, namespace_name
+                upsert_result = await self._sync_namespace(
+                    records, self.embed_model_name, self.dimension, index_host, namespace_name, is_first_time, file_paths
                 )
         
             # comment this code if backend breaks
-            folder_structure = folder_struct_util()
+            folder_structure = folder_struct_from_paths(file_paths)
             os.makedirs("folder_structs", exist_ok=True)
             with open(f"folder_structs/{email}_{file_path}.txt", "w") as f:
                 f.write(folder_structure)
@@ -233,6 +333,9 @@ class ResyncUseCase:
             "filepath": file_path,
             "data": file_request.model_dump(),
             "message": "Resynced successfully",
-            "upsert_result": upsert_result
+            "upsert_result": upsert_result,
+            "embedding_cache": self.embedding_service.cache_stats,
+            "timings": trace.finish(),
+            "usage": usage_summary(usage)
         }
 
@@ -0,0 +1,57 @@
+from datetime import datetime
+from typing import Optional
+
+from fastapi import Depends, HTTPException, status
+
+from app.models.domains.user import UserRole
+from app.repositories.usage_repository import UsageRepository
+from app.utils.usage_recorder_util import usage_recorder
+
+USAGE_GROUP_FIELDS = {"request_id", "route", "user", "namespace", "stage", "provider", "model", "operation", "status"}
+
+
+class UsageUseCase:
+    def __init__(self, usage_repository: UsageRepository = Depends(UsageRepository)):
+        self.usage_repository = usage_repository
+
+    async def aggregate_usage(
+        self,
+        current_user: dict,
+        group_by: list,
+        user: Optional[str] = None,
+        namespace: Optional[str] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        limit: int = 100
+    ):
+        """
+        Token, unit and latency totals grouped by the requested fields
+
+        Admins can report on any user; everyone else only sees their own usage.
+        """
+        unknown_fields = [field for field in group_by if field not in USAGE_GROUP_FIELDS]
+        if unknown_fields:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Cannot group usage by {', '.join(unknown_fields)}; use {', '.join(sorted(USAGE_GROUP_FIELDS))}"
+            )
+
+        if current_user.get("role") != UserRole.ADMIN:
+            user = current_user.get("email")
+
+        match = {}
+        if user:
+            match["user"] = user
+        if namespace:
+            match["namespace"] = namespace
+        if since or until:
+            match["timestamp"] = {}
+            if since:
+                match["timestamp"]["$gte"] = since
+            if until:
+                match["timestamp"]["$lt"] = until
+
+        # Include calls still waiting in the recorder's buffer
+        await usage_recorder.flush()
+        groups = await self.usage_repository.aggregate(match, group_by, limit)
+        return {"group_by": group_by, "groups": groups}
@@ -0,0 +1,67 @@
+import asyncio
+
+_DONE = object()
+
+
+async def run_pipeline(source, stages, queue_size: int):
+    """
+    Run items from an async iterable through a chain of worker pools connected by bounded queues
+
+    Each stage has its own pool of workers, so stage N+1 of one item overlaps with stage N of
+    the next, while the bounded queues apply backpressure to the producer.
+
+    Args:
+        source: async iterable of input items
+        stages (list): (name, concurrency, async callable) tuples, in order. Each callable
+            receives the previous stage's output and returns the input of the next stage.
+        queue_size (int): Maximum number of items waiting in front of each stage
+
+    Returns:
+        list: outputs of the last stage, in completion order
+    """
+    queues = [asyncio.Queue(maxsize=queue_size) for _ in stages]
+    results = []
+
+    async def produce():
+        async for item in source:
+            await queues[0].put(item)
+
+    async def work(index, func):
+        inbox = queues[index]
+        outbox = queues[index + 1] if index + 1 < len(stages) else None
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                return
+            output = await func(item)
+            if outbox is None:
+                results.append(output)
+            else:
+                await outbox.put(output)
+
+    async def run_stage(index, concurrency, func):
+        await asyncio.gather(*(work(index, func) for _ in range(concurrency)))
+        if index + 1 < len(stages):
+            for _ in range(stages[index + 1][1]):
+                await queues[index + 1].put(_DONE)
+
+    async def run_source():
+        await produce()
+        for _ in range(stages[0][1]):
+            await queues[0].put(_DONE)
+
+    tasks = [asyncio.ensure_future(run_source())]
+    tasks += [
+        asyncio.ensure_future(run_stage(index, concurrency, func))
+        for index, (_, concurrency, func) in enumerate(stages)
+    ]
+
+    try:
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+    return results
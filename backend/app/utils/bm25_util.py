@@ -0,0 +1,205 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from app.config.settings import get_settings
+from app.utils.logging_util import configure_worker_logging, logger, start_worker_log_listener
+
+settings = get_settings()
+
+TOKENIZER_PARAMS = ("lower_case", "remove_punctuation", "remove_stopwords", "stem", "language")
+
+_encoder = None
+_encoder_lock = threading.Lock()
+_executor = None
+_worker_log_listener = None
+
+
+class MappedDocFreq:
+    """Read-only token hash -> document frequency table backed by memory-mapped numpy arrays"""
+
+    def __init__(self, keys, values):
+        self.keys = keys
+        self.values = values
+
+    def get(self, key, default=None):
+        position = int(np.searchsorted(self.keys, key))
+        if position < len(self.keys) and self.keys[position] == key:
+            return float(self.values[position])
+        return default
+
+    def __len__(self):
+        return len(self.keys)
+
+
+def convert_bm25_pickle(pickle_path: str, output_dir: str):
+    """Write a pickled BM25Encoder as sorted doc-frequency arrays plus a small params file"""
+    with open(pickle_path, "rb") as f:
+        encoder = pickle.load(f)
+
+    doc_freq = encoder.doc_freq or {}
+    keys = np.fromiter(doc_freq.keys(), dtype=np.uint32, count=len(doc_freq))
+    values = np.fromiter(doc_freq.values(), dtype=np.float32, count=len(doc_freq))
+    order = np.argsort(keys)
+
+    params = {
+        "b": encoder.b,
+        "k1": encoder.k1,
+        "n_docs": encoder.n_docs,
+        "avgdl": encoder.avgdl,
+    }
+    # pinecone_text keeps the tokenizer options on the encoder's tokenizer, not the encoder;
+    # converting without them would silently tokenize with the defaults
+    tokenizer = getattr(encoder, "_tokenizer", None)
+    missing = [name for name in TOKENIZER_PARAMS if not hasattr(tokenizer, name)]
+    if missing:
+        raise ValueError(f"BM25 encoder in {pickle_path} has no tokenizer options {missing}, cannot convert it")
+    for name in TOKENIZER_PARAMS:
+        params[name] = getattr(tokenizer, name)
+
+    os.makedirs(output_dir, exist_ok=True)
+    for name, array in (("doc_freq_keys", keys[order]), ("doc_freq_values", values[order])):
+        tmp_path = os.path.join(output_dir, f"{name}.{os.getpid()}.tmp.npy")
+        np.save(tmp_path, array)
+        os.replace(tmp_path, os.path.join(output_dir, f"{name}.npy"))
+    tmp_path = os.path.join(output_dir, f"params.{os.getpid()}.tmp.json")
+    with open(tmp_path, "w") as f:
+        json.dump(params, f)
+    os.replace(tmp_path, os.path.join(output_dir, "params.json"))
+
+
+def _load_encoder():
+    from pinecone_text.sparse import BM25Encoder
+
+    encoder_dir = settings.BM25_ENCODER_DIR
+    params_path = os.path.join(encoder_dir, "params.json")
+    if not os.path.exists(params_path):
+        if not os.path.exists(settings.BM25_ENCODER_PATH):
+            raise FileNotFoundError(
+                f"No BM25 encoder found at {encoder_dir} or {settings.BM25_ENCODER_PATH}"
+            )
+        logger.info(f"Converting {settings.BM25_ENCODER_PATH} to memory-mapped format in {encoder_dir}")
+        convert_bm25_pickle(settings.BM25_ENCODER_PATH, encoder_dir)
+
+    with open(params_path, "r") as f:
+        params = json.load(f)
+    missing = [name for name in TOKENIZER_PARAMS if name not in params]
+    if missing:
+        raise ValueError(
+            f"{params_path} has no tokenizer options {missing}; remove {encoder_dir} to convert the pickle again"
+        )
+
+    encoder = BM25Encoder(
+        b=params["b"],
+        k1=params["k1"],
+        **{name: params[name] for name in TOKENIZER_PARAMS},
+    )
+    encoder.n_docs = params["n_docs"]
+    encoder.avgdl = params["avgdl"]
+    # mmap_mode lets every worker process share the same page-cache pages
+    encoder.doc_freq = MappedDocFreq(
+        np.load(os.path.join(encoder_dir, "doc_freq_keys.npy"), mmap_mode="r"),
+        np.load(os.path.join(encoder_dir, "doc_freq_values.npy"), mmap_mode="r"),
+    )
+    return encoder
+
+
+def get_bm25_encoder():
+    """Load the BM25 encoder on first use, once per process"""
+    global _encoder
+    if _encoder is None:
+        with _encoder_lock:
+            if _encoder is None:
+                _encoder = _load_encoder()
+    return _encoder
+
+
+def _encode_documents_chunk(texts):
+    return get_bm25_encoder().encode_documents(texts)
+
+
+def _encode_queries_chunk(texts):
+    return get_bm25_encoder().encode_queries(texts)
+
+
+def _init_sparse_worker(worker_log_queue):
+    """Worker process setup: log through the parent, then load the encoder before the first task"""
+    configure_worker_logging(worker_log_queue)
+    try:
+        get_bm25_encoder()
+    except Exception as e:
+        # a failing initializer would break the whole pool; the first task reports it instead
+        logger.error(f"BM25 encoder failed to load in sparse worker {os.getpid()}: {str(e)}")
+
+
+def get_sparse_executor():
+    """Executor that keeps CPU-bound BM25 tokenization off the event loop"""
+    global _executor, _worker_log_listener
+    if _executor is None:
+        if settings.SPARSE_ENCODER_EXECUTOR == "thread":
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.SPARSE_ENCODER_WORKERS, thread_name_prefix="bm25"
+            )
+        else:
+            # spawn, not fork: a forked child would inherit the log writer thread's locks,
+            # open SQLite connections and a log queue that nothing drains there
+            context = multiprocessing.get_context("spawn")
+            worker_log_queue = context.Queue()
+            _worker_log_listener = start_worker_log_listener(worker_log_queue)
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.SPARSE_ENCODER_WORKERS,
+                mp_context=context,
+                initializer=_init_sparse_worker,
+                initargs=(worker_log_queue,),
+            )
+    return _executor
+
+
+def shutdown_sparse_executor():
+    global _executor, _worker_log_listener
+    if _executor is not None:
+        # waiting only covers chunks already running, and lets workers flush their log records
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+    if _worker_log_listener is not None:
+        _worker_log_listener.stop()
+        _worker_log_listener = None
+
+
+async def _run_chunked(func, texts):
+    chunk_size = settings.SPARSE_ENCODER_CHUNK_SIZE
+    chunks = [texts[i : i + chunk_size] for i in range(0, len(texts), chunk_size)]
+    loop = asyncio.get_running_loop()
+    executor = get_sparse_executor()
+    results = await asyncio.gather(
+        *(loop.run_in_executor(executor, func, chunk) for chunk in chunks)
+    )
+    return [vector for chunk_result in results for vector in chunk_result]
+
+
+async def encode_documents(texts: list):
+    """BM25 sparse vectors for documents, encoded in chunks across the sparse executor"""
+    return await _run_chunked(_encode_documents_chunk, texts)
+
+
+async def encode_queries(texts: list):
+    """BM25 sparse vectors for queries, encoded on the sparse executor"""
+    return await _run_chunked(_encode_queries_chunk, texts)
+
+
+async def warm_up_sparse_encoder():
+    """Eagerly load the encoder in this process and in every sparse worker"""
+    await asyncio.to_thread(get_bm25_encoder)
+    loop = asyncio.get_running_loop()
+    executor = get_sparse_executor()
+    await asyncio.gather(*(
+        loop.run_in_executor(executor, _encode_documents_chunk, ["warm up"])
+        for _ in range(settings.SPARSE_ENCODER_WORKERS)
+    ))
+    logger.info("BM25 sparse encoder warmed up")
@@ -0,0 +1,21 @@
+import hashlib
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def make_chunk_id(file_path: str, start_line, end_line, text: str) -> str:
+    """Deterministic chunk id from the file path, line span and content hash"""
+    key = f"{file_path}:{start_line}:{end_line}:{content_hash(text)}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:40]
+
+
+def assign_chunk_id(chunk: dict) -> dict:
+    """Overwrite the client supplied _id with a deterministic one and record the content hash"""
+    text = chunk.get("text", chunk.get("code", "")) or ""
+    chunk["content_hash"] = content_hash(text)
+    chunk["_id"] = make_chunk_id(
+        chunk.get("file_path", ""), chunk.get("start_line"), chunk.get("end_line"), text
+    )
+    return chunk
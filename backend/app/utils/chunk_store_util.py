@@ -0,0 +1,174 @@
+import asyncio
+import os
+import sqlite3
+import threading
+
+from app.config.settings import get_settings
+from app.utils.logging_util import logger
+
+settings = get_settings()
+
+SQLITE_MAX_VARIABLES = 500
+
+
+class ChunkStore:
+    """
+    Local file_path -> chunks index written at resync time.
+
+    Chunks are stored in SQLite keyed by (namespace, chunk_id) with an index on
+    (namespace, file_path, start_line), so the line-ordered chunks of a file are a
+    single index range scan instead of a filtered vector query.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chunks ("
+                "namespace TEXT NOT NULL, chunk_id TEXT NOT NULL, file_path TEXT NOT NULL, "
+                "file_name TEXT, start_line INTEGER, end_line INTEGER, text TEXT NOT NULL, "
+                "PRIMARY KEY (namespace, chunk_id))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS chunks_by_file ON chunks (namespace, file_path, start_line)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _add_chunks(self, namespace, chunks):
+        rows = [
+            (
+                namespace,
+                chunk["_id"],
+                chunk.get("file_path", "unknown"),
+                chunk.get("file_name"),
+                chunk.get("start_line"),
+                chunk.get("end_line"),
+                chunk.get("text", ""),
+            )
+            for chunk in chunks
+        ]
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO chunks "
+                "(namespace, chunk_id, file_path, file_name, start_line, end_line, text) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.commit()
+
+    def _remove_chunks(self, namespace, chunk_ids):
+        with self._lock:
+            conn = self._connection()
+            for i in range(0, len(chunk_ids), SQLITE_MAX_VARIABLES):
+                batch = chunk_ids[i : i + SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(batch))
+                conn.execute(
+                    f"DELETE FROM chunks WHERE namespace = ? AND chunk_id IN ({placeholders})",
+                    [namespace, *batch],
+                )
+            conn.commit()
+
+    def _get_file_chunks(self, namespace, file_paths):
+        chunks_by_file = {}
+        with self._lock:
+            conn = self._connection()
+            for i in range(0, len(file_paths), SQLITE_MAX_VARIABLES):
+                batch = file_paths[i : i + SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    "SELECT file_path, file_name, start_line, end_line, text FROM chunks "
+                    f"WHERE namespace = ? AND file_path IN ({placeholders}) "
+                    "ORDER BY file_path, start_line",
+                    [namespace, *batch],
+                ).fetchall()
+                for file_path, file_name, start_line, end_line, text in rows:
+                    chunks_by_file.setdefault(file_path, []).append({
+                        "file_path": file_path,
+                        "file_name": file_name,
+                        "start_line": start_line,
+                        "end_line": end_line,
+                        "text": text,
+                    })
+        return chunks_by_file
+
+    def _get_file_paths(self, namespace):
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT DISTINCT file_path FROM chunks WHERE namespace = ? ORDER BY file_path",
+                (namespace,),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    async def add_chunks(self, namespace: str, chunks: list):
+        if chunks:
+            await asyncio.to_thread(self._add_chunks, namespace, chunks)
+
+    async def remove_chunks(self, namespace: str, chunk_ids: list):
+        if chunk_ids:
+            await asyncio.to_thread(self._remove_chunks, namespace, chunk_ids)
+
+    async def get_file_chunks(self, namespace: str, file_paths: list) -> dict:
+        """Line-ordered chunks of each file, keyed by file_path"""
+        return await asyncio.to_thread(self._get_file_chunks, namespace, list(file_paths))
+
+    async def get_file_paths(self, namespace: str) -> list:
+        """Every indexed file path of the namespace, sorted"""
+        return await asyncio.to_thread(self._get_file_paths, namespace)
+
+    async def get_neighbours(self, namespace: str, hits: list, window: int):
+        """
+        Chunks adjacent to the retrieved hits, in file and line order
+
+        Args:
+            namespace (str): Namespace the hits were retrieved from
+            hits (list): metadata dicts with file_path and start_line of each retrieved chunk
+            window (int): Number of chunks to take on each side of a hit; negative means the whole file
+
+        Returns:
+            list | None: neighbour chunks excluding the hits themselves, or None when
+            the store has no chunks for any of the hit files (e.g. not resynced yet)
+        """
+        hit_keys = {(hit.get("file_path"), hit.get("start_line")) for hit in hits}
+        file_paths = {file_path for file_path, _ in hit_keys}
+        try:
+            chunks_by_file = await self.get_file_chunks(namespace, file_paths)
+        except sqlite3.Error as e:
+            logger.error(f"Chunk store lookup failed: {str(e)}")
+            return None
+        if not chunks_by_file:
+            return None
+
+        neighbours = []
+        for file_path, chunks in chunks_by_file.items():
+            if window < 0:
+                selected = range(len(chunks))
+            else:
+                positions = [
+                    position for position, chunk in enumerate(chunks)
+                    if (file_path, chunk["start_line"]) in hit_keys
+                ]
+                selected = sorted({
+                    neighbour
+                    for position in positions
+                    for neighbour in range(max(0, position - window), min(len(chunks), position + window + 1))
+                })
+            for position in selected:
+                chunk = chunks[position]
+                if (file_path, chunk["start_line"]) not in hit_keys:
+                    neighbours.append(chunk)
+        return neighbours
+
+
+chunk_store = ChunkStore(db_path=settings.CHUNK_STORE_PATH)
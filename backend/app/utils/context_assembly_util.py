@@ -0,0 +1,237 @@
+import asyncio
+import os
+import sqlite3
+
+from app.config.settings import get_settings
+from app.utils.chunk_store_util import chunk_store
+from app.utils.folder_structure_util import folder_struct_from_paths
+from app.utils.logging_util import logger
+
+settings = get_settings()
+
+# Retrieval sources in ranking order: reranked hits, vector search hits kept in search order
+# when the reranker is unavailable, and neighbouring chunks from metadata expansion
+SOURCE_RANKS = {"rerank": 2, "vector": 1, "expansion": 0}
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            # tiktoken missing or its BPE file unavailable offline
+            logger.warning(f"tiktoken unavailable, estimating tokens from characters: {str(e)}")
+    return _encoding
+
+
+async def warm_up_token_encoding():
+    """Load the tokenizer at startup; its first load can fetch the BPE file over the network"""
+    await asyncio.to_thread(_get_encoding)
+
+
+def count_tokens(text: str) -> int:
+    """Token count with cl100k_base, or a 4-characters-per-token estimate without tiktoken"""
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+async def count_tokens_async(*texts: str) -> int:
+    """Summed token count of texts, off the event loop"""
+    return await asyncio.to_thread(lambda: sum(count_tokens(text) for text in texts))
+
+
+def _line(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _merge_adjacent(chunks):
+    """Merge line-adjacent chunks of one file into blocks; chunks must be sorted by start_line"""
+    blocks = []
+    for chunk in chunks:
+        start, end = _line(chunk["start_line"]), _line(chunk["end_line"])
+        last = blocks[-1] if blocks else None
+        if (
+            last is not None and start is not None and last["end_line"] is not None
+            and last["end_line"] <= start <= last["end_line"] + 1
+        ):
+            last["texts"].append(chunk["text"])
+            last["end_line"] = end
+            last["score"] = max(last["score"], chunk["score"])
+            last["rank"] = max(last["rank"], chunk["rank"])
+            last["chunks"] += 1
+        else:
+            blocks.append({
+                "file_path": chunk["file_path"],
+                "start_line": start,
+                "end_line": end,
+                "texts": [chunk["text"]],
+                "score": chunk["score"],
+                "rank": chunk["rank"],
+                "chunks": 1,
+            })
+    return blocks
+
+
+def _render_blocks(blocks, start_index: int = 1):
+    parts = []
+    for i, block in enumerate(blocks, start=start_index):
+        lines = ""
+        if block["start_line"] is not None and block["end_line"] is not None:
+            lines = f", lines {block['start_line']}-{block['end_line']}"
+        parts.append(f"--- Document {i} (from {block['file_path']}{lines}) ---\n")
+        parts.append("\n".join(block["texts"]))
+        parts.append("\n\n")
+    return "".join(parts)
+
+
+def _fit_folder_structure(folder_structure: str, file_paths: set, all_paths: list, budget: int):
+    """Folder tree cut down to the directories holding retrieved files, within budget tokens"""
+    if all_paths:
+        directories = {os.path.dirname(path) for path in file_paths}
+        candidates = [
+            # subtrees under the retrieved files' directories
+            [path for path in all_paths if any(
+                directory == "" or path.startswith(directory + "/") for directory in directories
+            )],
+            # only files directly in those directories
+            [path for path in all_paths if os.path.dirname(path) in directories],
+            sorted(file_paths),
+        ]
+        for paths in candidates:
+            tree = folder_struct_from_paths(paths)
+            if count_tokens(tree) <= budget:
+                return f"(showing the part of the tree around the retrieved files)\n{tree}"
+
+    # No indexed paths to rebuild from: keep the head of the rendered tree
+    kept = []
+    used = 0
+    for line in folder_structure.splitlines():
+        used += count_tokens(line) + 1
+        if used > budget:
+            break
+        kept.append(line)
+    kept.append("... (folder structure truncated)")
+    return "\n".join(kept)
+
+
+def _pack_context(retrieved_docs: list, folder_structure: str, top_n: int):
+    """Dedupe, merge and budget the retrieved chunks; returns the context dict and the kept file paths"""
+    seen = set()
+    chunks = []
+    dropped_duplicates = 0
+    for i, doc in enumerate(retrieved_docs):
+        metadata = doc.get("metadata", {})
+        rank = SOURCE_RANKS.get(doc.get("source", "rerank" if i < top_n else "expansion"), 0)
+        key = (metadata.get("file_path"), _line(metadata.get("start_line")))
+        if key in seen:
+            dropped_duplicates += 1
+            continue
+        seen.add(key)
+        chunks.append({
+            "file_path": metadata.get("file_path", "Unknown file"),
+            "start_line": metadata.get("start_line"),
+            "end_line": metadata.get("end_line"),
+            "text": doc["text"],
+            "score": doc.get("relevance_score", 0) if rank else 0,
+            "rank": rank,
+        })
+
+    by_file = {}
+    for chunk in chunks:
+        by_file.setdefault(chunk["file_path"], []).append(chunk)
+
+    blocks = []
+    for file_chunks in by_file.values():
+        file_chunks.sort(key=lambda chunk: (_line(chunk["start_line"]) is None, _line(chunk["start_line"]) or 0))
+        file_blocks = _merge_adjacent(file_chunks)
+        # expansion-only blocks rank just below the best retrieved hit of their file
+        best = max((block["score"] for block in file_blocks if block["rank"]), default=0)
+        for block in file_blocks:
+            if not block["rank"]:
+                block["score"] = best * 0.5
+        blocks.extend(file_blocks)
+    blocks.sort(key=lambda block: (block["rank"], block["score"]), reverse=True)
+
+    budget = settings.RAG_CONTEXT_TOKEN_BUDGET
+    used = 0
+    kept = []
+    dropped_over_budget = 0
+    for block in blocks:
+        tokens = count_tokens("\n".join(block["texts"])) + 20  # header and separators
+        if used + tokens > budget:
+            dropped_over_budget += block["chunks"]
+            continue
+        used += tokens
+        kept.append(block)
+
+    retrieved_blocks = [block for block in kept if block["rank"]]
+    expansion_blocks = [block for block in kept if not block["rank"]]
+
+    retrieved_context_text = ""
+    if retrieved_blocks:
+        retrieved_context_text = "Here are relevant code snippets from the codebase:\n\n" + _render_blocks(retrieved_blocks)
+    metadata_context_text = ""
+    if expansion_blocks:
+        metadata_context_text = "Here is additional context around the relevant code snippets:\n\n" + _render_blocks(
+            expansion_blocks, start_index=len(retrieved_blocks) + 1
+        )
+
+    context = {
+        "retrieved_context_text": retrieved_context_text,
+        "metadata_context_text": metadata_context_text,
+        "folder_structure": folder_structure,
+        "stats": {
+            "context_tokens": used,
+            "folder_structure_tokens": count_tokens(folder_structure),
+            "chunks_in": len(retrieved_docs),
+            "chunks_used": sum(block["chunks"] for block in kept),
+            "blocks_used": len(kept),
+            "dropped_duplicates": dropped_duplicates,
+            "dropped_over_budget": dropped_over_budget,
+        },
+    }
+    return context, {block["file_path"] for block in kept}
+
+
+async def assemble_rag_context(namespace: str, retrieved_docs: list, folder_structure: str, top_n: int):
+    """
+    Build the retrieved-context sections of the RAG prompt within a token budget
+
+    Expansion chunks that duplicate retrieved ones (same file_path and start_line) are dropped,
+    line-adjacent chunks of a file are merged into one block, and blocks are added in relevance
+    order until RAG_CONTEXT_TOKEN_BUDGET is spent. The folder tree gets its own budget.
+    Tokenizing and tree rebuilding run in a worker thread to keep the event loop free.
+
+    Returns:
+        dict: retrieved_context_text, metadata_context_text, folder_structure and stats
+    """
+    context, file_paths = await asyncio.to_thread(_pack_context, retrieved_docs, folder_structure, top_n)
+
+    budget = settings.RAG_FOLDER_TREE_TOKEN_BUDGET
+    if context["stats"]["folder_structure_tokens"] > budget:
+        try:
+            all_paths = await chunk_store.get_file_paths(namespace)
+        except sqlite3.Error as e:
+            logger.error(f"Chunk store file path lookup failed: {str(e)}")
+            all_paths = []
+        folder_structure = await asyncio.to_thread(
+            _fit_folder_structure, folder_structure, file_paths, all_paths, budget
+        )
+        context["folder_structure"] = folder_structure
+        context["stats"]["folder_structure_tokens"] = await count_tokens_async(folder_structure)
+
+    return context
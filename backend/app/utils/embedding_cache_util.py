@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from app.config.settings import get_settings
+from app.utils.logging_util import logger
+
+settings = get_settings()
+
+SQLITE_MAX_VARIABLES = 500
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache.
+
+    Vectors are keyed by (provider, model, dimension, input_type, sha256(text)) and
+    stored as float32 blobs in SQLite, with an in-memory LRU of float32 arrays in front of
+    the disk store. Every vector is rounded to float32, so hits and misses return the same values.
+    """
+
+    def __init__(self, db_path: str, memory_size: int):
+        self.db_path = db_path
+        self.memory_size = memory_size
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(provider, model, dimension, input_type, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{provider}:{model}:{dimension}:{input_type}:{digest}"
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _remember(self, key, vector):
+        self.memory[key] = vector
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+
+    def _disk_get_many(self, keys):
+        found = {}
+        with self._lock:
+            conn = self._connection()
+            for i in range(0, len(keys), SQLITE_MAX_VARIABLES):
+                batch = keys[i : i + SQLITE_MAX_VARIABLES]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob)
+        return found
+
+    def _disk_put_many(self, items):
+        now = time.time()
+        rows = [(key, vector.tobytes(), now) for key, vector in items.items()]
+        with self._lock:
+            conn = self._connection()
+            conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, created_at) VALUES (?, ?, ?)", rows
+            )
+            conn.commit()
+
+    async def get_many(self, keys):
+        """Batch lookup: memory first, then a single round of disk queries for the rest"""
+        found = {}
+        remaining = []
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is not None:
+                self.memory.move_to_end(key)
+                found[key] = vector
+            else:
+                remaining.append(key)
+
+        if remaining:
+            try:
+                disk_found = await asyncio.to_thread(self._disk_get_many, remaining)
+            except sqlite3.Error as e:
+                logger.error(f"Embedding cache disk lookup failed: {str(e)}")
+                disk_found = {}
+            for key, vector in disk_found.items():
+                self._remember(key, vector)
+            found.update(disk_found)
+
+        return found
+
+    async def put_many(self, items):
+        """items maps keys to float32 arrays"""
+        for key, vector in items.items():
+            self._remember(key, vector)
+        try:
+            await asyncio.to_thread(self._disk_put_many, items)
+        except sqlite3.Error as e:
+            logger.error(f"Embedding cache disk write failed: {str(e)}")
+
+    async def get_or_embed(self, provider, model, dimension, input_type, inputs, fetch):
+        """
+        Return one vector per input, calling fetch(texts) only for cache misses
+
+        Args:
+            provider, model, dimension, input_type: cache key components
+            inputs (list): texts to embed
+            fetch: async callable taking a list of texts and returning their vectors in order
+
+        Returns:
+            tuple: (vectors in input order, hit count, miss count)
+        """
+        keys = [self.make_key(provider, model, dimension, input_type, text) for text in inputs]
+        found = await self.get_many(list(dict.fromkeys(keys)))
+
+        missing = {}
+        for key, text in zip(keys, inputs):
+            if key not in found and key not in missing:
+                missing[key] = text
+
+        if missing:
+            vectors = await fetch(list(missing.values()))
+            fetched = {key: array("f", vector) for key, vector in zip(missing.keys(), vectors)}
+            await self.put_many(fetched)
+            found.update(fetched)
+
+        misses = sum(1 for key in keys if key in missing)
+        hits = len(keys) - misses
+        self.hits += hits
+        self.misses += misses
+
+        return [found[key].tolist() for key in keys], hits, misses
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self.memory),
+        }
+
+
+embedding_cache = EmbeddingCache(
+    db_path=settings.EMBEDDING_CACHE_PATH,
+    memory_size=settings.EMBEDDING_CACHE_MEMORY_SIZE,
+)
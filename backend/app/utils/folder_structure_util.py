@@ -21,6 +21,26 @@ def folder_struct_util(json_file_path="uploads/raw_dataset.json", exclude_dirs=N
     # Extract unique file paths
     unique_paths = extract_unique_file_paths(json_file_path, exclude_dirs)
     
+    return folder_struct_from_paths(unique_paths, exclude_dirs)
+
+def folder_struct_from_paths(file_paths, exclude_dirs=None):
+    """
+    Generate folder structure as a string from already collected file paths
+    
+    Args:
+        file_paths (iterable): File paths, e.g. gathered while streaming the uploaded dataset
+        exclude_dirs (list): List of directory names to exclude (default: ['venv', 'node_modules', '.git', '__pycache__'])
+    
+    Returns:
+        str: Formatted folder structure as a string
+    """
+    if exclude_dirs is None:
+        exclude_dirs = ['venv', 'node_modules', '.git', '__pycache__']
+    
+    unique_paths = sorted(
+        {path for path in file_paths if path and not is_excluded_path(path, exclude_dirs)}
+    )
+    
     # Build tree structure
     tree = build_tree_from_paths(unique_paths)
     
@@ -0,0 +1,22 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # optional speed-up, the stdlib handles everything it does
+    orjson = None
+
+JSONDecodeError = json.JSONDecodeError
+
+
+def loads(data):
+    """Decode JSON from str or bytes, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj) -> str:
+    """Compact JSON encoding, with orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
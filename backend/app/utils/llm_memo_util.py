@@ -0,0 +1,173 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from app.config.settings import get_settings
+from app.utils.logging_util import logger
+from app.utils.ttl_cache_util import TTLCache
+
+settings = get_settings()
+
+# Result handed to waiters when the caller that owned a shared request was cancelled
+_ABANDONED = object()
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def json_completion_check(*required_fields):
+    """Validator for chat completions whose content must be a JSON object with these fields"""
+    def check(response) -> bool:
+        try:
+            content = json.loads(response["choices"][0]["message"]["content"])
+        except (json.JSONDecodeError, KeyError, IndexError, TypeError):
+            return False
+        return isinstance(content, dict) and all(field in content for field in required_fields)
+    return check
+
+
+class LLMMemo:
+    """
+    Memoized responses of classifier-style LLM calls.
+
+    Keyed by (provider, model, system prompt hash, user prompt hash, params), held in a TTL + LRU
+    memory tier with an optional SQLite tier. Concurrent identical calls share one request.
+    """
+
+    def __init__(self, memory_size: int, ttl: float, disk_path: str = None):
+        self.memory = TTLCache(memory_size, ttl)
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(provider, model, system_prompt, user_prompt, params: dict) -> str:
+        params_json = json.dumps(params, sort_keys=True, default=str)
+        return ":".join([provider, model, _hash(system_prompt), _hash(user_prompt), _hash(params_json)])
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.disk_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.disk_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_memo ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _disk_get(self, key):
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT response, expires_at FROM llm_memo WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0]), row[1] - time.time()
+
+    def _disk_put(self, key, response):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_memo (key, response, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(response), time.time() + self.ttl),
+            )
+            conn.commit()
+
+    async def _get(self, key):
+        response = self.memory.get(key)
+        if response is not None or not self.disk_path:
+            return response
+        try:
+            found = await asyncio.to_thread(self._disk_get, key)
+        except sqlite3.Error as e:
+            logger.error(f"LLM memo disk lookup failed: {str(e)}")
+            return None
+        if found is None:
+            return None
+        response, remaining_ttl = found
+        self.memory.put(key, response, ttl=remaining_ttl)
+        return response
+
+    async def _put(self, key, response):
+        self.memory.put(key, response)
+        if self.disk_path:
+            try:
+                await asyncio.to_thread(self._disk_put, key, response)
+            except sqlite3.Error as e:
+                logger.error(f"LLM memo disk write failed: {str(e)}")
+
+    async def get_or_call(self, key: str, call, validate=None):
+        """
+        Return the memoized response for key, or await call() once and remember its result
+
+        A result that fails validate(response) is returned to this caller and its waiters
+        but not remembered, so one unusable reply is not replayed until the TTL expires.
+        """
+        while True:
+            response = await self._get(key)
+            if response is not None:
+                self.hits += 1
+                return response
+
+            future = self.in_flight.get(key)
+            if future is None:
+                break
+            response = await asyncio.shield(future)
+            if response is not _ABANDONED:
+                self.hits += 1
+                return response
+            # the owner was cancelled: look again, then make the call ourselves
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self.in_flight[key] = future
+        try:
+            response = await call()
+            if validate is None or validate(response):
+                await self._put(key, response)
+            else:
+                logger.warning(f"LLM memo: not remembering an invalid response for {key.split(':', 2)[:2]}")
+            future.set_result(response)
+            return response
+        except asyncio.CancelledError:
+            # only this caller is cancelled; waiters retry instead of failing with it
+            if not future.done():
+                future.set_result(_ABANDONED)
+            raise
+        except Exception as e:
+            # waiters see the same failure; nothing is remembered
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self.in_flight[key]
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self.memory),
+        }
+
+
+llm_memo = LLMMemo(
+    memory_size=settings.LLM_MEMO_MEMORY_SIZE,
+    ttl=settings.LLM_MEMO_TTL,
+    disk_path=settings.LLM_MEMO_PATH if settings.LLM_MEMO_DISK_ENABLED else None,
+)
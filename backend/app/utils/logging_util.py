@@ -1,70 +1,115 @@
+import atexit
+import copy
 import logging
-import os 
+import logging.handlers
+import os
+import queue
 
-os.makedirs("logs", exist_ok=True)
+from app.config.settings import get_settings
 
-pinecone_logger = logging.getLogger("pinecone")
-pinecone_logger.setLevel(logging.INFO)
-pinecone_handler = logging.FileHandler("logs/pinecone_usage.log")
-formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-pinecone_handler.setFormatter(formatter)
-pinecone_logger.addHandler(pinecone_handler)
+settings = get_settings()
 
-cohere_logger = logging.getLogger("cohere")
-cohere_logger.setLevel(logging.INFO)
-cohere_handler = logging.FileHandler("logs/cohere_usage.log")
-formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-cohere_handler.setFormatter(formatter)
-cohere_logger.addHandler(cohere_handler)
+os.makedirs(settings.LOG_DIR, exist_ok=True)
 
-jina_logger = logging.getLogger("jina")
-jina_logger.setLevel(logging.INFO)
-jina_handler = logging.FileHandler("logs/jina_usage.log")
 formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-jina_handler.setFormatter(formatter)
-jina_logger.addHandler(jina_handler)
 
-openai_logger = logging.getLogger("openai")
-openai_logger.setLevel(logging.INFO)
-openai_handler = logging.FileHandler("logs/openai_usage.log")
-formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-openai_handler.setFormatter(formatter)
-openai_logger.addHandler(openai_handler)
 
-voyageai_logger = logging.getLogger("voyageai")
-voyageai_logger.setLevel(logging.INFO)
-voyageai_handler = logging.FileHandler("logs/voyageai_usage.log")
-formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-voyageai_handler.setFormatter(formatter)
-voyageai_logger.addHandler(voyageai_handler)
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the background writer without formatting them.
 
+    Only the message arguments are merged here (they may be mutated after the call returns);
+    timestamps, the format string and file I/O all happen on the listener thread.
+    """
 
-evaluation_logger = logging.getLogger("evaluation")
-evaluation_logger.setLevel(logging.INFO)
-evaluation_handler = logging.FileHandler("logs/evaluation_metrices_time.log")
-formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-evaluation_handler.setFormatter(formatter)
-evaluation_logger.addHandler(evaluation_handler)
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
 
-logger = logging.getLogger("main")
-logger.setLevel(logging.INFO)
-handler = logging.FileHandler("logs/main.log")
-formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-handler.setFormatter(formatter)
-logger.addHandler(handler)
 
-anthropic_logger = logging.getLogger("anthropic")
-anthropic_logger.setLevel(logging.INFO)
-anthropic_handler = logging.FileHandler("logs/anthropic_usage.log")
-formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-anthropic_handler.setFormatter(formatter)
-anthropic_logger.addHandler(anthropic_handler)
+class DebugSampler(logging.Filter):
+    """Let through one in every `every` DEBUG records per call site; other levels always pass"""
 
-groq_logger = logging.getLogger("groq")
-groq_logger.setLevel(logging.INFO)
-groq_handler = logging.FileHandler("logs/groq_usage.log")
-formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-groq_handler.setFormatter(formatter)
-groq_logger.addHandler(groq_handler)
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self.counts = {}
+
+    def filter(self, record):
+        if record.levelno != logging.DEBUG or self.every == 1:
+            return True
+        site = (record.pathname, record.lineno)
+        count = self.counts.get(site, 0)
+        self.counts[site] = count + 1
+        return count % self.every == 0
+
+
+log_queue = queue.SimpleQueue()
+queue_handler = NonBlockingQueueHandler(log_queue)
+queue_handler.addFilter(DebugSampler(settings.LOG_DEBUG_SAMPLE_EVERY))
+file_handlers = []
+
+
+def _get_logger(name: str, filename: str, level: int = logging.INFO):
+    """Logger that enqueues records; its rotating file is written by the shared listener"""
+    file_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(settings.LOG_DIR, filename),
+        maxBytes=settings.LOG_MAX_BYTES,
+        backupCount=settings.LOG_BACKUP_COUNT,
+        delay=True,
+    )
+    file_handler.setFormatter(formatter)
+    # one listener serves every file, so each file only takes its own logger's records
+    file_handler.addFilter(logging.Filter(name))
+    file_handlers.append(file_handler)
+
+    named_logger = logging.getLogger(name)
+    named_logger.setLevel(level)
+    named_logger.addHandler(queue_handler)
+    return named_logger
+
+
+pinecone_logger = _get_logger("pinecone", "pinecone_usage.log")
+cohere_logger = _get_logger("cohere", "cohere_usage.log")
+jina_logger = _get_logger("jina", "jina_usage.log")
+openai_logger = _get_logger("openai", "openai_usage.log")
+voyageai_logger = _get_logger("voyageai", "voyageai_usage.log")
+evaluation_logger = _get_logger("evaluation", "evaluation_metrices_time.log")
+logger = _get_logger("main", "main.log", logging.getLevelName(settings.LOG_LEVEL))
+anthropic_logger = _get_logger("anthropic", "anthropic_usage.log")
+groq_logger = _get_logger("groq", "groq_usage.log")
+
+log_listener = logging.handlers.QueueListener(log_queue, *file_handlers, respect_handler_level=True)
+log_listener.start()
+
+
+def stop_log_listener():
+    """Drain queued records to disk and stop the writer thread; safe to call more than once"""
+    if log_listener._thread is not None:
+        log_listener.stop()
+        for file_handler in file_handlers:
+            file_handler.close()
+
+
+atexit.register(stop_log_listener)
+
+
+def start_worker_log_listener(worker_queue):
+    """Write records that worker processes put on worker_queue to this process's log files"""
+    listener = logging.handlers.QueueListener(worker_queue, *file_handlers, respect_handler_level=True)
+    listener.start()
+    return listener
 
 
+def configure_worker_logging(worker_queue):
+    """
+    In a worker process: send records to the parent through worker_queue instead of
+    writing the log files here, so only one process ever writes and rotates them
+    """
+    stop_log_listener()
+    queue_handler.queue = worker_queue
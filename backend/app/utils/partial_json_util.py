@@ -0,0 +1,83 @@
+import json
+
+
+class IncrementalJSONObjectParser:
+    """
+    Incremental parser for a JSON object streamed in arbitrary text chunks
+
+    feed() returns the top-level (key, value) pairs whose values completed in that chunk,
+    so a consumer can act on one field while the model is still generating the rest.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.state = "key"
+        self.key = None
+        self.start = None
+
+    def _complete(self, raw: str, fields: list):
+        try:
+            fields.append((self.key, json.loads(raw)))
+        except json.JSONDecodeError:
+            pass
+        self.start = None
+        self.state = "after_value"
+
+    def feed(self, chunk: str) -> list:
+        self.text += chunk
+        text = self.text
+        fields = []
+
+        for i in range(self.pos, len(text)):
+            c = text[i]
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif c == "\\":
+                    self.escape = True
+                elif c == '"':
+                    self.in_string = False
+                    if self.depth == 1 and self.state == "key":
+                        self.key = json.loads(text[self.start : i + 1])
+                        self.start = None
+                        self.state = "colon"
+                    elif self.depth == 1 and self.state == "in_value":
+                        self._complete(text[self.start : i + 1], fields)
+                continue
+
+            if c == '"':
+                self.in_string = True
+                if self.depth == 1 and self.state in ("key", "value"):
+                    self.start = i
+                    if self.state == "value":
+                        self.state = "in_value"
+            elif c in "{[":
+                if self.depth == 1 and self.state == "value":
+                    self.start = i
+                    self.state = "in_value"
+                self.depth += 1
+            elif c in "}]":
+                self.depth -= 1
+                if self.depth == 1 and self.state == "in_value":
+                    self._complete(text[self.start : i + 1], fields)
+                elif self.depth == 0 and self.state == "in_value":
+                    # primitive value closed by the end of the object
+                    self._complete(text[self.start : i].strip(), fields)
+            elif self.depth == 1:
+                if c == ":" and self.state == "colon":
+                    self.state = "value"
+                elif c == ",":
+                    if self.state == "in_value":
+                        self._complete(text[self.start : i].strip(), fields)
+                    self.state = "key"
+                elif not c.isspace() and self.state == "value":
+                    self.start = i
+                    self.state = "in_value"
+
+        self.pos = len(text)
+        return fields
@@ -0,0 +1,101 @@
+import hashlib
+import re
+
+from app.config.settings import get_settings
+from app.utils.ttl_cache_util import TTLCache
+
+settings = get_settings()
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query).strip().lower()
+
+
+def _hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class RerankCache:
+    """
+    Rerank results cached two ways:
+
+    - exact: (provider, model, normalized query, ordered candidate content hashes) -> ranked results
+    - per document: (provider, model, normalized query, content hash) -> relevance score, so a
+      candidate set that mostly overlaps a cached one only sends the new documents to the provider
+    """
+
+    def __init__(self, max_size: int, score_size: int, ttl: float, partial_min_overlap: float):
+        self.results = TTLCache(max_size, ttl)
+        self.scores = TTLCache(score_size, ttl)
+        self.partial_min_overlap = partial_min_overlap
+        self.exact_hits = 0
+        self.partial_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _rank(scores: list, top_n: int):
+        order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        return [{"index": i, "relevance_score": scores[i]} for i in order[:top_n]]
+
+    async def get_or_rerank(self, provider, model, query, documents, top_n, fetch):
+        """
+        Ranked results for documents, calling fetch only for what the cache cannot answer
+
+        Args:
+            provider, model: cache key components
+            query (str): rerank query, normalized for the key
+            documents (list): candidate texts, in retrieval order
+            top_n (int): number of results to return
+            fetch: async callable taking a list of texts and returning one relevance score per text
+
+        Returns:
+            dict: {"data": [{"index", "relevance_score"}...], "cache": "exact" | "partial" | "miss"}
+        """
+        query_hash = _hash(normalize_query(query))
+        doc_hashes = [_hash(document) for document in documents]
+        result_key = (provider, model, query_hash, tuple(doc_hashes), top_n)
+
+        cached = self.results.get(result_key)
+        if cached is not None:
+            self.exact_hits += 1
+            return {"data": cached, "cache": "exact"}
+
+        scores = [self.scores.get((provider, model, query_hash, doc_hash)) for doc_hash in doc_hashes]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        known = len(documents) - len(missing)
+
+        if known and known / len(documents) >= self.partial_min_overlap:
+            status = "partial"
+            self.partial_hits += 1
+        else:
+            # too little overlap: rescore everything so the score cache stays consistent per call
+            missing = list(range(len(documents)))
+            status = "miss"
+            self.misses += 1
+
+        if missing:
+            fetched = await fetch([documents[i] for i in missing])
+            for i, score in zip(missing, fetched):
+                scores[i] = score
+                self.scores.put((provider, model, query_hash, doc_hashes[i]), score)
+
+        ranked = self._rank(scores, top_n)
+        self.results.put(result_key, ranked)
+        return {"data": ranked, "cache": status}
+
+    def stats(self):
+        return {
+            "exact_hits": self.exact_hits,
+            "partial_hits": self.partial_hits,
+            "misses": self.misses,
+            "cached_results": len(self.results),
+            "cached_scores": len(self.scores),
+        }
+
+
+rerank_cache = RerankCache(
+    max_size=settings.RERANK_CACHE_SIZE,
+    score_size=settings.RERANK_CACHE_SCORE_SIZE,
+    ttl=settings.RERANK_CACHE_TTL,
+    partial_min_overlap=settings.RERANK_CACHE_PARTIAL_MIN_OVERLAP,
+)
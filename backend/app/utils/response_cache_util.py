@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from app.config.settings import get_settings
+from app.utils.logging_util import logger
+
+settings = get_settings()
+
+
+def context_hash(*parts) -> str:
+    """Exact-match part of the cache key, for request context the query embedding does not cover"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update((part or "").encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class SemanticResponseCache:
+    """
+    Per-namespace cache of full query responses, matched by query-embedding similarity.
+
+    Entries carry the namespace's resync stamp at the time they were written, so a resync
+    invalidates every answer generated against the previous index contents.
+    """
+
+    def __init__(self, db_path: str, threshold: float, ttl: float, max_entries: int):
+        self.db_path = db_path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, namespace TEXT NOT NULL, "
+                "context_hash TEXT NOT NULL, resync_stamp REAL NOT NULL, query TEXT NOT NULL, "
+                "embedding BLOB NOT NULL, payload TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_by_namespace ON responses (namespace, context_hash)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS resync_stamps (namespace TEXT PRIMARY KEY, resynced_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _resync_stamp(self, conn, namespace):
+        row = conn.execute(
+            "SELECT resynced_at FROM resync_stamps WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        return row[0] if row else 0.0
+
+    def _lookup(self, namespace, ctx_hash, embedding):
+        with self._lock:
+            conn = self._connection()
+            stamp = self._resync_stamp(conn, namespace)
+            rows = conn.execute(
+                "SELECT embedding, payload, query FROM responses "
+                "WHERE namespace = ? AND context_hash = ? AND resync_stamp = ? AND created_at >= ?",
+                (namespace, ctx_hash, stamp, time.time() - self.ttl),
+            ).fetchall()
+        if not rows:
+            return None
+
+        query = np.asarray(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        matrix = np.stack([np.frombuffer(row[0], dtype=np.float32) for row in rows])
+        norms = np.linalg.norm(matrix, axis=1)
+        similarities = (matrix @ query) / np.where(norms == 0, 1.0, norms)
+        best = int(similarities.argmax())
+        if similarities[best] < self.threshold:
+            return None
+        return {
+            "payload": json.loads(rows[best][1]),
+            "similarity": float(similarities[best]),
+            "cached_query": rows[best][2],
+        }
+
+    def _put(self, namespace, ctx_hash, query, embedding, payload):
+        vector = np.asarray(embedding, dtype=np.float32).tobytes()
+        with self._lock:
+            conn = self._connection()
+            stamp = self._resync_stamp(conn, namespace)
+            conn.execute(
+                "INSERT INTO responses (namespace, context_hash, resync_stamp, query, embedding, payload, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (namespace, ctx_hash, stamp, query, vector, json.dumps(payload), time.time()),
+            )
+            # Keep the newest max_entries answers per namespace
+            conn.execute(
+                "DELETE FROM responses WHERE namespace = ? AND id NOT IN ("
+                "SELECT id FROM responses WHERE namespace = ? ORDER BY created_at DESC LIMIT ?)",
+                (namespace, namespace, self.max_entries),
+            )
+            conn.commit()
+
+    def _mark_resynced(self, namespace):
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO resync_stamps (namespace, resynced_at) VALUES (?, ?)",
+                (namespace, time.time()),
+            )
+            conn.execute("DELETE FROM responses WHERE namespace = ?", (namespace,))
+            conn.commit()
+
+    async def lookup(self, namespace: str, ctx_hash: str, embedding: list):
+        """Closest cached answer for this namespace and context above the similarity threshold, or None"""
+        try:
+            entry = await asyncio.to_thread(self._lookup, namespace, ctx_hash, embedding)
+        except sqlite3.Error as e:
+            logger.error(f"Response cache lookup failed: {str(e)}")
+            entry = None
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    async def put(self, namespace: str, ctx_hash: str, query: str, embedding: list, payload: dict):
+        try:
+            await asyncio.to_thread(self._put, namespace, ctx_hash, query, embedding, payload)
+        except sqlite3.Error as e:
+            logger.error(f"Response cache write failed: {str(e)}")
+
+    async def mark_resynced(self, namespace: str):
+        """Bump the namespace's freshness stamp, dropping answers built on the old index"""
+        try:
+            await asyncio.to_thread(self._mark_resynced, namespace)
+        except sqlite3.Error as e:
+            logger.error(f"Response cache invalidation failed: {str(e)}")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+response_cache = SemanticResponseCache(
+    db_path=settings.RESPONSE_CACHE_PATH,
+    threshold=settings.RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+    ttl=settings.RESPONSE_CACHE_TTL,
+    max_entries=settings.RESPONSE_CACHE_MAX_ENTRIES,
+)
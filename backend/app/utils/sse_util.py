@@ -0,0 +1,141 @@
+import asyncio
+import time
+
+
+class SSEDecoder:
+    """
+    Byte-level text/event-stream decoder
+
+    Network chunks are appended to a bytearray and complete events are cut at blank lines,
+    so partial frames simply wait for the next chunk. Data stays as bytes for the JSON decoder.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.pending_cr = False
+
+    def _normalize(self, chunk: bytes) -> bytes:
+        # CRLF/CR line endings are rare from providers; only pay for them when present
+        if self.pending_cr:
+            chunk = b"\r" + chunk
+            self.pending_cr = False
+        if b"\r" not in chunk:
+            return chunk
+        if chunk.endswith(b"\r"):
+            self.pending_cr = True
+            chunk = chunk[:-1]
+        return chunk.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+    def _parse_event(self, block: bytes):
+        event = None
+        data_lines = []
+        for line in block.split(b"\n"):
+            if not line or line.startswith(b":"):
+                continue
+            field, _, value = line.partition(b":")
+            if value.startswith(b" "):
+                value = value[1:]
+            if field == b"data":
+                data_lines.append(value)
+            elif field == b"event":
+                event = value.decode("utf-8")
+        if not data_lines:
+            return None
+        data = data_lines[0] if len(data_lines) == 1 else b"\n".join(data_lines)
+        return event or "message", data
+
+    def feed(self, chunk: bytes) -> list:
+        """Append a network chunk and return the (event, data bytes) pairs it completed"""
+        self.buffer += self._normalize(chunk)
+        events = []
+        start = 0
+        while True:
+            end = self.buffer.find(b"\n\n", start)
+            if end == -1:
+                break
+            parsed = self._parse_event(bytes(self.buffer[start:end]))
+            if parsed is not None:
+                events.append(parsed)
+            start = end + 2
+        if start:
+            del self.buffer[:start]
+        return events
+
+    def flush(self) -> list:
+        """Events left in the buffer when the stream ends without a trailing blank line"""
+        if not self.buffer.strip():
+            return []
+        parsed = self._parse_event(bytes(self.buffer))
+        self.buffer.clear()
+        return [parsed] if parsed is not None else []
+
+
+async def iter_sse_events(response):
+    """Yield (event, data bytes) pairs from a text/event-stream httpx response"""
+    decoder = SSEDecoder()
+    async for chunk in response.aiter_bytes():
+        for event in decoder.feed(chunk):
+            yield event
+    for event in decoder.flush():
+        yield event
+
+
+async def coalesce_text_chunks(chunks, interval_ms: float, max_bytes: int):
+    """
+    Merge {"text", "done"} stream chunks into fewer, larger ones
+
+    Text is flushed once interval_ms has passed since the last flush or max_bytes are
+    buffered, whichever comes first, and always before the final done chunk.
+    """
+    interval = interval_ms / 1000
+    iterator = chunks.__aiter__()
+    buffered = []
+    buffered_bytes = 0
+    last_flush = time.monotonic()
+    next_chunk = None
+
+    try:
+        while True:
+            if next_chunk is None:
+                next_chunk = asyncio.ensure_future(iterator.__anext__())
+
+            timeout = None
+            if buffered:
+                timeout = max(0.0, interval - (time.monotonic() - last_flush))
+            done, _ = await asyncio.wait({next_chunk}, timeout=timeout)
+
+            if not done:
+                # timer expired with no new token: emit what we have
+                yield {"text": "".join(buffered), "done": False}
+                buffered, buffered_bytes = [], 0
+                last_flush = time.monotonic()
+                continue
+
+            try:
+                chunk = next_chunk.result()
+            except StopAsyncIteration:
+                break
+            finally:
+                next_chunk = None
+
+            text = chunk.get("text")
+            if text:
+                buffered.append(text)
+                buffered_bytes += len(text)
+                if buffered_bytes >= max_bytes or time.monotonic() - last_flush >= interval:
+                    yield {"text": "".join(buffered), "done": False}
+                    buffered, buffered_bytes = [], 0
+                    last_flush = time.monotonic()
+                continue
+
+            if buffered:
+                yield {"text": "".join(buffered), "done": False}
+                buffered, buffered_bytes = [], 0
+                last_flush = time.monotonic()
+            yield chunk
+
+        if buffered:
+            yield {"text": "".join(buffered), "done": False}
+    finally:
+        if next_chunk is not None:
+            next_chunk.cancel()
@@ -0,0 +1,70 @@
+import asyncio
+import time
+
+
+def validate_stage_graph(stages):
+    """Raise ValueError if a stage depends on an unknown stage or the graph has a cycle"""
+    for name, (deps, _) in stages.items():
+        for dep in deps:
+            if dep not in stages:
+                raise ValueError(f"Stage '{name}' depends on unknown stage '{dep}'")
+
+    visited = set()
+    visiting = set()
+
+    def visit(name):
+        if name in visited:
+            return
+        if name in visiting:
+            raise ValueError(f"Cycle detected in stage graph at '{name}'")
+        visiting.add(name)
+        for dep in stages[name][0]:
+            visit(dep)
+        visiting.discard(name)
+        visited.add(name)
+
+    for name in stages:
+        visit(name)
+
+
+async def run_stage_graph(stages):
+    """
+    Run async stages concurrently, starting each one as soon as its dependencies finish
+
+    Args:
+        stages (dict): stage name -> (list of dependency names, async callable).
+            The callable receives the results of its dependencies as keyword
+            arguments named after the dependency stages.
+
+    Returns:
+        tuple: (results keyed by stage name, timings keyed by stage name in seconds).
+            timings["total"] is the wall-clock time of the whole graph.
+    """
+    validate_stage_graph(stages)
+
+    results = {}
+    timings = {}
+    tasks = {}
+
+    async def run_stage(name):
+        deps, func = stages[name]
+        if deps:
+            await asyncio.gather(*(tasks[dep] for dep in deps))
+        kwargs = {dep: results[dep] for dep in deps}
+        start = time.perf_counter()
+        results[name] = await func(**kwargs)
+        timings[name] = time.perf_counter() - start
+
+    graph_start = time.perf_counter()
+    for name in stages:
+        tasks[name] = asyncio.ensure_future(run_stage(name))
+
+    try:
+        await asyncio.gather(*tasks.values())
+    except Exception:
+        for task in tasks.values():
+            task.cancel()
+        raise
+
+    timings["total"] = time.perf_counter() - graph_start
+    return results, timings
@@ -0,0 +1,83 @@
+import json
+
+import aiofiles
+
+READ_SIZE = 1024 * 1024  # 1MB reads keep memory bounded by batch size, not file size
+MAX_RECORD_SIZE = 16 * 1024 * 1024  # a record that still fails to decode at this size is malformed
+
+_decoder = json.JSONDecoder()
+_SKIP_CHARS = " \t\r\n,"
+
+
+async def iter_json_records(file_path: str, read_size: int = READ_SIZE, max_record_size: int = MAX_RECORD_SIZE):
+    """
+    Incrementally yield the objects of a JSON array file or an NDJSON file
+
+    The upload is never loaded whole: the file is read in fixed-size blocks and
+    each record is decoded as soon as it is complete in the buffer.
+
+    Args:
+        file_path (str): Path to a file holding either a JSON array of objects or one object per line
+        read_size (int): Number of characters to read per block
+        max_record_size (int): Largest record in characters; the buffer never grows much past it
+
+    Raises:
+        json.JSONDecodeError: on a malformed record, once the file ends or the record reaches max_record_size
+    """
+    async with aiofiles.open(file_path, "r", encoding="utf-8") as f:
+        buffer = ""
+        pos = 0
+        eof = False
+        is_array = None
+
+        async def fill():
+            nonlocal buffer, pos, eof
+            block = await f.read(read_size)
+            if not block:
+                eof = True
+                return
+            buffer = buffer[pos:] + block
+            pos = 0
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in _SKIP_CHARS:
+                pos += 1
+            if pos >= len(buffer):
+                if eof:
+                    return
+                await fill()
+                continue
+
+            if is_array is None:
+                is_array = buffer[pos] == "["
+                if is_array:
+                    pos += 1
+                continue
+
+            if is_array and buffer[pos] == "]":
+                return
+
+            try:
+                record, end = _decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # A block can end anywhere inside a token, so any error may just mean "read more";
+                # the record is only malformed once the file ends or it outgrows the cap
+                if eof or len(buffer) - pos >= max_record_size:
+                    raise
+                await fill()
+                continue
+
+            pos = end
+            yield record
+
+
+async def iter_batches(records, batch_size: int):
+    """Group an async iterable into lists of at most batch_size items"""
+    batch = []
+    async for record in records:
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
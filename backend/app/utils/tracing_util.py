@@ -0,0 +1,192 @@
+import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
+
+from app.config.settings import get_settings
+
+settings = get_settings()
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(label_names, labels, le: str = None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(label_names, labels)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """Prometheus histogram with one series per label combination"""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple, buckets: tuple = DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels: tuple, value: float):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series["counts"][i] += 1
+                break
+        series["sum"] += value
+        series["count"] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series["counts"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_label_text(self.label_names, labels, bound)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_label_text(self.label_names, labels, '+Inf')} {series['count']}")
+            lines.append(f"{self.name}_sum{_label_text(self.label_names, labels)} {series['sum']}")
+            lines.append(f"{self.name}_count{_label_text(self.label_names, labels)} {series['count']}")
+        return lines
+
+
+class Counter:
+    """Prometheus counter with one series per label combination"""
+
+    def __init__(self, name: str, help_text: str, label_names: tuple):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.series = {}
+
+    def inc(self, labels: tuple, value: float = 1):
+        self.series[labels] = self.series.get(labels, 0) + value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self.series.items()):
+            lines.append(f"{self.name}{_label_text(self.label_names, labels)} {value}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "codementor_request_duration_seconds", "Wall-clock time of traced requests", ("route",)
+)
+STAGE_SECONDS = Histogram(
+    "codementor_stage_duration_seconds", "Time spent in each pipeline stage", ("stage", "status")
+)
+STAGE_BYTES = Counter(
+    "codementor_stage_upstream_bytes_total", "Upstream response bytes received per stage", ("stage",)
+)
+STAGE_TOKENS = Counter(
+    "codementor_stage_tokens_total", "LLM and embedding tokens used per stage", ("stage",)
+)
+METRICS = (REQUEST_SECONDS, STAGE_SECONDS, STAGE_BYTES, STAGE_TOKENS)
+
+
+class Trace:
+    """Spans recorded while serving one request, including those of tasks it spawned"""
+
+    def __init__(self, route: str):
+        self.route = route
+        self.start = time.perf_counter()
+        self.spans = []
+
+    def breakdown(self):
+        """Compact timing in milliseconds per stage; repeated stages are summed, concurrent ones overlap"""
+        timings = {}
+        for record in self.spans:
+            timings[record["name"]] = round(timings.get(record["name"], 0) + record["duration_ms"], 1)
+        timings["total"] = round((time.perf_counter() - self.start) * 1000, 1)
+        return timings
+
+    def finish(self):
+        if settings.TRACING_ENABLED:
+            REQUEST_SECONDS.observe((self.route,), time.perf_counter() - self.start)
+        return self.breakdown()
+
+
+def start_trace(route: str) -> Trace:
+    """Start collecting spans for the current request; tasks created afterwards inherit it"""
+    trace = Trace(route)
+    _current_trace.set(trace)
+    return trace
+
+
+def current_stage():
+    """Name of the innermost open span, or None outside any span"""
+    record = _current_span.get()
+    return record["name"] if record is not None else None
+
+
+def annotate(**attributes):
+    """Attach upstream details to the innermost open span; bytes and tokens accumulate"""
+    record = _current_span.get()
+    if record is None:
+        return
+    for key, value in attributes.items():
+        if key in ("bytes", "tokens"):
+            record[key] = record.get(key, 0) + (value or 0)
+        else:
+            record[key] = value
+
+
+def _finish_span(record: dict, seconds: float):
+    if not settings.TRACING_ENABLED:
+        return
+    record["duration_ms"] = round(seconds * 1000, 1)
+    STAGE_SECONDS.observe((record["name"], str(record.get("status", "ok"))), seconds)
+    if record.get("bytes"):
+        STAGE_BYTES.inc((record["name"],), record["bytes"])
+    if record.get("tokens"):
+        STAGE_TOKENS.inc((record["name"],), record["tokens"])
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.spans.append(record)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time a stage, yielding its record so callers can add attributes
+
+    Upstream calls made inside report their HTTP status and response size through annotate(),
+    so the status label is the last upstream status, "ok" without one, or "error".
+    """
+    record = {"name": name, **attributes}
+    token = _current_span.set(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except (asyncio.CancelledError, GeneratorExit):
+        # client disconnects and cancelled speculative work
+        record["status"] = "cancelled"
+        raise
+    except BaseException:
+        # keep an upstream error status; anything else is a plain failure
+        if not isinstance(record.get("status"), int) or record["status"] < 400:
+            record["status"] = "error"
+        raise
+    finally:
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # an async generator closed from another task
+            pass
+        _finish_span(record, time.perf_counter() - start)
+
+
+def render_metrics() -> str:
+    """All histograms and counters in the Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -1,14 +1,21 @@
 from fastapi import UploadFile
 import aiofiles
 import os
+import uuid
 from app.config.settings import get_settings
 
 settings = get_settings()
 
-async def store_file_locally(self, file: UploadFile):
+async def store_file_locally(file: UploadFile):
+        """Write an upload to its own file under UPLOAD_DIR, so concurrent uploads never share one"""
         os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-        file_path = os.path.join(settings.UPLOAD_DIR, settings.RAW_DATA_FILE_NAME)
-        async with aiofiles.open(file_path, "wb") as f:
-            while chunk := await file.read(2 * 1024 * 1024):  # Read in 2MB chunks
-                await f.write(chunk)
-        return file_path
\ No newline at end of file
+        file_path = os.path.join(settings.UPLOAD_DIR, f"{uuid.uuid4().hex}_{settings.RAW_DATA_FILE_NAME}")
+        try:
+            async with aiofiles.open(file_path, "wb") as f:
+                while chunk := await file.read(2 * 1024 * 1024):  # Read in 2MB chunks
+                    await f.write(chunk)
+        except BaseException:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+        return file_path
@@ -0,0 +1,174 @@
+import asyncio
+import contextvars
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+
+from app.config.database import get_db
+from app.config.settings import get_settings
+from app.repositories.usage_repository import UsageRepository
+from app.utils.logging_util import logger
+from app.utils.tracing_util import annotate, current_stage
+
+settings = get_settings()
+
+USAGE_COUNTERS = ("input_tokens", "output_tokens", "total_tokens", "read_units", "write_units")
+
+_usage_context = contextvars.ContextVar("usage_context", default=None)
+
+
+def normalize_usage(usage) -> dict:
+    """
+    Map a provider usage block onto the common counters
+
+    OpenAI/Groq report prompt/completion tokens, Anthropic input/output tokens, Voyage and Jina
+    total tokens, Pinecone readUnits/writeUnits and Cohere billed_units. Billed rerank and
+    search units count as read units.
+    """
+    usage = usage or {}
+    billed = usage.get("billed_units") or {}
+    input_tokens = usage.get("prompt_tokens") or usage.get("input_tokens") or billed.get("input_tokens") or 0
+    output_tokens = usage.get("completion_tokens") or usage.get("output_tokens") or billed.get("output_tokens") or 0
+    read_units = (
+        (usage.get("readUnits") or usage.get("read_units") or 0)
+        + (usage.get("rerank_units") or 0)
+        + (billed.get("search_units") or 0)
+    )
+    return {
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": usage.get("total_tokens") or input_tokens + output_tokens,
+        "read_units": read_units,
+        "write_units": usage.get("writeUnits") or usage.get("write_units") or 0,
+    }
+
+
+def start_usage_context(route: str, user: str = None, namespace: str = None) -> dict:
+    """Attribute provider calls made from here on (and in tasks spawned later) to one request"""
+    context = {
+        "request_id": uuid.uuid4().hex,
+        "route": route,
+        "user": user,
+        "namespace": namespace,
+        "totals": {counter: 0 for counter in USAGE_COUNTERS},
+        "calls": 0,
+    }
+    _usage_context.set(context)
+    return context
+
+
+def usage_summary(context: dict) -> dict:
+    """Compact per-request totals for API responses"""
+    return {"request_id": context["request_id"], "calls": context["calls"], **context["totals"]}
+
+
+class UsageRecorder:
+    """
+    Structured usage records of every upstream call, flushed to MongoDB in the background.
+
+    record() only appends to an in-memory buffer, so it is safe on the request path; a flush
+    task writes batches of USAGE_FLUSH_BATCH_SIZE every USAGE_FLUSH_INTERVAL seconds, or sooner
+    when a full batch is waiting. When MongoDB is unreachable the buffer keeps the newest
+    USAGE_BUFFER_SIZE records.
+    """
+
+    def __init__(self, batch_size: int, flush_interval: float, buffer_size: int):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.buffer = deque(maxlen=buffer_size)
+        self.dropped = 0
+        self._wakeup = None
+        self._task = None
+        self._flush_lock = None
+
+    def record(self, provider: str, model: str, operation: str, usage: dict = None, latency: float = None, status="ok"):
+        """
+        Record one upstream call
+
+        Args:
+            provider (str): e.g. "openai", "voyageai", "pinecone"
+            model (str): model name, or the index host for vector store calls
+            operation (str): "chat", "chat_stream", "embed", "rerank", "query", "upsert"
+            usage (dict): the provider's usage block, see normalize_usage
+            latency (float): seconds spent on the call
+        """
+        counts = normalize_usage(usage)
+        annotate(tokens=counts["total_tokens"])
+        if not settings.USAGE_TRACKING_ENABLED:
+            return
+
+        context = _usage_context.get()
+        if context is not None:
+            context["calls"] += 1
+            for counter in USAGE_COUNTERS:
+                context["totals"][counter] += counts[counter]
+
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append({
+            "timestamp": datetime.now(timezone.utc),
+            "request_id": context["request_id"] if context else None,
+            "route": context["route"] if context else None,
+            "user": context["user"] if context else None,
+            "namespace": context["namespace"] if context else None,
+            "stage": current_stage(),
+            "provider": provider,
+            "model": model,
+            "operation": operation,
+            **counts,
+            "latency_ms": round(latency * 1000, 1) if latency is not None else None,
+            "status": status,
+        })
+        if len(self.buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def flush(self):
+        """Write buffered records; on failure they go back to the front of the buffer"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            while self.buffer:
+                batch = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+                try:
+                    repository = UsageRepository(await get_db())
+                    await repository.insert_many(batch)
+                except Exception as e:
+                    logger.error(f"Usage flush of {len(batch)} records failed, retrying later: {str(e)}")
+                    self.buffer.extendleft(reversed(batch))
+                    return
+            if self.dropped:
+                logger.warning(f"Usage buffer overflowed, {self.dropped} records dropped")
+                self.dropped = 0
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def start(self):
+        if not settings.USAGE_TRACKING_ENABLED or self._task is not None:
+            return
+        try:
+            await UsageRepository(await get_db()).ensure_indexes()
+        except Exception as e:
+            logger.error(f"Usage index creation failed: {str(e)}")
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+
+usage_recorder = UsageRecorder(
+    batch_size=settings.USAGE_FLUSH_BATCH_SIZE,
+    flush_interval=settings.USAGE_FLUSH_INTERVAL,
+    buffer_size=settings.USAGE_BUFFER_SIZE,
+)
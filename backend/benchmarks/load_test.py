@@ -0,0 +1,251 @@
+"""
+Offline load test: drive /query, /stream-query and /resync-index against stub providers.
+
+Starts benchmarks.stub_providers and benchmarks.serve_app as subprocesses (or uses already
+running ones with --app-url/--stub-url), sends --requests requests at --concurrency, and reports
+throughput, latency percentiles, time to first streamed byte, errors by status and the event loop
+lag measured inside the server. Provider latency and error rates are passed to the stubs, so
+slow or failing upstreams can be tested without real API calls.
+
+    python -m benchmarks.load_test --scenario query --requests 200 --concurrency 20
+    python -m benchmarks.load_test --scenario stream --latency anthropic=1.5 --error-rate voyage=0.05
+    python -m benchmarks.load_test --scenario resync --concurrency 4 --resync-namespaces 4 --mongodb-url mongodb://127.0.0.1:27017
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.serve_app import BENCH_USER, BENCH_WORKSPACE
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+API_PREFIX = "/api/v1"
+
+QUERY_TEMPLATES = (
+    "How does handler_{i} validate the request before calling the service in module {m}?",
+    "Where is the retry logic for service_{i} configured and how can I change the backoff?",
+    "Why does process() in module_{m}/file_{i}.py raise a KeyError when the payload is empty?",
+    "Explain the data flow from the route to the repository for handler_{i}.",
+)
+
+
+def percentile(values: list, q: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def summarize(values: list) -> dict:
+    if not values:
+        return {}
+    return {
+        "mean_ms": round(sum(values) / len(values) * 1000, 1),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+        "max_ms": round(max(values) * 1000, 1),
+    }
+
+
+def query_body(i: int, args) -> dict:
+    body = {
+        "user_query": QUERY_TEMPLATES[i % len(QUERY_TEMPLATES)].format(i=i, m=i % 8),
+        "current_file_content": "def process(payload):\n    return payload['items']\n" * 10,
+        "current_file_path": f"src/module_{i % 8}/file_{i}.py",
+        "email": BENCH_USER["email"],
+        "workspace_name": BENCH_WORKSPACE,
+        # distinct queries defeat the memo and embedding caches; this bypasses the response cache
+        "use_cache": args.use_cache,
+    }
+    if args.speculative is not None:
+        body["speculative"] = args.speculative
+    return body
+
+
+def resync_upload(chunks: int, revision: int) -> bytes:
+    """A resync payload; each revision changes a tenth of the chunks"""
+    records = []
+    for i in range(chunks):
+        file_index = i // 4
+        changed = f" # revision {revision}" if i % 10 == revision % 10 else ""
+        records.append({
+            "text": f"def handler_{i}(request):{changed}\n    return service_{i}.process(request)\n" * 8,
+            "file_path": f"src/module_{file_index % 8}/file_{file_index}.py",
+            "file_name": f"file_{file_index}.py",
+            "start_line": (i % 4) * 20 + 1,
+            "end_line": (i % 4) * 20 + 20,
+        })
+    return json.dumps(records).encode("utf-8")
+
+
+async def run_query(client: httpx.AsyncClient, i: int, args, result: dict):
+    response = await client.post(f"{API_PREFIX}/query", json=query_body(i, args))
+    result["status"] = response.status_code
+    if response.status_code == 200:
+        data = response.json().get("data") or {}
+        result["cached"] = bool(data.get("cached"))
+
+
+async def run_stream(client: httpx.AsyncClient, i: int, args, result: dict):
+    start = time.perf_counter()
+    async with client.stream("POST", f"{API_PREFIX}/stream-query", json=query_body(i, args)) as response:
+        result["status"] = response.status_code
+        async for line in response.aiter_lines():
+            # progress events come first; time to first token is the first answer text frame
+            if "ttft" not in result and line.startswith("data:") and '"text"' in line:
+                result["ttft"] = time.perf_counter() - start
+            if line.startswith("event: error"):
+                result["status"] = "stream_error"
+
+
+async def run_resync(client: httpx.AsyncClient, i: int, args, result: dict):
+    files = {"file": ("chunks.json", resync_upload(args.resync_chunks, i), "application/json")}
+    data = {
+        "email": BENCH_USER["email"],
+        "filepath": f"{BENCH_WORKSPACE}-{i % args.resync_namespaces}",
+        "is_first_time": "true" if i < args.resync_namespaces else "false",
+    }
+    response = await client.post(f"{API_PREFIX}/resync-index", files=files, data=data)
+    result["status"] = response.status_code
+
+
+SCENARIOS = {"query": run_query, "stream": run_stream, "resync": run_resync}
+
+
+async def drive(args) -> dict:
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    results = []
+    pending = iter(range(args.requests))
+
+    async with httpx.AsyncClient(base_url=args.app_url, timeout=timeout, limits=limits) as client:
+        await client.get("/_bench/loop-lag", params={"reset": True})
+
+        async def worker():
+            for i in pending:
+                result = {}
+                start = time.perf_counter()
+                try:
+                    await SCENARIOS[args.scenario](client, i, args, result)
+                except httpx.HTTPError as e:
+                    result["status"] = type(e).__name__
+                result["latency"] = time.perf_counter() - start
+                results.append(result)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+        loop_lag = (await client.get("/_bench/loop-lag")).json()
+
+    ok = [r for r in results if r["status"] == 200]
+    errors = {}
+    for r in results:
+        if r["status"] != 200:
+            errors[str(r["status"])] = errors.get(str(r["status"]), 0) + 1
+
+    report = {
+        "scenario": args.scenario,
+        "requests": len(results),
+        "concurrency": args.concurrency,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(results) / elapsed, 2) if elapsed else None,
+        "ok": len(ok),
+        "errors": errors,
+        "latency": summarize([r["latency"] for r in ok]),
+        "loop_lag": loop_lag,
+    }
+    if args.scenario == "stream":
+        report["ttft"] = summarize([r["ttft"] for r in ok if "ttft" in r])
+    if args.scenario == "query":
+        report["cached"] = sum(1 for r in ok if r.get("cached"))
+    return report
+
+
+def wait_until_ready(url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode} before becoming ready")
+        try:
+            if httpx.get(url, timeout=1.0).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"{url} was not ready after {timeout:.0f}s")
+
+
+def spawn(module: str, *module_args: str) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, "-m", module, *module_args], cwd=BACKEND_DIR)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the backend against stub providers")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="query")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=120.0, help="per request, seconds")
+    parser.add_argument("--app-url", default=None, help="use a running serve_app instead of starting one")
+    parser.add_argument("--stub-url", default=None, help="use a running stub server instead of starting one")
+    parser.add_argument("--app-port", type=int, default=8100)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--latency", default="", help="stub latency per provider, e.g. anthropic=1.0,voyage=0.05")
+    parser.add_argument("--jitter", default="0.2")
+    parser.add_argument("--error-rate", default="", help="stub error rate per provider, e.g. openai=0.02")
+    parser.add_argument("--token-interval", default="0.01", help="seconds between streamed stub tokens")
+    parser.add_argument("--speculative", type=lambda v: v.lower() == "true", default=None)
+    parser.add_argument("--use-cache", action="store_true", help="let repeated queries hit the response cache")
+    parser.add_argument("--resync-chunks", type=int, default=500)
+    parser.add_argument("--resync-namespaces", type=int, default=1)
+    parser.add_argument("--mongodb-url", default=None, help="required by the resync scenario")
+    parser.add_argument("--json", dest="json_path", default=None, help="also write the report to this file")
+    args = parser.parse_args()
+
+    if args.scenario == "resync" and not args.mongodb_url and not args.app_url:
+        parser.error("the resync scenario keeps chunk manifests in MongoDB, pass --mongodb-url")
+
+    processes = []
+    try:
+        if args.stub_url is None:
+            args.stub_url = f"http://127.0.0.1:{args.stub_port}"
+            stub_args = ["--port", str(args.stub_port), "--jitter", args.jitter, "--token-interval", args.token_interval]
+            if args.latency:
+                stub_args += ["--latency", args.latency]
+            if args.error_rate:
+                stub_args += ["--error-rate", args.error_rate]
+            processes.append(spawn("benchmarks.stub_providers", *stub_args))
+            wait_until_ready(f"{args.stub_url}/health", processes[-1])
+
+        if args.app_url is None:
+            args.app_url = f"http://127.0.0.1:{args.app_port}"
+            app_args = ["--port", str(args.app_port), "--stub-url", args.stub_url]
+            if args.mongodb_url:
+                app_args += ["--mongodb-url", args.mongodb_url]
+            processes.append(spawn("benchmarks.serve_app", *app_args))
+            wait_until_ready(f"{args.app_url}/", processes[-1])
+
+        report = asyncio.run(drive(args))
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    print(json.dumps(report, indent=2))
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
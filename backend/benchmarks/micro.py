@@ -0,0 +1,389 @@
+"""
+Microbenchmarks for the CPU-bound hot paths, on synthetic repositories of 1k, 10k and 100k files.
+
+Each benchmark is timed over several runs (median and min wall time) and then run once more
+under tracemalloc for its peak allocation. Results are compared with the stored baselines in
+benchmarks/baselines/micro.json and a run fails when a benchmark gets slower or allocates more
+than --tolerance allows. Baselines are per machine: record them with --save-baseline on the
+machine that runs the comparison. A compare run also fails when a measured benchmark has no
+baseline, so a missing or stale baselines file cannot pass silently.
+
+    python -m benchmarks.micro                              # compare against the baselines
+    python -m benchmarks.micro --sizes 1000 --filter bm25   # a subset
+    python -m benchmarks.micro --save-baseline              # record new baselines
+
+Benchmarks whose dependencies are not installed (code_splitter for the chunker, pinecone_text
+for BM25) are reported as skipped.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCHMARKS_DIR)
+CHUNKER_DIR = os.path.join(os.path.dirname(BACKEND_DIR), "frontend", "src")
+BASELINE_PATH = os.path.join(BENCHMARKS_DIR, "baselines", "micro.json")
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+FILE_TEMPLATE = '''"""Module {i} of the synthetic repository"""
+import os
+
+
+class Service{i}:
+    def __init__(self, client):
+        self.client = client
+
+    def process(self, request):
+        payload = request.get("payload") or {{}}
+        items = [item for item in payload.get("items", []) if item]
+        return {{"count": len(items), "path": os.path.join("data", "{i}")}}
+
+
+def handler_{i}(request):
+    service = Service{i}(request.get("client"))
+    return service.process(request)
+'''
+
+
+def synthetic_paths(size: int) -> list:
+    """Relative file paths spread over nested packages, deterministic for a size"""
+    paths = []
+    for i in range(size):
+        depth = i % 4
+        parts = [f"pkg_{i % 40}"] + [f"sub_{(i // (40 * 8 ** d)) % 8}" for d in range(depth)]
+        paths.append("/".join(parts + [f"module_{i}.py"]))
+    return paths
+
+
+def synthetic_chunks(size: int) -> list:
+    """One chunk per file, shaped like the chunker's output"""
+    return [
+        {
+            "_id": f"{i:040x}",
+            "file_path": path,
+            "file_name": path.rsplit("/", 1)[-1],
+            "start_line": 1,
+            "end_line": 16,
+            "text": FILE_TEMPLATE.format(i=i),
+        }
+        for i, path in enumerate(synthetic_paths(size))
+    ]
+
+
+def write_repository(root: str, size: int) -> str:
+    """Write the synthetic repository to disk once per size and reuse it afterwards"""
+    repository = os.path.join(root, f"repo_{size}")
+    if not os.path.isdir(repository):
+        for i, path in enumerate(synthetic_paths(size)):
+            file_path = os.path.join(repository, path)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, "w") as f:
+                f.write(FILE_TEMPLATE.format(i=i))
+    return repository
+
+
+def provider_responses(size: int) -> dict:
+    """A Pinecone query response with size/10 matches and a Voyage embedding response with size/100 vectors"""
+    rng = random.Random(size)
+    chunks = synthetic_chunks(max(1, size // 10))
+    query = {
+        "matches": [
+            {"id": chunk["_id"], "score": rng.random(), "metadata": {k: v for k, v in chunk.items() if k != "_id"}}
+            for chunk in chunks
+        ],
+        "namespace": "bench",
+        "usage": {"readUnits": 10},
+    }
+    embeddings = {
+        "data": [
+            {"object": "embedding", "index": i, "embedding": [rng.uniform(-1, 1) for _ in range(1024)]}
+            for i in range(max(1, size // 100))
+        ],
+        "usage": {"total_tokens": size},
+    }
+    return {"query": query, "embeddings": embeddings}
+
+
+def prepare_environment(workdir: str):
+    """Settings for importing the backend offline, with relative paths under workdir"""
+    from benchmarks.serve_app import stub_environment, write_bm25_encoder
+
+    for key, value in stub_environment("http://127.0.0.1:9").items():
+        os.environ.setdefault(key, value)
+    os.environ.setdefault("USAGE_TRACKING_ENABLED", "false")
+    os.environ.setdefault("TRACING_ENABLED", "false")
+    os.chdir(workdir)
+    if "BM25_ENCODER_DIR" not in os.environ:
+        write_bm25_encoder("bm25_encoder")
+    sys.path[:0] = [BACKEND_DIR, CHUNKER_DIR]
+
+
+# Each setup takes (size, context) and returns the callable to measure; context holds the
+# event loop and scratch directory. Imports stay inside setups so a missing optional
+# dependency only skips the benchmarks that need it.
+
+def setup_chunker_walk(size, context):
+    from code_chunker import walk
+
+    repository = write_repository(context["workdir"], size)
+    return lambda: sum(1 for _ in walk(repository, 512))
+
+
+def setup_folder_tree_build(size, context):
+    from app.utils.folder_structure_util import build_tree_from_paths
+
+    paths = sorted(synthetic_paths(size))
+    return lambda: build_tree_from_paths(paths)
+
+
+def setup_folder_tree_render(size, context):
+    from app.utils.folder_structure_util import folder_struct_from_paths
+
+    paths = synthetic_paths(size)
+    return lambda: folder_struct_from_paths(paths)
+
+
+def setup_upsert_format(size, context):
+    from app.services.pinecone_service import PineconeService
+
+    service = PineconeService()
+    chunks = synthetic_chunks(size)
+    rng = random.Random(size)
+    dense = [[rng.uniform(-1, 1) for _ in range(64)]] * size
+    sparse = [{"indices": list(range(i % 50, i % 50 + 40)), "values": [0.5] * 40} for i in range(size)]
+    loop = context["loop"]
+    return lambda: loop.run_until_complete(service.upsert_format(chunks, dense, sparse))
+
+
+def setup_hybrid_scale(size, context):
+    from app.services.pinecone_service import PineconeService
+
+    service = PineconeService()
+    rng = random.Random(size)
+    dense = [rng.uniform(-1, 1) for _ in range(1024)]
+    sparse = {"indices": list(range(200)), "values": [rng.random() for _ in range(200)]}
+    # one hybrid_scale per file, as if every file were queried once
+    return lambda: [service.hybrid_scale(dense, sparse, 0.7) for _ in range(size)]
+
+
+def setup_bm25_encode_documents(size, context):
+    from app.utils.bm25_util import _encode_documents_chunk, get_bm25_encoder
+
+    get_bm25_encoder()
+    texts = [chunk["text"] for chunk in synthetic_chunks(size)]
+    # in-process, so the numbers are tokenization and hashing without executor transfer
+    return lambda: _encode_documents_chunk(texts)
+
+
+def setup_rag_prompt_assembly(size, context):
+    from app.prompts.query.response_prompts import RAG_USER_PROMPT_TEMPLATE
+    from app.utils.context_assembly_util import assemble_rag_context
+    from app.utils.folder_structure_util import folder_struct_from_paths
+
+    # a repository of `size` files contributes its folder tree; retrieval returns a fixed 60 chunks
+    folder_structure = folder_struct_from_paths(synthetic_paths(size))
+    docs = []
+    for i, chunk in enumerate(synthetic_chunks(60)):
+        docs.append({
+            "text": chunk["text"],
+            "metadata": {k: v for k, v in chunk.items() if k != "text"},
+            "relevance_score": 1 - i / 60,
+            "source": "rerank" if i < 20 else "expansion",
+        })
+    loop = context["loop"]
+
+    def assemble():
+        context_parts = loop.run_until_complete(assemble_rag_context("bench", docs, folder_structure, 20))
+        return RAG_USER_PROMPT_TEMPLATE.format(
+            query="How does handler_1 process the request?",
+            query_context_text="",
+            error_text="",
+            retrieved_context_text=context_parts["retrieved_context_text"],
+            metadata_context_text=context_parts["metadata_context_text"],
+            folder_structure=context_parts["folder_structure"],
+        )
+
+    return assemble
+
+
+def setup_json_encode(size, context):
+    from app.utils import json_util
+
+    responses = provider_responses(size)
+    return lambda: [json_util.dumps(response) for response in responses.values()]
+
+
+def setup_json_decode(size, context):
+    from app.utils import json_util
+
+    encoded = [json_util.dumps(response) for response in provider_responses(size).values()]
+    return lambda: [json_util.loads(text) for text in encoded]
+
+
+BENCHMARKS = {
+    "chunker_walk": setup_chunker_walk,
+    "folder_tree_build": setup_folder_tree_build,
+    "folder_tree_render": setup_folder_tree_render,
+    "upsert_format": setup_upsert_format,
+    "hybrid_scale": setup_hybrid_scale,
+    "bm25_encode_documents": setup_bm25_encode_documents,
+    "rag_prompt_assembly": setup_rag_prompt_assembly,
+    "json_encode": setup_json_encode,
+    "json_decode": setup_json_decode,
+}
+
+
+def measure(func, repeat: int, max_time: float) -> dict:
+    """Median and min of up to `repeat` timed runs, then one run under tracemalloc for the peak"""
+    timings = []
+    budget_end = time.perf_counter() + max_time
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+        if time.perf_counter() > budget_end:
+            break
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "runs": len(timings),
+        "median_ms": round(statistics.median(timings) * 1000, 3),
+        "min_ms": round(min(timings) * 1000, 3),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def compare(results: dict, baselines: dict, tolerance: float):
+    """
+    Names of benchmarks whose median time or peak memory exceed baseline * (1 + tolerance),
+    and names of measured benchmarks without a baseline
+    """
+    regressions = []
+    missing = []
+    for key, result in results.items():
+        if "median_ms" not in result:
+            continue
+        baseline = baselines.get(key)
+        if not baseline:
+            missing.append(key)
+            continue
+        result["time_ratio"] = round(result["median_ms"] / baseline["median_ms"], 3) if baseline["median_ms"] else None
+        result["memory_ratio"] = round(result["peak_kib"] / baseline["peak_kib"], 3) if baseline["peak_kib"] else None
+        if any(ratio is not None and ratio > 1 + tolerance for ratio in (result["time_ratio"], result["memory_ratio"])):
+            regressions.append(key)
+    return regressions, missing
+
+
+def load_baselines(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        stored = json.load(f)
+    if stored.get("python") != platform.python_version():
+        print(f"Baselines were recorded on Python {stored.get('python')}, this is {platform.python_version()}")
+    return stored.get("results", {})
+
+
+def save_baselines(path: str, results: dict):
+    """Merge into the stored baselines, so a filtered run only replaces what it measured"""
+    stored = {}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            stored = json.load(f).get("results", {})
+    for key, result in results.items():
+        if "median_ms" in result:
+            stored[key] = {field: result[field] for field in ("median_ms", "min_ms", "peak_kib")}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(
+            {"python": platform.python_version(), "machine": platform.machine(), "results": dict(sorted(stored.items()))},
+            f,
+            indent=2,
+        )
+
+
+def print_report(results: dict):
+    print(f"{'benchmark':<36}{'runs':>5}{'median ms':>12}{'min ms':>12}{'peak KiB':>12}{'time x':>9}{'mem x':>9}")
+    for key, result in results.items():
+        if "skipped" in result:
+            print(f"{key:<36}  skipped: {result['skipped']}")
+            continue
+        print(
+            f"{key:<36}{result['runs']:>5}{result['median_ms']:>12.3f}{result['min_ms']:>12.3f}{result['peak_kib']:>12.1f}"
+            f"{result.get('time_ratio') or '':>9}{result.get('memory_ratio') or '':>9}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for CPU-bound hot paths")
+    parser.add_argument("--sizes", default=",".join(str(size) for size in DEFAULT_SIZES),
+                        help="synthetic repository sizes in files, comma separated")
+    parser.add_argument("--filter", default="", help="only benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-time", type=float, default=10.0, help="stop repeating a benchmark after this many seconds")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown or memory growth, 0.25 is 25%%")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--json", dest="json_path", default=None, help="also write the results to this file")
+    parser.add_argument("--workdir", default=None, help="scratch directory for synthetic repositories")
+    args = parser.parse_args()
+
+    baseline_path = os.path.abspath(args.baseline)
+    json_path = os.path.abspath(args.json_path) if args.json_path else None
+    workdir = args.workdir or tempfile.mkdtemp(prefix="codementor-micro-")
+    os.makedirs(workdir, exist_ok=True)
+    prepare_environment(workdir)
+
+    context = {"workdir": workdir, "loop": asyncio.new_event_loop()}
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    results = {}
+    for name, setup in BENCHMARKS.items():
+        if args.filter not in name:
+            continue
+        for size in sizes:
+            key = f"{name}[{size}]"
+            try:
+                func = setup(size, context)
+            except ImportError as e:
+                results[key] = {"skipped": f"missing dependency {e.name}"}
+                break
+            results[key] = measure(func, args.repeat, args.max_time)
+            print(f"{key}: {results[key]['median_ms']} ms, peak {results[key]['peak_kib']} KiB", file=sys.stderr)
+    context["loop"].close()
+
+    regressions, missing = compare(results, load_baselines(baseline_path), args.tolerance)
+    print_report(results)
+
+    if json_path:
+        with open(json_path, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        save_baselines(baseline_path, results)
+        print(f"Baselines saved to {baseline_path}")
+    else:
+        if missing:
+            print(f"No baseline in {baseline_path} for: {', '.join(missing)}; record one with --save-baseline")
+        if regressions:
+            print(f"Regressions beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        if missing or regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Run the backend against the stub providers, isolated in a scratch working directory.
+
+Every upstream base URL points at benchmarks.stub_providers, authentication is replaced by a
+fixed test user, a small synthetic BM25 encoder is written so sparse encoding works without the
+production pickle, and the cache, log, upload and folder structure directories all live under
+--workdir. An extra /_bench/loop-lag route reports event loop lag measured inside the server.
+The BM25 tokenizer still needs its NLTK data installed locally.
+
+    python -m benchmarks.serve_app --port 8100 --stub-url http://127.0.0.1:9100
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from contextlib import asynccontextmanager
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BENCH_USER = {"email": "bench@codementor.dev", "role": "user"}
+BENCH_WORKSPACE = "bench-workspace"
+
+
+def stub_environment(stub_url: str) -> dict:
+    """Settings that route every provider to the stub server; real keys are never needed"""
+    environment = {
+        "MONGODB_URL": "mongodb://127.0.0.1:27017",
+        "DB_NAME": "codementor_bench",
+        "JWT_SECRET_KEY": "bench-secret",
+        "PINECONE_API_VERSION": "2025-01",
+        "PINECONE_CREATE_INDEX_URL": f"{stub_url}/pinecone/indexes",
+        "PINECONE_LIST_INDEXES_URL": f"{stub_url}/pinecone/indexes",
+        "PINECONE_EMBED_URL": f"{stub_url}/pinecone/embed",
+        "PINECONE_RERANK_URL": f"{stub_url}/pinecone/rerank",
+        "PINECONE_QUERY_URL": f"{stub_url}/pinecone/{{}}/query",
+        "PINECONE_UPSERT_URL": f"{stub_url}/pinecone/{{}}/vectors/upsert",
+        "PINECONE_DELETE_URL": f"{stub_url}/pinecone/{{}}/vectors/delete",
+        "PINECONE_DESCRIBE_INDEX_STATS_URL": f"{stub_url}/pinecone/{{}}/describe_index_stats",
+        "OPENAI_BASE_URL": f"{stub_url}/openai/v1",
+        "GROQ_BASE_URL": f"{stub_url}/groq/openai/v1",
+        "ANTHROPIC_BASE_URL": f"{stub_url}/anthropic/v1",
+        "VOYAGEAI_BASE_URL": f"{stub_url}/voyage/v1",
+        "COHERE_BASE_URL": f"{stub_url}/cohere/v1",
+        "JINA_BASE_URL": f"{stub_url}/jina/v1",
+        "TOGETHERAI_BASE_URL": f"{stub_url}/togetherai/v1",
+        # the stub speaks HTTP/1.1 only
+        "HTTP2_ENABLED": "false",
+        "RESYNC_READINESS_POLL_INTERVAL": "0.1",
+    }
+    for key in ("PINECONE", "GROQ", "LLAMA_CLOUD", "COHERE", "ZILLIS", "JINA", "UNSTRUCTURED",
+                "GEMINI", "OPENAI", "TOGETHERAI", "VOYAGEAI", "ANTHROPIC"):
+        environment[f"{key}_API_KEY"] = "bench-key"
+    return environment
+
+
+def write_bm25_encoder(output_dir: str, vocabulary_size: int = 50000):
+    """Encoder files in the layout bm25_util.convert_bm25_pickle produces, with random statistics"""
+    rng = np.random.default_rng(0)
+    keys = np.unique(rng.integers(0, 2**32 - 1, size=vocabulary_size, dtype=np.uint32))
+    values = rng.integers(1, 5000, size=len(keys)).astype(np.float32)
+    os.makedirs(output_dir, exist_ok=True)
+    np.save(os.path.join(output_dir, "doc_freq_keys.npy"), keys)
+    np.save(os.path.join(output_dir, "doc_freq_values.npy"), values)
+    with open(os.path.join(output_dir, "params.json"), "w") as f:
+        json.dump({
+            "b": 0.75, "k1": 1.2, "n_docs": 20000, "avgdl": 180.0,
+            # pinecone_text's BM25Encoder defaults
+            "lower_case": True, "remove_punctuation": True, "remove_stopwords": True,
+            "stem": True, "language": "english",
+        }, f)
+
+
+def write_folder_structure(files: int = 400):
+    """The per-workspace tree the query path reads from folder_structs/"""
+    os.makedirs("folder_structs", exist_ok=True)
+    lines = [f"{BENCH_WORKSPACE}/"]
+    for i in range(files):
+        lines.append(f"    src/module_{i % 8}/file_{i}.py")
+    with open(f"folder_structs/{BENCH_USER['email']}_{BENCH_WORKSPACE}.txt", "w") as f:
+        f.write("\n".join(lines))
+
+
+class LoopLagMonitor:
+    """Oversleep of a periodic timer on the server loop, i.e. how long callbacks waited to run"""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = []
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def snapshot(self, reset: bool = False) -> dict:
+        samples = sorted(self.samples)
+        if reset:
+            self.samples = []
+        if not samples:
+            return {"samples": 0}
+        return {
+            "samples": len(samples),
+            "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+            "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000, 3),
+            "max_ms": round(samples[-1] * 1000, 3),
+        }
+
+
+def build_app():
+    """Import the backend with the stub settings already in the environment"""
+    sys.path.insert(0, BACKEND_DIR)
+    from main import app
+    from app.utils.security_util import get_current_user
+
+    async def bench_user():
+        return BENCH_USER
+
+    app.dependency_overrides[get_current_user] = bench_user
+
+    monitor = LoopLagMonitor()
+    app_lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(app):
+        async with app_lifespan(app):
+            task = asyncio.create_task(monitor.run())
+            yield
+            task.cancel()
+
+    app.router.lifespan_context = lifespan
+
+    @app.get("/_bench/loop-lag")
+    async def loop_lag(reset: bool = False):
+        return {"time": time.time(), **monitor.snapshot(reset)}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the backend wired to the stub providers")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--stub-url", default="http://127.0.0.1:9100")
+    parser.add_argument("--workdir", default=None, help="scratch directory, a new temp dir by default")
+    parser.add_argument("--mongodb-url", default=None,
+                        help="MongoDB for resync manifests and usage records; without it usage tracking is off")
+    args = parser.parse_args()
+
+    # Explicit environment variables win, so single settings can be overridden per run
+    for key, value in stub_environment(args.stub_url.rstrip("/")).items():
+        os.environ.setdefault(key, value)
+    if args.mongodb_url:
+        os.environ["MONGODB_URL"] = args.mongodb_url
+    else:
+        os.environ.setdefault("USAGE_TRACKING_ENABLED", "false")
+
+    # Settings read .env and every relative path from the working directory
+    workdir = args.workdir or tempfile.mkdtemp(prefix="codementor-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    if "BM25_ENCODER_DIR" not in os.environ:
+        write_bm25_encoder("bm25_encoder")
+    write_folder_structure()
+
+    import uvicorn
+
+    uvicorn.run(build_app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
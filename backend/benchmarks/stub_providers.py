@@ -0,0 +1,342 @@
+"""
+Local stand-ins for every upstream the backend calls, for offline load tests.
+
+One FastAPI app serves OpenAI and Groq chat completions (plain and SSE streaming), Anthropic
+messages (plain and SSE streaming), Voyage embeddings and rerank, and the Pinecone control and
+data plane REST endpoints, each under its own path prefix:
+
+    /openai/v1/chat/completions        /groq/openai/v1/chat/completions
+    /anthropic/v1/messages             /voyage/v1/embeddings   /voyage/v1/rerank
+    /pinecone/indexes                  /pinecone/{host}/query  /pinecone/{host}/vectors/upsert
+    /pinecone/{host}/vectors/delete    /pinecone/{host}/describe_index_stats
+
+Every provider gets a fixed latency plus uniform jitter and an error rate (HTTP 500 or 429),
+so slow or flaky upstreams can be reproduced. Responses are shaped like the real APIs closely
+enough for the backend's parsers, including usage blocks.
+
+    python -m benchmarks.stub_providers --port 9100 --latency anthropic=0.8,voyage=0.05 --error-rate openai=0.02
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+PROVIDERS = ("openai", "groq", "anthropic", "voyage", "pinecone")
+
+DEFAULT_LATENCY = {"openai": 0.3, "groq": 0.15, "anthropic": 0.6, "voyage": 0.05, "pinecone": 0.03}
+
+ANSWER_TEXT = (
+    "The request handler validates the payload, resolves the namespace from the user's email and "
+    "workspace, retrieves the most relevant chunks and passes them to the model together with the "
+    "folder structure. To change this behaviour, update the use case and keep the controller thin. "
+)
+
+
+class StubConfig:
+    def __init__(self, latency=None, jitter=0.2, error_rate=None, stream_tokens=120, token_interval=0.01,
+                 dimension=1024, matches=40):
+        self.latency = {**DEFAULT_LATENCY, **(latency or {})}
+        self.jitter = jitter
+        self.error_rate = {provider: 0.0 for provider in PROVIDERS}
+        self.error_rate.update(error_rate or {})
+        self.stream_tokens = stream_tokens
+        self.token_interval = token_interval
+        self.dimension = dimension
+        self.matches = matches
+
+
+def _parse_per_provider(value: str) -> dict:
+    """"openai=0.2,anthropic=0.5" -> {"openai": 0.2, "anthropic": 0.5}; a bare number applies to all"""
+    if not value:
+        return {}
+    try:
+        return {provider: float(value) for provider in PROVIDERS}
+    except ValueError:
+        pass
+    parsed = {}
+    for item in value.split(","):
+        provider, _, number = item.partition("=")
+        if provider.strip() not in PROVIDERS:
+            raise argparse.ArgumentTypeError(f"Unknown provider {provider!r}, expected one of {PROVIDERS}")
+        parsed[provider.strip()] = float(number)
+    return parsed
+
+
+def _tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _vector(text: str, dimension: int) -> list:
+    """Deterministic unit vector per text, so repeated texts embed identically"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimension).astype(np.float32)
+    vector /= np.linalg.norm(vector)
+    return vector.round(6).tolist()
+
+
+def _chat_content(provider: str, system_prompt: str, user_prompt: str) -> str:
+    """Groq only serves the compliance check; OpenAI answers satisfy every query analysis stage"""
+    if provider == "groq":
+        return "True the query is about the user's codebase"
+    query = user_prompt[-200:].strip()
+    stage = {"user_query": query, "context": "", "error": ""}
+    decision = {"use_rag": True, "top_k": 20, "top_n": 10, "reasoning": "stubbed decision"}
+    intent = {"category": "Code understanding", "specificity": 3, "mentions": []}
+    if "single pass" in system_prompt:
+        return json.dumps({
+            "preprocess": stage,
+            "intent_analysis": intent,
+            "reformulated_query": {**stage, "reformulated_query": f"code handling {query}"},
+            **decision,
+        })
+    return json.dumps({**stage, **intent, **decision, "reformulated_query": f"code handling {query}"})
+
+
+def _sse(data: dict, event: str = None) -> bytes:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n".encode("utf-8")
+
+
+def _split(text: str, parts: int) -> list:
+    size = max(1, len(text) // max(1, parts))
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def create_stub_app(config: StubConfig) -> FastAPI:
+    app = FastAPI(title="Upstream provider stubs")
+    namespaces = {}
+
+    async def delay_or_fail(provider: str):
+        """Injected latency, then an injected failure response or None"""
+        latency = config.latency[provider] * (1 + random.uniform(-config.jitter, config.jitter))
+        await asyncio.sleep(max(0.0, latency))
+        if random.random() < config.error_rate[provider]:
+            status_code = random.choice((429, 500))
+            return JSONResponse({"error": {"message": f"injected {provider} failure"}}, status_code=status_code)
+        return None
+
+    def openai_completion(provider: str, body: dict):
+        messages = body.get("messages", [])
+        system_prompt = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        user_prompt = next((m["content"] for m in messages if m.get("role") == "user"), "")
+        content = _chat_content(provider, system_prompt, user_prompt)
+        usage = {
+            "prompt_tokens": _tokens(system_prompt + user_prompt),
+            "completion_tokens": _tokens(content),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        return content, usage
+
+    async def openai_stream(content: str, usage: dict):
+        for part in _split(content, 12):
+            yield _sse({"choices": [{"index": 0, "delta": {"content": part}}]})
+            await asyncio.sleep(config.token_interval)
+        yield _sse({"choices": [], "usage": usage})
+        yield b"data: [DONE]\n\n"
+
+    async def chat_completions(provider: str, request: Request):
+        failure = await delay_or_fail(provider)
+        if failure is not None:
+            return failure
+        body = await request.json()
+        content, usage = openai_completion(provider, body)
+        if body.get("stream"):
+            return StreamingResponse(openai_stream(content, usage), media_type="text/event-stream")
+        return {
+            "id": "chatcmpl-stub",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": usage,
+        }
+
+    @app.post("/openai/v1/chat/completions")
+    async def openai_chat(request: Request):
+        return await chat_completions("openai", request)
+
+    @app.post("/groq/openai/v1/chat/completions")
+    async def groq_chat(request: Request):
+        return await chat_completions("groq", request)
+
+    async def anthropic_stream(input_tokens: int):
+        yield _sse({"type": "message_start", "message": {"usage": {"input_tokens": input_tokens, "output_tokens": 1}}}, "message_start")
+        yield _sse({"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}, "content_block_start")
+        yield _sse({"type": "ping"}, "ping")
+        words = (ANSWER_TEXT * 4).split(" ")
+        for i in range(config.stream_tokens):
+            text = words[i % len(words)] + " "
+            yield _sse({"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": text}}, "content_block_delta")
+            await asyncio.sleep(config.token_interval)
+        yield _sse({"type": "content_block_stop", "index": 0}, "content_block_stop")
+        yield _sse({"type": "message_delta", "delta": {"stop_reason": "end_turn"}, "usage": {"output_tokens": config.stream_tokens}}, "message_delta")
+        yield _sse({"type": "message_stop"}, "message_stop")
+
+    @app.post("/anthropic/v1/messages")
+    async def anthropic_messages(request: Request):
+        failure = await delay_or_fail("anthropic")
+        if failure is not None:
+            return failure
+        body = await request.json()
+        prompt = "".join(m.get("content", "") for m in body.get("messages", []) if isinstance(m.get("content"), str))
+        input_tokens = _tokens(prompt + body.get("system", ""))
+        if body.get("stream"):
+            return StreamingResponse(anthropic_stream(input_tokens), media_type="text/event-stream")
+        return {
+            "id": "msg_stub",
+            "type": "message",
+            "role": "assistant",
+            "content": [{"type": "text", "text": ANSWER_TEXT * 3}],
+            "usage": {"input_tokens": input_tokens, "output_tokens": _tokens(ANSWER_TEXT * 3)},
+        }
+
+    @app.post("/voyage/v1/embeddings")
+    async def voyage_embeddings(request: Request):
+        failure = await delay_or_fail("voyage")
+        if failure is not None:
+            return failure
+        body = await request.json()
+        inputs = body.get("input", [])
+        dimension = body.get("output_dimension") or config.dimension
+        return {
+            "object": "list",
+            "data": [{"object": "embedding", "index": i, "embedding": _vector(text, dimension)} for i, text in enumerate(inputs)],
+            "model": body.get("model"),
+            "usage": {"total_tokens": sum(_tokens(text) for text in inputs)},
+        }
+
+    @app.post("/voyage/v1/rerank")
+    async def voyage_rerank(request: Request):
+        failure = await delay_or_fail("voyage")
+        if failure is not None:
+            return failure
+        body = await request.json()
+        documents = body.get("documents", [])
+        query = body.get("query", "")
+        scored = sorted(
+            ({"index": i, "relevance_score": round(1 / (1 + i) + random.random() * 0.01, 6)} for i in range(len(documents))),
+            key=lambda item: item["relevance_score"],
+            reverse=True,
+        )
+        if body.get("top_k"):
+            scored = scored[: body["top_k"]]
+        return {
+            "object": "list",
+            "data": scored,
+            "model": body.get("model"),
+            "usage": {"total_tokens": _tokens(query) * len(documents) + sum(_tokens(doc) for doc in documents)},
+        }
+
+    @app.get("/pinecone/indexes")
+    async def pinecone_list_indexes():
+        failure = await delay_or_fail("pinecone")
+        if failure is not None:
+            return failure
+        return {"indexes": [{"name": "dotproduct-1024", "host": "stub-index", "dimension": 1024, "metric": "dotproduct"}]}
+
+    def synthetic_matches(top_k: int):
+        matches = []
+        for i in range(min(top_k, config.matches)):
+            file_path = f"src/module_{i % 8}/file_{i}.py"
+            matches.append({
+                "id": f"stub-{i}",
+                "score": round(1 - i * 0.01, 4),
+                "metadata": {
+                    "text": f"def handler_{i}(request):\n    return service_{i}.process(request)\n" * 6,
+                    "file_path": file_path,
+                    "file_name": file_path.rsplit("/", 1)[-1],
+                    "start_line": 1,
+                    "end_line": 12,
+                },
+            })
+        return matches
+
+    @app.post("/pinecone/{host}/query")
+    async def pinecone_query(host: str, request: Request):
+        failure = await delay_or_fail("pinecone")
+        if failure is not None:
+            return failure
+        body = await request.json()
+        top_k = body.get("topK", 10)
+        stored = namespaces.get(body.get("namespace"), {})
+        if stored:
+            records = list(stored.values())[:top_k]
+            matches = [
+                {"id": record["id"], "score": round(1 - i * 0.01, 4), "metadata": record.get("metadata", {})}
+                for i, record in enumerate(records)
+            ]
+        else:
+            matches = synthetic_matches(top_k)
+        return {"matches": matches, "namespace": body.get("namespace", ""), "usage": {"readUnits": 5 + top_k // 10}}
+
+    @app.post("/pinecone/{host}/vectors/upsert")
+    async def pinecone_upsert(host: str, request: Request):
+        failure = await delay_or_fail("pinecone")
+        if failure is not None:
+            return failure
+        body = await request.json()
+        stored = namespaces.setdefault(body.get("namespace", ""), {})
+        for vector in body.get("vectors", []):
+            # only metadata is kept; the stub never scores by vector
+            stored[vector["id"]] = {"id": vector["id"], "metadata": vector.get("metadata", {})}
+        return {"upsertedCount": len(body.get("vectors", []))}
+
+    @app.post("/pinecone/{host}/vectors/delete")
+    async def pinecone_delete(host: str, request: Request):
+        failure = await delay_or_fail("pinecone")
+        if failure is not None:
+            return failure
+        body = await request.json()
+        stored = namespaces.get(body.get("namespace", ""), {})
+        for vector_id in body.get("ids", []):
+            stored.pop(vector_id, None)
+        return {}
+
+    @app.post("/pinecone/{host}/describe_index_stats")
+    async def pinecone_describe_index_stats(host: str):
+        failure = await delay_or_fail("pinecone")
+        if failure is not None:
+            return failure
+        return {
+            "dimension": config.dimension,
+            "namespaces": {name: {"vectorCount": len(stored)} for name, stored in namespaces.items()},
+            "totalVectorCount": sum(len(stored) for stored in namespaces.values()),
+        }
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok", "time": time.time()}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve stub upstream providers for offline load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=_parse_per_provider, default={},
+                        help="seconds per provider, e.g. openai=0.3,anthropic=0.6 or one number for all")
+    parser.add_argument("--jitter", type=float, default=0.2, help="relative uniform jitter on latency")
+    parser.add_argument("--error-rate", type=_parse_per_provider, default={},
+                        help="fraction of failed calls per provider, e.g. voyage=0.05")
+    parser.add_argument("--stream-tokens", type=int, default=120, help="text deltas per Anthropic stream")
+    parser.add_argument("--token-interval", type=float, default=0.01, help="seconds between streamed deltas")
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        stream_tokens=args.stream_tokens,
+        token_interval=args.token_interval,
+    )
+    uvicorn.run(create_stub_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,40 @@ from contextlib import asynccontextmanager
 
 from app.config.settings import get_settings
 from app.config.database import connect_to_mongodb, close_mongodb_connection
-from app.apis import auth_route, resync_route, query_route, llm_rewrite
+from app.config.http_client import open_http_clients, close_http_clients
+from app.utils.bm25_util import shutdown_sparse_executor, warm_up_sparse_encoder
+from app.services.local_vector_store_service import close_local_vector_store
+from app.utils.context_assembly_util import warm_up_token_encoding
+from app.utils.logging_util import stop_log_listener
+from app.utils.usage_recorder_util import usage_recorder
+from app.apis import auth_route, resync_route, query_route, llm_rewrite, metrics_route, usage_route
 
 settings = get_settings()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup: Connect to MongoDB and open the shared upstream HTTP pools
+    await connect_to_mongodb()
+    await open_http_clients()
+    await usage_recorder.start()
+    await warm_up_token_encoding()
+    if settings.BM25_EAGER_LOAD:
+        await warm_up_sparse_encoder()
+    yield
+    # Shutdown: Close MongoDB connection, drain the HTTP pools, stop the BM25 workers
+    # and flush pending local vector store writes, usage records and queued log records
+    await close_http_clients()
+    shutdown_sparse_executor()
+    if settings.VECTOR_STORE_BACKEND == "local":
+        await close_local_vector_store()
+    await usage_recorder.stop()
+    await close_mongodb_connection()
+    stop_log_listener()
+
 app = FastAPI(
     title=settings.APP_NAME,
-    debug=settings.DEBUG
+    debug=settings.DEBUG,
+    lifespan=lifespan
 )
 
 # CORS setup
@@ -23,19 +50,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Startup: Connect to MongoDB
-    await connect_to_mongodb()
-    yield
-    # Shutdown: Close MongoDB connection
-    await close_mongodb_connection()
-
 # Include routers
 app.include_router(auth_route.router, prefix=settings.API_PREFIX)
 app.include_router(resync_route.router, prefix=settings.API_PREFIX)
 app.include_router(query_route.router, prefix=settings.API_PREFIX)
 app.include_router(llm_rewrite.router, prefix=settings.API_PREFIX)
+app.include_router(usage_route.router, prefix=settings.API_PREFIX)
+# Scraped at the conventional path, outside the API prefix; bearer token required (METRICS_TOKEN)
+app.include_router(metrics_route.router)
 
 @app.get("/")
 async def root():
@@ -0,0 +1,9 @@
+import os
+import tempfile
+
+from benchmarks.serve_app import stub_environment
+
+# Settings are read at import time: fill the required ones and keep logs out of the checkout
+for key, value in stub_environment("http://127.0.0.1:9100").items():
+    os.environ.setdefault(key, value)
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="codementor-tests-"))
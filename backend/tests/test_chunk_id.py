@@ -0,0 +1,30 @@
+from app.utils.chunk_id_util import assign_chunk_id, make_chunk_id
+
+
+def chunk(**overrides):
+    base = {"_id": "client-id", "text": "def f():\n    return 1\n", "file_path": "src/a.py", "start_line": 1, "end_line": 2}
+    return {**base, **overrides}
+
+
+def test_id_is_stable_and_ignores_the_client_id():
+    first = assign_chunk_id(chunk())
+    second = assign_chunk_id(chunk(_id="another-client-id"))
+    assert first["_id"] == second["_id"]
+    assert first["_id"] != "client-id"
+    assert len(first["_id"]) == 40
+
+
+def test_id_changes_with_path_span_and_content():
+    ids = {
+        assign_chunk_id(chunk())["_id"],
+        assign_chunk_id(chunk(file_path="src/b.py"))["_id"],
+        assign_chunk_id(chunk(start_line=2, end_line=3))["_id"],
+        assign_chunk_id(chunk(text="def f():\n    return 2\n"))["_id"],
+    }
+    assert len(ids) == 4
+
+
+def test_code_field_is_hashed_when_text_is_missing():
+    with_code = assign_chunk_id({"code": "x = 1", "file_path": "a.py", "start_line": 1, "end_line": 1})
+    assert with_code["_id"] == make_chunk_id("a.py", 1, 1, "x = 1")
+    assert with_code["content_hash"] == assign_chunk_id(chunk(text="x = 1"))["content_hash"]
@@ -0,0 +1,54 @@
+import asyncio
+
+from app.utils.embedding_cache_util import EmbeddingCache
+
+
+def embed_with(calls):
+    async def fetch(texts):
+        calls.append(list(texts))
+        return [[len(text) + 0.1, 1 / 3] for text in texts]
+    return fetch
+
+
+def test_round_trip_fetches_only_misses(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"), memory_size=10)
+    calls = []
+
+    async def run():
+        first = await cache.get_or_embed("voyage", "voyage-code-3", 2, "document", ["a", "bb", "a"], embed_with(calls))
+        second = await cache.get_or_embed("voyage", "voyage-code-3", 2, "document", ["bb", "ccc"], embed_with(calls))
+        return first, second
+
+    (vectors, hits, misses), (vectors2, hits2, misses2) = asyncio.run(run())
+
+    assert calls == [["a", "bb"], ["ccc"]]
+    assert (hits, misses) == (0, 3)
+    assert (hits2, misses2) == (1, 1)
+    assert vectors[0] == vectors[2]
+    assert vectors2[0] == vectors[1]
+
+
+def test_hits_and_misses_return_the_same_float32_values(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    calls = []
+
+    async def run(cache):
+        vectors, _, _ = await cache.get_or_embed("voyage", "voyage-code-3", 2, "query", ["x"], embed_with(calls))
+        return vectors[0]
+
+    miss = asyncio.run(run(EmbeddingCache(path, memory_size=10)))
+    disk_hit = asyncio.run(run(EmbeddingCache(path, memory_size=10)))
+    assert len(calls) == 1
+    assert miss == disk_hit
+    # 1/3 is not representable in float32, so an unrounded miss would differ from a hit
+    assert miss[1] != 1 / 3
+
+
+def test_key_separates_model_dimension_and_input_type():
+    keys = {
+        EmbeddingCache.make_key("voyage", "voyage-code-3", 1024, "document", "text"),
+        EmbeddingCache.make_key("voyage", "voyage-code-3", 1024, "query", "text"),
+        EmbeddingCache.make_key("voyage", "voyage-code-3", 512, "document", "text"),
+        EmbeddingCache.make_key("voyage", "voyage-3", 1024, "document", "text"),
+    }
+    assert len(keys) == 4
@@ -0,0 +1,115 @@
+import asyncio
+import json
+
+from app.utils.llm_memo_util import LLMMemo, json_completion_check
+
+
+def completion(content: str) -> dict:
+    return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+
+def test_response_is_memoized_on_disk(tmp_path):
+    path = str(tmp_path / "memo.sqlite3")
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return completion("True coding question")
+
+    async def run(memo):
+        return await memo.get_or_call("groq:model:a:b:c", call)
+
+    first = asyncio.run(run(LLMMemo(memory_size=10, ttl=60, disk_path=path)))
+    second = asyncio.run(run(LLMMemo(memory_size=10, ttl=60, disk_path=path)))
+    assert first == second
+    assert len(calls) == 1
+
+
+def test_concurrent_identical_calls_share_one_request():
+    memo = LLMMemo(memory_size=10, ttl=60)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return completion("{}")
+
+    async def run():
+        return await asyncio.gather(*(memo.get_or_call("key", call) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert len(calls) == 1
+    assert all(result == results[0] for result in results)
+
+
+def test_waiters_survive_cancellation_of_the_owning_caller():
+    memo = LLMMemo(memory_size=10, ttl=60)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return completion("{}")
+
+    async def run():
+        owner = asyncio.create_task(memo.get_or_call("key", call))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.create_task(memo.get_or_call("key", call)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        results = await asyncio.gather(*waiters)
+        return owner, results
+
+    owner, results = asyncio.run(run())
+    assert owner.cancelled()
+    assert results == [completion("{}")] * 3
+    # one waiter took over the call; the rest shared its result
+    assert len(calls) == 2
+    assert memo.in_flight == {}
+
+
+def test_failures_propagate_to_waiters_and_are_not_memoized():
+    memo = LLMMemo(memory_size=10, ttl=60)
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def run():
+        return await asyncio.gather(*(memo.get_or_call("key", failing) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert len(calls) == 1
+    assert len(memo.memory) == 0
+
+
+def test_invalid_responses_are_returned_but_not_memoized():
+    memo = LLMMemo(memory_size=10, ttl=60)
+    replies = iter([completion("not json"), completion(json.dumps({"use_rag": True}))])
+    validate = json_completion_check("use_rag")
+
+    async def call():
+        return next(replies)
+
+    async def run():
+        first = await memo.get_or_call("key", call, validate)
+        second = await memo.get_or_call("key", call, validate)
+        third = await memo.get_or_call("key", call, validate)
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert first == completion("not json")
+    assert second == third == completion(json.dumps({"use_rag": True}))
+
+
+def test_json_completion_check():
+    check = json_completion_check("preprocess", "reformulated_query")
+    assert check(completion(json.dumps({"preprocess": {}, "reformulated_query": {}})))
+    assert not check(completion(json.dumps({"preprocess": {}})))
+    assert not check(completion("[1, 2]"))
+    assert not check(completion("{truncated"))
+    assert not check({"choices": []})
+    assert json_completion_check()(completion("{}"))
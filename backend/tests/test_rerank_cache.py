@@ -0,0 +1,55 @@
+import asyncio
+
+from app.utils.rerank_cache_util import RerankCache
+
+
+def score_with(calls):
+    async def fetch(texts):
+        calls.append(list(texts))
+        return [float(len(text)) for text in texts]
+    return fetch
+
+
+def rerank(cache, query, documents, calls, top_n=2):
+    return asyncio.run(cache.get_or_rerank("voyage", "rerank-2", query, documents, top_n, score_with(calls)))
+
+
+def test_exact_hit_ignores_query_whitespace_and_case():
+    cache = RerankCache(max_size=10, score_size=100, ttl=60, partial_min_overlap=0.5)
+    calls = []
+    first = rerank(cache, "How does  auth work?", ["a", "ccc", "bb"], calls)
+    second = rerank(cache, "how does auth work?", ["a", "ccc", "bb"], calls)
+
+    assert first == {"data": [{"index": 1, "relevance_score": 3.0}, {"index": 2, "relevance_score": 2.0}], "cache": "miss"}
+    assert second == {**first, "cache": "exact"}
+    assert calls == [["a", "ccc", "bb"]]
+
+
+def test_overlapping_candidates_only_score_new_documents():
+    cache = RerankCache(max_size=10, score_size=100, ttl=60, partial_min_overlap=0.5)
+    calls = []
+    rerank(cache, "query", ["a", "bb", "ccc"], calls)
+    result = rerank(cache, "query", ["dddd", "bb", "ccc"], calls)
+
+    assert result["cache"] == "partial"
+    assert calls[1] == ["dddd"]
+    assert result["data"][0] == {"index": 0, "relevance_score": 4.0}
+
+
+def test_low_overlap_rescores_everything():
+    cache = RerankCache(max_size=10, score_size=100, ttl=60, partial_min_overlap=0.9)
+    calls = []
+    rerank(cache, "query", ["a", "bb", "ccc"], calls)
+    result = rerank(cache, "query", ["dddd", "bb", "ccc"], calls)
+
+    assert result["cache"] == "miss"
+    assert calls[1] == ["dddd", "bb", "ccc"]
+
+
+def test_other_query_or_model_misses():
+    cache = RerankCache(max_size=10, score_size=100, ttl=60, partial_min_overlap=0.5)
+    calls = []
+    rerank(cache, "query", ["a", "bb"], calls)
+    rerank(cache, "another query", ["a", "bb"], calls)
+    asyncio.run(cache.get_or_rerank("cohere", "rerank-2", "query", ["a", "bb"], 2, score_with(calls)))
+    assert len(calls) == 3
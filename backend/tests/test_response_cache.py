@@ -0,0 +1,62 @@
+import asyncio
+
+from app.utils.response_cache_util import SemanticResponseCache, context_hash
+
+
+def make_cache(tmp_path, threshold=0.95):
+    return SemanticResponseCache(str(tmp_path / "responses.sqlite3"), threshold=threshold, ttl=3600, max_entries=10)
+
+
+def test_similar_query_hits_and_dissimilar_misses(tmp_path):
+    cache = make_cache(tmp_path)
+    ctx = context_hash("src/a.py", "content", "dense")
+
+    async def run():
+        await cache.put("ns", ctx, "how does auth work", [1.0, 0.0, 0.0], {"response": "answer"})
+        near = await cache.lookup("ns", ctx, [0.99, 0.05, 0.0])
+        far = await cache.lookup("ns", ctx, [0.0, 1.0, 0.0])
+        return near, far
+
+    near, far = asyncio.run(run())
+    assert near["payload"] == {"response": "answer"}
+    assert near["cached_query"] == "how does auth work"
+    assert near["similarity"] > 0.95
+    assert far is None
+
+
+def test_entries_are_scoped_by_namespace_and_context(tmp_path):
+    cache = make_cache(tmp_path)
+    dense = context_hash("src/a.py", "content", "dense")
+    hybrid = context_hash("src/a.py", "content", "alpha=0.5")
+    assert dense != hybrid
+
+    async def run():
+        await cache.put("ns", dense, "q", [1.0, 0.0], {"response": "answer"})
+        return (
+            await cache.lookup("other-ns", dense, [1.0, 0.0]),
+            await cache.lookup("ns", hybrid, [1.0, 0.0]),
+            await cache.lookup("ns", dense, [1.0, 0.0]),
+        )
+
+    other_namespace, other_context, same = asyncio.run(run())
+    assert other_namespace is None
+    assert other_context is None
+    assert same is not None
+
+
+def test_resync_invalidates_the_namespace(tmp_path):
+    cache = make_cache(tmp_path)
+    ctx = context_hash("", "")
+
+    async def run():
+        await cache.put("ns", ctx, "q", [1.0, 0.0], {"response": "stale"})
+        await cache.mark_resynced("ns")
+        return await cache.lookup("ns", ctx, [1.0, 0.0])
+
+    assert asyncio.run(run()) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_context_hash_separates_parts():
+    assert context_hash("ab", "c") != context_hash("a", "bc")
+    assert context_hash(None, "x") == context_hash("", "x")
@@ -0,0 +1,82 @@
+import asyncio
+import json
+
+import pytest
+
+from app.utils.stream_json_util import iter_batches, iter_json_records
+
+RECORDS = [
+    {
+        "text": f"caf\u00e9 \u2603 \"quoted\" line\nnext {i} \\ \U0001F600",
+        "file_path": f"src/m\u00f6dule_{i}.py",
+        "start_line": i,
+        "score": -1.5e-3 * i,
+        "ratio": 12.25,
+        "flags": [True, False, None],
+        "nested": {"empty": {}, "list": []},
+    }
+    for i in range(40)
+]
+
+
+def collect(path, **kwargs):
+    async def run():
+        return [record async for record in iter_json_records(str(path), **kwargs)]
+    return asyncio.run(run())
+
+
+@pytest.fixture(params=["array", "ndjson"])
+def dump(request, tmp_path):
+    path = tmp_path / "chunks.json"
+    if request.param == "array":
+        # ensure_ascii keeps \uXXXX escapes in the file, which a block boundary can split
+        path.write_text(json.dumps(RECORDS, indent=1), encoding="utf-8")
+    else:
+        path.write_text("\n".join(json.dumps(record, ensure_ascii=False) for record in RECORDS) + "\n", encoding="utf-8")
+    return path
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 3, 5, 7, 16, 64, 4096])
+def test_records_survive_any_block_boundary(dump, read_size):
+    assert collect(dump, read_size=read_size) == RECORDS
+
+
+def test_empty_array_and_empty_file(tmp_path):
+    empty_array = tmp_path / "empty.json"
+    empty_array.write_text(" [ ] ")
+    empty_file = tmp_path / "empty.ndjson"
+    empty_file.write_text("")
+    assert collect(empty_array, read_size=1) == []
+    assert collect(empty_file, read_size=1) == []
+
+
+def test_malformed_record_raises(tmp_path):
+    path = tmp_path / "bad.json"
+    path.write_text('[{"a": 1}, {"a": tru}, {"a": 3}]')
+    with pytest.raises(json.JSONDecodeError):
+        collect(path, read_size=4)
+
+
+def test_truncated_file_raises(tmp_path):
+    path = tmp_path / "truncated.json"
+    path.write_text('[{"a": 1}, {"a": "no end')
+    with pytest.raises(json.JSONDecodeError):
+        collect(path, read_size=4)
+
+
+def test_record_larger_than_the_cap_raises_before_the_file_ends(tmp_path):
+    path = tmp_path / "huge.json"
+    path.write_text('[{"a": "' + "x" * 10000 + '"}]')
+    with pytest.raises(json.JSONDecodeError):
+        collect(path, read_size=64, max_record_size=1000)
+
+
+def test_iter_batches_groups_records():
+    async def records():
+        for i in range(5):
+            yield i
+
+    async def run():
+        return [batch async for batch in iter_batches(records(), 2)]
+
+    assert asyncio.run(run()) == [[0, 1], [2, 3], [4]]
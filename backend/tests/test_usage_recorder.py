@@ -0,0 +1,141 @@
+import asyncio
+
+from app.repositories import usage_repository as usage_repository_module
+from app.repositories.usage_repository import UsageRepository
+from app.utils import usage_recorder_util
+from app.utils.usage_recorder_util import UsageRecorder, normalize_usage, start_usage_context, usage_summary
+
+
+class FakeRepository:
+    """Stands in for UsageRepository; fails the first `failures` inserts"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.batches = []
+
+    def __call__(self, db):
+        return self
+
+    async def insert_many(self, records):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("mongo down")
+        self.batches.append(list(records))
+
+
+def use_repository(monkeypatch, repository):
+    async def get_db():
+        return None
+
+    monkeypatch.setattr(usage_recorder_util, "get_db", get_db)
+    monkeypatch.setattr(usage_recorder_util, "UsageRepository", repository)
+
+
+def test_normalize_usage_maps_provider_blocks():
+    assert normalize_usage({"prompt_tokens": 10, "completion_tokens": 5}) == {
+        "input_tokens": 10, "output_tokens": 5, "total_tokens": 15, "read_units": 0, "write_units": 0,
+    }
+    anthropic = normalize_usage({"input_tokens": 7, "output_tokens": 3})
+    assert anthropic["total_tokens"] == 10
+    assert normalize_usage({"total_tokens": 42})["total_tokens"] == 42
+    assert normalize_usage({"readUnits": 5, "writeUnits": 2})["read_units"] == 5
+    assert normalize_usage({"readUnits": 5, "writeUnits": 2})["write_units"] == 2
+    cohere = normalize_usage({"billed_units": {"search_units": 1, "input_tokens": 4}})
+    assert (cohere["read_units"], cohere["input_tokens"]) == (1, 4)
+    assert normalize_usage(None)["total_tokens"] == 0
+
+
+def test_request_totals_include_spawned_tasks_and_stay_per_request():
+    recorder = UsageRecorder(batch_size=100, flush_interval=60, buffer_size=100)
+
+    async def handle(route, tokens):
+        context = start_usage_context(route, user="a@example.com", namespace="ns")
+        recorder.record("openai", "gpt", "chat", {"prompt_tokens": tokens, "completion_tokens": 1})
+        # tasks created after the context is set are attributed to the same request
+        await asyncio.create_task(_record_later(recorder, tokens))
+        return context
+
+    async def run():
+        return await asyncio.gather(handle("/query", 10), handle("/stream-query", 100))
+
+    first, second = asyncio.run(run())
+    assert usage_summary(first) == {
+        "request_id": first["request_id"], "calls": 2,
+        "input_tokens": 10, "output_tokens": 1, "total_tokens": 21, "read_units": 3, "write_units": 0,
+    }
+    assert second["totals"]["total_tokens"] == 201
+    records = list(recorder.buffer)
+    assert len(records) == 4
+    assert {record["request_id"] for record in records if record["route"] == "/query"} == {first["request_id"]}
+
+
+async def _record_later(recorder, tokens):
+    await asyncio.sleep(0)
+    recorder.record("pinecone", "index", "query", {"readUnits": 3, "total_tokens": tokens})
+
+
+def test_flush_writes_batches_and_requeues_on_failure(monkeypatch):
+    repository = FakeRepository(failures=1)
+    use_repository(monkeypatch, repository)
+    recorder = UsageRecorder(batch_size=2, flush_interval=60, buffer_size=100)
+    for i in range(5):
+        recorder.record("voyageai", "voyage-code", "embed", {"total_tokens": i})
+
+    asyncio.run(recorder.flush())
+    assert repository.batches == []
+    assert [record["total_tokens"] for record in recorder.buffer] == [0, 1, 2, 3, 4]
+
+    asyncio.run(recorder.flush())
+    assert [[record["total_tokens"] for record in batch] for batch in repository.batches] == [[0, 1], [2, 3], [4]]
+    assert not recorder.buffer
+
+
+def test_full_buffer_keeps_newest_records_and_counts_drops(monkeypatch):
+    recorder = UsageRecorder(batch_size=100, flush_interval=60, buffer_size=3)
+    for i in range(5):
+        recorder.record("jina", "reranker", "rerank", {"total_tokens": i})
+    assert [record["total_tokens"] for record in recorder.buffer] == [2, 3, 4]
+    assert recorder.dropped == 2
+
+    use_repository(monkeypatch, FakeRepository())
+    asyncio.run(recorder.flush())
+    assert recorder.dropped == 0
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.pipeline = None
+
+    async def aggregate(self, pipeline):
+        self.pipeline = pipeline
+        for doc in self.docs:
+            yield dict(doc)
+
+
+class FakeDb:
+    def __init__(self, collection):
+        self.usage_records = collection
+
+
+def test_aggregate_groups_by_fields_and_flattens_keys():
+    collection = FakeCollection([
+        {"_id": {"user": "a", "stage": "rerank"}, "calls": 2, "total_tokens": 30},
+        {"_id": None, "calls": 1, "total_tokens": 5},
+    ])
+    repository = UsageRepository(FakeDb(collection))
+
+    groups = asyncio.run(repository.aggregate({"user": "a"}, ["user", "stage"], 10))
+    assert groups == [
+        {"user": "a", "stage": "rerank", "calls": 2, "total_tokens": 30},
+        {"calls": 1, "total_tokens": 5},
+    ]
+    match, group, sort, limit = collection.pipeline
+    assert match == {"$match": {"user": "a"}}
+    assert group["$group"]["_id"] == {"user": "$user", "stage": "$stage"}
+    for field in usage_repository_module.USAGE_SUM_FIELDS:
+        assert group["$group"][field] == {"$sum": f"${field}"}
+    assert limit == {"$limit": 10}
+
+    asyncio.run(repository.aggregate({}, [], 10))
+    assert collection.pipeline[1]["$group"]["_id"] is None
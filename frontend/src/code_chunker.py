@@ -6,7 +6,7 @@ import sys
 from typing import Any, Generator
 from pathlib import Path
 from code_splitter import Language, TiktokenSplitter
-from uuid import uuid4
+import hashlib
 
 class FunctionExtractor:
 
@@ -50,6 +50,12 @@ class FunctionExtractor:
                 'code': func_content
             }
 
+def chunk_id(file_path: str, start_line: int, end_line: int, text: str) -> str:
+    """Deterministic chunk id (path + line span + content hash) so resyncs can be diffed."""
+    content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    key = f"{file_path}:{start_line}:{end_line}:{content_hash}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:40]
+
 def walk(dir: str, max_size: int) -> Generator[dict[str, Any], None, None]:
     splitter = TiktokenSplitter(Language.Python, max_size=max_size)
     
@@ -75,7 +81,7 @@ def walk(dir: str, max_size: int) -> Generator[dict[str, Any], None, None]:
                                 text = "\n".join(lines[chunk.start : chunk.end])
                                 if text:
                                     yield {
-                                        "_id" : str(uuid4()),
+                                        "_id" : chunk_id(rel_path, chunk.start, chunk.end, text),
                                         "file_path": rel_path,
                                         "file_name": file,
                                         "start_line": chunk.start,
@@ -89,7 +95,7 @@ def walk(dir: str, max_size: int) -> Generator[dict[str, Any], None, None]:
                             text = "\n".join(lines)
                             if text:
                                 yield {
-                                    "_id" : str(uuid4()),
+                                    "_id" : chunk_id(rel_path, 0, len(lines), text),
                                     "file_path": rel_path,
                                     "file_name": file,
                                     "start_line": 0,